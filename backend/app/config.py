@@ -9,4 +9,162 @@ class Settings:
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
-settings = Settings()
\ No newline at end of file
+    # パスワードハッシュ（bcrypt）の設定
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+    PASSWORD_HASH_MAX_CONCURRENCY: int = int(os.getenv("PASSWORD_HASH_MAX_CONCURRENCY", os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2))))
+    PASSWORD_HASH_MAX_QUEUE: int = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+    # 認証済みユーザー（Principal）のキャッシュ設定
+    # アカウントの変更時は invalidate_principal で破棄する。破棄し忘れた場合もTTLを過ぎれば反映される
+    PRINCIPAL_CACHE_TTL_SECONDS: int = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "300"))
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+
+    # データベース接続プールの設定
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "20"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+    # 起動時のスキーマバージョン確認（strict: 不一致で起動失敗 / warn: 警告のみ / off）
+    SCHEMA_CHECK: str = os.getenv("SCHEMA_CHECK", "strict")
+
+    # OpenAI クライアントの設定
+    OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY")
+    OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL")  # 未設定なら公式API（ベンチマーク時はローカルの代替サーバー）
+    OPENAI_TIMEOUT: float = float(os.getenv("OPENAI_TIMEOUT", "60"))
+    OPENAI_MAX_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "200"))
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "50"))
+    # JSONスキーマ指定の構造化出力に使うモデル（構造化出力に対応したモデルを指定する）
+    STRUCTURED_MODEL: str = os.getenv("STRUCTURED_MODEL", "gpt-4o-mini")
+
+    # LLMゲートウェイ（同時実行数・レート制限・再試行・サーキットブレーカー・利用上限）
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "100"))
+    LLM_MODEL_CONCURRENCY: str = os.getenv("LLM_MODEL_CONCURRENCY", "")  # 例: "gpt-3.5-turbo=50,gpt-4o-mini=20"
+    LLM_REQUESTS_PER_MINUTE: int = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))  # 0で無制限
+    LLM_TOKENS_PER_MINUTE: int = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))  # 0で無制限
+    LLM_ESTIMATED_COMPLETION_TOKENS: int = int(os.getenv("LLM_ESTIMATED_COMPLETION_TOKENS", "500"))
+    LLM_THROTTLE_MAX_WAIT_SECONDS: float = float(os.getenv("LLM_THROTTLE_MAX_WAIT_SECONDS", "10"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "3"))
+    LLM_BACKOFF_BASE_SECONDS: float = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+    LLM_BACKOFF_MAX_SECONDS: float = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "8"))
+    # 1回の呼び出し全体（待ち・再試行を含む）の期限。各試行の OPENAI_TIMEOUT より優先する
+    LLM_REQUEST_DEADLINE_SECONDS: float = float(os.getenv("LLM_REQUEST_DEADLINE_SECONDS", "90"))
+    LLM_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+    LLM_BREAKER_COOLDOWN_SECONDS: float = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+    LLM_USER_REQUESTS_PER_MINUTE: int = int(os.getenv("LLM_USER_REQUESTS_PER_MINUTE", "30"))  # 0で無制限
+    LLM_USER_REQUESTS_PER_DAY: int = int(os.getenv("LLM_USER_REQUESTS_PER_DAY", "1000"))  # 0で無制限
+
+    # 同一プロンプトの同時呼び出しを1回の上流呼び出しにまとめる
+    LLM_COALESCE_ENABLED: bool = os.getenv("LLM_COALESCE_ENABLED", "true").lower() == "true"
+
+    # お気に入り一覧のページサイズ（limit・cursor をどちらも指定しない場合は全件を返す）
+    FAVORITES_DEFAULT_LIMIT: int = int(os.getenv("FAVORITES_DEFAULT_LIMIT", "100"))
+    FAVORITES_MAX_LIMIT: int = int(os.getenv("FAVORITES_MAX_LIMIT", "500"))
+
+    # 練習用WebSocket（採点中に次の問題を先読みする）の設定
+    PRACTICE_PREFETCH_ENABLED: bool = os.getenv("PRACTICE_PREFETCH_ENABLED", "true").lower() == "true"
+    PRACTICE_AUTH_TIMEOUT_SECONDS: float = float(os.getenv("PRACTICE_AUTH_TIMEOUT_SECONDS", "10"))
+    PRACTICE_IDLE_TIMEOUT_SECONDS: float = float(os.getenv("PRACTICE_IDLE_TIMEOUT_SECONDS", "900"))
+    # 受信待ちのメッセージ数・送信待ちのメッセージ数の上限（超えると読み書きを待たせる）
+    PRACTICE_RECEIVE_QUEUE_SIZE: int = int(os.getenv("PRACTICE_RECEIVE_QUEUE_SIZE", "4"))
+    PRACTICE_SEND_QUEUE_SIZE: int = int(os.getenv("PRACTICE_SEND_QUEUE_SIZE", "64"))
+
+    # 復習キュー（SM-2法で次に復習すべきお気に入りを返す）の設定
+    REVIEW_DUE_DEFAULT_LIMIT: int = int(os.getenv("REVIEW_DUE_DEFAULT_LIMIT", "20"))
+    REVIEW_DUE_MAX_LIMIT: int = int(os.getenv("REVIEW_DUE_MAX_LIMIT", "100"))
+
+    # まとめて添削（バッチ）の設定
+    BATCH_GRADING_MAX_ITEMS: int = int(os.getenv("BATCH_GRADING_MAX_ITEMS", "50"))
+    BATCH_GRADING_CHUNK_SIZE: int = int(os.getenv("BATCH_GRADING_CHUNK_SIZE", "10"))
+    BATCH_GRADING_PARALLEL_CHUNKS: int = int(os.getenv("BATCH_GRADING_PARALLEL_CHUNKS", "3"))
+
+    # 長文翻訳（文ごとに分けて並列に翻訳する）の設定
+    TRANSLATION_MAX_SENTENCES: int = int(os.getenv("TRANSLATION_MAX_SENTENCES", "30"))
+    TRANSLATION_PARALLEL_SENTENCES: int = int(os.getenv("TRANSLATION_PARALLEL_SENTENCES", "4"))
+
+    # 1回の補完でまとめて生成する言い換えの種類数の上限
+    STYLE_VARIATIONS_MAX_TYPES: int = int(os.getenv("STYLE_VARIATIONS_MAX_TYPES", "8"))
+
+    # 模範解答との比較による手元での添削（類似度が閾値以上ならLLMを呼ばない）
+    LOCAL_GRADER_ENABLED: bool = os.getenv("LOCAL_GRADER_ENABLED", "true").lower() == "true"
+    LOCAL_GRADER_THRESHOLD: float = float(os.getenv("LOCAL_GRADER_THRESHOLD", "0.9"))
+
+    # 回答の書き込みをまとめる（write-behind）設定
+    ANSWER_WRITER_ENABLED: bool = os.getenv("ANSWER_WRITER_ENABLED", "true").lower() == "true"
+    ANSWER_WRITER_BATCH_SIZE: int = int(os.getenv("ANSWER_WRITER_BATCH_SIZE", "100"))
+    ANSWER_WRITER_FLUSH_SECONDS: float = float(os.getenv("ANSWER_WRITER_FLUSH_SECONDS", "0.5"))
+    ANSWER_WRITER_QUEUE_SIZE: int = int(os.getenv("ANSWER_WRITER_QUEUE_SIZE", "5000"))
+
+    # 間違えた単語の抽出パイプラインの設定
+    MISTAKE_PIPELINE_ENABLED: bool = os.getenv("MISTAKE_PIPELINE_ENABLED", "true").lower() == "true"
+    MISTAKE_PIPELINE_BATCH_SIZE: int = int(os.getenv("MISTAKE_PIPELINE_BATCH_SIZE", "200"))
+    MISTAKE_PIPELINE_FLUSH_SECONDS: float = float(os.getenv("MISTAKE_PIPELINE_FLUSH_SECONDS", "2"))
+    MISTAKE_PIPELINE_QUEUE_SIZE: int = int(os.getenv("MISTAKE_PIPELINE_QUEUE_SIZE", "10000"))
+
+    # 既存の問題を再利用するためのベクトル索引の設定
+    EMBEDDING_INDEX_ENABLED: bool = os.getenv("EMBEDDING_INDEX_ENABLED", "true").lower() == "true"
+    # 埋め込みの提供元（hashing: 外部APIを使わない決定的な埋め込み / openai: 埋め込みAPI）
+    # hashing は語の意味を扱わないため、英単語（間違えた単語）と日本語だけの問題文はほぼ一致しない。
+    # 英訳（模範解答）のない問題も間違えた単語で探すには openai などの多言語の埋め込みを使う
+    EMBEDDING_PROVIDER: str = os.getenv("EMBEDDING_PROVIDER", "hashing")
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    EMBEDDING_DIMENSION: int = int(os.getenv("EMBEDDING_DIMENSION", "256"))
+    # 索引を保存するファイルの接頭辞（空ならメモリ上にだけ持つ）
+    EMBEDDING_INDEX_PATH: str = os.getenv("EMBEDDING_INDEX_PATH", "data/question_index")
+    EMBEDDING_SYNC_SECONDS: float = float(os.getenv("EMBEDDING_SYNC_SECONDS", "30"))
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+    # 間違えた単語との類似度がこれ以上の問題を再利用する
+    EMBEDDING_MATCH_THRESHOLD: float = float(os.getenv("EMBEDDING_MATCH_THRESHOLD", "0.3"))
+    # 直近に解いた問題との類似度がこれ以上の問題は出さない
+    EMBEDDING_DUPLICATE_THRESHOLD: float = float(os.getenv("EMBEDDING_DUPLICATE_THRESHOLD", "0.9"))
+    EMBEDDING_RECENT_WINDOW: int = int(os.getenv("EMBEDDING_RECENT_WINDOW", "20"))
+    # 回答済みの問題として除く直近の回答数（suggest のたびに回答履歴の全件を読まないため）
+    EMBEDDING_ANSWERED_WINDOW: int = int(os.getenv("EMBEDDING_ANSWERED_WINDOW", "1000"))
+
+    # ジョブキュー（jobs テーブル）とワーカー（python -m app.worker）の設定
+    JOB_WORKER_CONCURRENCY: int = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+    JOB_POLL_SECONDS: float = float(os.getenv("JOB_POLL_SECONDS", "1"))
+    # 処理中のジョブの期限（ワーカーが落ちた場合はこの時間の後に他のワーカーが取り直す）
+    JOB_VISIBILITY_TIMEOUT_SECONDS: float = float(os.getenv("JOB_VISIBILITY_TIMEOUT_SECONDS", "300"))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+    JOB_RETRY_BASE_SECONDS: float = float(os.getenv("JOB_RETRY_BASE_SECONDS", "10"))
+    JOB_RETRY_MAX_SECONDS: float = float(os.getenv("JOB_RETRY_MAX_SECONDS", "600"))
+    JOB_SHUTDOWN_GRACE_SECONDS: float = float(os.getenv("JOB_SHUTDOWN_GRACE_SECONDS", "30"))
+    # 新しく生成した問題の模範解答をワーカーで作る（手元での添削に使える問題が増える）
+    JOB_REFERENCE_ANSWERS_ENABLED: bool = os.getenv("JOB_REFERENCE_ANSWERS_ENABLED", "false").lower() == "true"
+
+    # 事前生成した問題プールの設定
+    QUESTION_POOL_ENABLED: bool = os.getenv("QUESTION_POOL_ENABLED", "true").lower() == "true"
+    QUESTION_POOL_DEPTH: int = int(os.getenv("QUESTION_POOL_DEPTH", "3"))
+    QUESTION_POOL_REFILL_CONCURRENCY: int = int(os.getenv("QUESTION_POOL_REFILL_CONCURRENCY", "4"))
+    QUESTION_POOL_MAX_USERS: int = int(os.getenv("QUESTION_POOL_MAX_USERS", "1000"))
+
+    # LLM応答キャッシュ（プロセス内LRU + DB）の設定
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+    RESPONSE_CACHE_TTL_SECONDS: int = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "600"))
+    RESPONSE_CACHE_DB_TTL_SECONDS: int = int(os.getenv("RESPONSE_CACHE_DB_TTL_SECONDS", str(7 * 24 * 3600)))
+    # 他のワーカーでの削除を確認する間隔（この秒数までは削除前のエントリを返すことがある）
+    RESPONSE_CACHE_GENERATION_CHECK_SECONDS: float = float(os.getenv("RESPONSE_CACHE_GENERATION_CHECK_SECONDS", "5"))
+    # 期限切れのDBのエントリを削除する間隔（0で削除しない）
+    RESPONSE_CACHE_PURGE_SECONDS: float = float(os.getenv("RESPONSE_CACHE_PURGE_SECONDS", "3600"))
+
+    # ログ（LOG_LEVELS はモジュール別のレベル。例: "app.utils.llm_gateway=DEBUG,httpx=INFO"）
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_LEVELS: str = os.getenv("LOG_LEVELS", "")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")  # json / text
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+    # メトリクス（/metrics）と遅いリクエストのログ（0で無効）
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    SLOW_REQUEST_SECONDS: float = float(os.getenv("SLOW_REQUEST_SECONDS", "0"))
+    # モデルごとの1Kトークンあたりの料金（USD、入力:出力）
+    LLM_PRICES: str = os.getenv("LLM_PRICES", "gpt-3.5-turbo=0.0005:0.0015,gpt-4o-mini=0.00015:0.0006,gpt-4o=0.0025:0.01")
+
+    # 管理用エンドポイントのトークン（未設定の場合は管理APIを無効化）
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN")
+
+settings = Settings()
@@ -1,21 +1,81 @@
-from sqlalchemy import create_engine
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from alembic.script import ScriptDirectory
 from dotenv import load_dotenv
+from .config import settings
+from .utils.metrics import instrument_engine
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://ryunoshin@localhost/H2M")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def to_async_url(url: str) -> str:
+    """同期ドライバのURLを非同期ドライバ（asyncpg / aiosqlite）のURLに変換する"""
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    if url.startswith("postgresql+psycopg2://"):
+        url = "postgresql://" + url[len("postgresql+psycopg2://"):]
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+ASYNC_DATABASE_URL = to_async_url(DATABASE_URL)
+
+# 接続プールの設定はSettingsから読み込む（SQLiteはプール設定を受け付けないため除外）
+engine_options = {}
+if not ASYNC_DATABASE_URL.startswith("sqlite"):
+    engine_options = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
+
+engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options)
+# クエリの件数・所要時間をリクエストごとに計測する
+instrument_engine(engine)
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+def upsert_insert(entity):
+    """ON CONFLICT 句を使える insert を接続先の方言（PostgreSQL / SQLite）に合わせて作る"""
+    insert = pg_insert if engine.dialect.name == "postgresql" else sqlite_insert
+    return insert(entity)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+
+async def check_schema_version() -> None:
+    """DBのスキーマバージョンがマイグレーションの最新版と一致しているか確認する"""
+    if settings.SCHEMA_CHECK == "off":
+        return
+    heads = set(ScriptDirectory(MIGRATIONS_DIR).get_heads())
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+            current = {row[0] for row in result}
+    except Exception:
+        current = set()
+
+    if current != heads:
+        message = (
+            f"Database schema is at {sorted(current) or 'no revision'}, expected {sorted(heads)}. "
+            "Run `alembic upgrade head` in backend/."
+        )
+        if settings.SCHEMA_CHECK == "strict":
+            raise RuntimeError(message)
+        logger.warning(message)
@@ -0,0 +1,96 @@
+# app/jobs.py
+from typing import Optional
+from sqlalchemy import or_, update
+from .database import SessionLocal
+from .models.models import QUESTION_SOURCE_GENERATED, Question, UserAnswer
+from .utils.job_queue import PermanentJobError, enqueue, job_handler
+from .utils.llm import chat_completion
+from .utils.prompts import grading_messages, question_messages, reference_answer_messages
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ジョブの種類
+GENERATE_QUESTIONS = "generate_questions"
+FILL_REFERENCE_ANSWER = "fill_reference_answer"
+REGRADE_ANSWER = "regrade_answer"
+
+# 1つのジョブで生成する問題数の上限
+MAX_GENERATED_QUESTIONS = 50
+
+def _require(payload: dict, key: str, default: Optional[int] = None) -> int:
+    try:
+        return int(payload[key] if default is None else payload.get(key, default))
+    except (KeyError, TypeError, ValueError):
+        raise PermanentJobError(f"Payload requires an integer '{key}'")
+
+@job_handler(GENERATE_QUESTIONS)
+async def generate_questions(payload: dict) -> None:
+    """問題を事前に生成して保存する（出題時は索引から再利用される）
+
+    複数件の指定は1問ずつのジョブに分けて登録し直す。再試行しても生成済みの問題を
+    作り直さないよう、1つのジョブで保存する問題は1問だけにする。
+    """
+    count = _require(payload, "count", default=1)
+    if not 1 <= count <= MAX_GENERATED_QUESTIONS:
+        raise PermanentJobError(f"'count' must be between 1 and {MAX_GENERATED_QUESTIONS}")
+    word = payload.get("word")
+    if word is not None and not isinstance(word, str):
+        raise PermanentJobError("'word' must be a string")
+
+    if count > 1:
+        async with SessionLocal() as db:
+            for _ in range(count):
+                enqueue(db, GENERATE_QUESTIONS, {"count": 1, "word": word})
+            await db.commit()
+        return
+
+    japanese_text = await chat_completion(messages=question_messages(word), coalesce=False)
+    async with SessionLocal() as db:
+        question = Question(
+            japanese_text=japanese_text, english_text="", difficulty_level=1, source=QUESTION_SOURCE_GENERATED
+        )
+        db.add(question)
+        await db.flush()
+        # 模範解答も用意し、出題後の添削を手元で済ませられるようにする（問題と同じコミットで登録）
+        enqueue(db, FILL_REFERENCE_ANSWER, {"question_id": question.id}, priority=-1)
+        await db.commit()
+
+@job_handler(FILL_REFERENCE_ANSWER)
+async def fill_reference_answer(payload: dict) -> None:
+    """模範解答が空の問題に英訳を生成して保存する"""
+    question_id = _require(payload, "question_id")
+    async with SessionLocal() as db:
+        question = await db.get(Question, question_id)
+    if question is None:
+        raise PermanentJobError(f"Question {question_id} not found")
+    if question.english_text:
+        return
+
+    english_text = (await chat_completion(messages=reference_answer_messages(question.japanese_text))).strip()
+    async with SessionLocal() as db:
+        # 生成している間に他のジョブが英訳を入れた場合は上書きしない
+        await db.execute(
+            update(Question)
+            .where(Question.id == question_id, or_(Question.english_text.is_(None), Question.english_text == ""))
+            .values(english_text=english_text)
+        )
+        await db.commit()
+
+@job_handler(REGRADE_ANSWER)
+async def regrade_answer(payload: dict) -> None:
+    """保存済みの回答を添削し直してフィードバックを更新する"""
+    answer_id = _require(payload, "answer_id")
+    async with SessionLocal() as db:
+        answer = await db.get(UserAnswer, answer_id)
+        question = await db.get(Question, answer.question_id) if answer and answer.question_id else None
+    if answer is None or question is None:
+        raise PermanentJobError(f"Answer {answer_id} or its question not found")
+
+    feedback = await chat_completion(
+        messages=grading_messages(question.japanese_text, answer.user_answer),
+        user_id=answer.user_id
+    )
+    async with SessionLocal() as db:
+        await db.execute(update(UserAnswer).where(UserAnswer.id == answer_id).values(feedback=feedback))
+        await db.commit()
@@ -1,17 +1,25 @@
 # app/main.py
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .routes import question, auth, translation, review
-from .database import engine
-from .models import models
-import logging
+from .routes import question, auth, translation, review, admin, practice
+from .database import engine, check_schema_version
+from .utils.llm import close_client
+from .utils.question_index import question_index
+from .utils.question_pool import question_pool
+from .utils.response_cache import response_cache
+from .utils.password import password_hasher
+from .utils.mistake_words import mistake_word_pipeline
+from .utils.answer_writer import answer_writer
+from .utils.metrics import MetricsMiddleware, render_metrics
+from .utils.log import RequestIdMiddleware, setup_logging, shutdown_logging
+from .config import settings
 
 
 app = FastAPI()
 
-# main.py
-
-logging.basicConfig(level=logging.DEBUG)
+# ログはキュー経由で別スレッドから出力する（レベルは LOG_LEVEL / LOG_LEVELS で指定）
+setup_logging()
 
 # CORSの設定
 app.add_middleware(
@@ -23,10 +31,47 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Request-ID"],
 )
 
-# モデルのテーブルを作成
-models.Base.metadata.create_all(bind=engine)
+# ルートごとの所要時間・DBクエリ・LLM呼び出しを計測する（CORSより外側で全体を測る）
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# リクエストIDを発行してログと応答ヘッダーに付ける（最も外側に置き、全てのログに載せる）
+app.add_middleware(RequestIdMiddleware)
+
+# テーブルはマイグレーション（alembic upgrade head）で作成し、起動時はバージョンだけ確認する
+@app.on_event("startup")
+async def verify_schema():
+    await check_schema_version()
+
+# 回答の書き込みバッファ・間違えた単語の抽出パイプライン・問題のベクトル索引を起動する
+@app.on_event("startup")
+async def start_background_workers():
+    if settings.ANSWER_WRITER_ENABLED:
+        answer_writer.start()
+    if settings.MISTAKE_PIPELINE_ENABLED:
+        mistake_word_pipeline.start()
+    if settings.EMBEDDING_INDEX_ENABLED:
+        await question_index.start()
+
+# バックグラウンド処理を止め（保存待ち・抽出待ちの回答は反映してから）、共有LLMクライアント・DBの接続プール・ハッシュ用プロセスを閉じる
+@app.on_event("shutdown")
+async def shutdown_background_workers():
+    await question_pool.close()
+    await question_index.close()
+    await response_cache.close()
+    await answer_writer.stop()
+    await mistake_word_pipeline.stop()
+    await close_client()
+    await engine.dispose()
+    password_hasher.shutdown()
+    shutdown_logging()
 
 # ルーターの登録
 app.include_router(auth.router, tags=["auth"])
@@ -40,3 +85,5 @@ app.include_router(
     prefix="/api/v1/review",
     tags=["review"]
 )
+app.include_router(admin.router, prefix="/api/v1/admin", tags=["admin"])
+app.include_router(practice.router, prefix="/api/v1/practice", tags=["practice"])
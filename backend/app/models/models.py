@@ -1,5 +1,5 @@
 # app/models/models.py
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime, Text, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..database import Base
@@ -16,6 +16,10 @@ class User(Base):
     answers = relationship("UserAnswer", back_populates="user", cascade="all, delete-orphan")
     mistake_words = relationship("MistakeWord", back_populates="user", cascade="all, delete-orphan")
 
+# 問題の出どころ（LLMで生成した問題だけを他のユーザーにも出題する）
+QUESTION_SOURCE_GENERATED = "generated"
+QUESTION_SOURCE_USER = "user"
+
 class Question(Base):
     __tablename__ = "questions"
 
@@ -23,6 +27,8 @@ class Question(Base):
     japanese_text = Column(String)
     english_text = Column(String)
     difficulty_level = Column(Integer)
+    # generated: LLMで生成 / user: ユーザーが入力した文（お気に入り保存時に作成し、本人以外には出さない）
+    source = Column(String, nullable=False, default=QUESTION_SOURCE_GENERATED, server_default=QUESTION_SOURCE_GENERATED)
 
     # リレーションシップを更新
     answers = relationship("UserAnswer", back_populates="question", cascade="all, delete-orphan")
@@ -32,9 +38,9 @@ class UserAnswer(Base):
     __tablename__ = "user_answers"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    question_id = Column(Integer, ForeignKey("questions.id"))
-    favorite_question_id = Column(Integer, ForeignKey("favorite_questions.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    question_id = Column(Integer, ForeignKey("questions.id"), index=True)
+    favorite_question_id = Column(Integer, ForeignKey("favorite_questions.id"), index=True)
     user_answer = Column(String)
     feedback = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -55,18 +61,79 @@ class MistakeWord(Base):
     # リレーションシップを追加
     user = relationship("User", back_populates="mistake_words")
 
+    __table_args__ = (
+        UniqueConstraint("user_id", "word", name="uq_mistake_words_user_id_word"),
+        # 問題生成時の「回数の多い順」の取得用（user_id単体の検索もこのインデックスで賄う）
+        Index("ix_mistake_words_user_id_count", "user_id", "count"),
+    )
+
 class FavoriteQuestion(Base):
     __tablename__ = "favorite_questions"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    question_id = Column(Integer, ForeignKey("questions.id"))
+    user_id = Column(Integer, ForeignKey("users.id"))  # 下の複合インデックスの先頭列で賄う
+    question_id = Column(Integer, ForeignKey("questions.id"), index=True)
     japanese_text = Column(String)
     english_answer = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # 間隔反復（SM-2）の復習スケジュール
+    due_at = Column(DateTime, default=datetime.utcnow)
+    interval_days = Column(Float, nullable=False, default=0.0, server_default="0")
+    ease_factor = Column(Float, nullable=False, default=2.5, server_default="2.5")
+    repetitions = Column(Integer, nullable=False, default=0, server_default="0")
+    last_reviewed_at = Column(DateTime)
+
     # リレーションシップを修正
     user = relationship("User", back_populates="favorite_questions")
     question = relationship("Question", back_populates="favorites")
-    answers = relationship("UserAnswer", back_populates="favorite_question")
\ No newline at end of file
+    answers = relationship("UserAnswer", back_populates="favorite_question")
+
+    __table_args__ = (
+        # 同じ問題を重複してお気に入りにしない（トグル・保存はこの制約でupsertする）
+        UniqueConstraint("user_id", "question_id", name="uq_favorite_questions_user_id_question_id"),
+        # 一覧のキーセットページネーション（user_id, created_at, id）用の複合インデックス
+        # updated_atを含めてETag用の集計もインデックスのみで完結させる
+        Index(
+            "ix_favorite_questions_user_created_id",
+            "user_id", "created_at", "id",
+            postgresql_include=["updated_at"]
+        ),
+        # 復習キュー（user_id ごとに due_at の早い順）用
+        Index("ix_favorite_questions_user_due", "user_id", "due_at"),
+    )
+
+class LlmCacheEntry(Base):
+    __tablename__ = "llm_cache"
+
+    # 正規化した入力・種類・モデルから作ったハッシュをキーにする
+    key = Column(String, primary_key=True)
+    kind = Column(String, index=True)
+    payload = Column(Text)  # 解析済みの結果（JSON）
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, index=True)
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(64), nullable=False)
+    payload = Column(Text, nullable=False, default="{}")  # ハンドラーへの引数（JSON）
+    # queued → running → succeeded / dead（再試行できる失敗は queued に戻る）
+    status = Column(String(16), nullable=False, default="queued", server_default="queued")
+    priority = Column(Integer, nullable=False, default=0, server_default="0")  # 大きいほど先に実行する
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    max_attempts = Column(Integer, nullable=False, default=5, server_default="5")
+    # queued は実行可能になる時刻、running は処理中の期限（過ぎると他のワーカーが取り直す）
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = Column(String(64))
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        # ワーカーが次のジョブを取り出す（status ごとに priority・available_at の順）ため
+        Index("ix_jobs_claim", "status", "priority", "available_at"),
+    )
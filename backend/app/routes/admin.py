@@ -0,0 +1,117 @@
+# app/routes/admin.py
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+import secrets
+from ..config import settings
+from ..database import get_db
+from .. import jobs  # noqa: F401  ハンドラーを登録する
+from ..utils import job_queue
+from ..utils.answer_writer import answer_writer
+from ..utils.grader import local_grader
+from ..utils.llm import coalescing_stats
+from ..utils.llm_gateway import llm_gateway
+from ..utils.mistake_words import mistake_word_pipeline
+from ..utils.password import password_hasher
+from ..utils.question_index import question_index
+from ..utils.question_pool import question_pool
+from ..utils.response_cache import response_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    # ADMIN_TOKENが未設定の場合は管理APIを常に拒否する
+    if not settings.ADMIN_TOKEN or not x_admin_token or not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin token required"
+        )
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    return response_cache.stats()
+
+@router.delete("/cache")
+async def invalidate_cache(key: Optional[str] = None, kind: Optional[str] = None):
+    """キーまたは種類（translation / translation_variation）でキャッシュを削除する
+
+    DBの層とこのワーカーのプロセス内の層はすぐに消える。他のワーカーのプロセス内の層は
+    RESPONSE_CACHE_GENERATION_CHECK_SECONDS 秒以内に破棄される。
+    """
+    try:
+        deleted = await response_cache.invalidate(key=key, kind=kind)
+        return {
+            "deleted": deleted,
+            "other_workers_within_seconds": settings.RESPONSE_CACHE_GENERATION_CHECK_SECONDS,
+        }
+    except Exception as e:
+        logger.exception("Error in invalidate_cache")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/question-pool/stats")
+async def get_question_pool_stats():
+    return question_pool.stats()
+
+@router.get("/question-index/stats")
+async def get_question_index_stats():
+    return question_index.stats()
+
+@router.get("/password-hashing/stats")
+async def get_password_hashing_stats():
+    return password_hasher.stats()
+
+@router.get("/answer-writer/stats")
+async def get_answer_writer_stats():
+    return answer_writer.stats()
+
+@router.get("/mistake-pipeline/stats")
+async def get_mistake_pipeline_stats():
+    return mistake_word_pipeline.stats()
+
+@router.get("/llm/stats")
+async def get_llm_stats():
+    return {
+        "gateway": llm_gateway.stats(),
+        "coalescing": coalescing_stats.as_dict(),
+    }
+
+class EnqueueJobRequest(BaseModel):
+    kind: str
+    payload: dict = {}
+    priority: int = 0
+    delay_seconds: float = 0
+
+@router.get("/jobs/stats")
+async def get_job_stats(window_minutes: int = 60, db: AsyncSession = Depends(get_db)):
+    return await job_queue.stats(db, window_minutes)
+
+@router.post("/jobs")
+async def enqueue_job(request: EnqueueJobRequest):
+    """ジョブを登録する（generate_questions / fill_reference_answer / regrade_answer）"""
+    if job_queue.get_handler(request.kind) is None:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind: {request.kind}")
+    try:
+        job_id = await job_queue.enqueue_job(
+            request.kind, request.payload,
+            priority=request.priority, delay_seconds=request.delay_seconds
+        )
+        return {"id": job_id}
+    except Exception as e:
+        logger.exception("Error in enqueue_job")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/jobs/requeue-dead")
+async def requeue_dead_jobs(job_id: Optional[int] = None, kind: Optional[str] = None):
+    try:
+        return {"requeued": await job_queue.requeue_dead(job_id=job_id, kind=kind)}
+    except Exception as e:
+        logger.exception("Error in requeue_dead_jobs")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/grader/stats")
+async def get_grader_stats():
+    return local_grader.stats()
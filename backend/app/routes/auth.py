@@ -1,25 +1,23 @@
 # app/routes/auth.py
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
-from typing import Optional
 from pydantic import BaseModel, EmailStr
-from jose import jwt, JWTError
 from ..database import get_db
 from ..models.models import User
 from ..utils.auth import (
-    verify_password, get_password_hash,
     create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES,
-    SECRET_KEY, ALGORITHM
+    Principal, get_current_principal, cache_principal
 )
+from ..utils.password import password_hasher
+import logging
+
+logger = logging.getLogger(__name__)
 
 # プレフィックスを/api/v1に変更
 router = APIRouter(prefix="/api/v1", tags=["auth"])
 
-# OAuth2スキームの定義を修正
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/login")
-
 class UserCreate(BaseModel):
     email: EmailStr
     password: str
@@ -34,90 +32,73 @@ class UserResponse(BaseModel):
     class Config:
         from_attributes = True
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Invalid authentication credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        print(f"Received token: {token[:10]}...")  # デバッグ用
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            print("No email in token")
-            raise credentials_exception
-        print(f"Token email: {email}")
-    except JWTError as e:
-        print(f"JWT Error: {str(e)}")
-        raise credentials_exception
-    except Exception as e:
-        print(f"Unexpected error: {str(e)}")
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
-        print("User not found in database")
-        raise credentials_exception
-        
-    print(f"Found user: {user.id}")
-    return user
-
 @router.post("/register", response_model=Token)
-async def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    print(f"Registration attempt for: {user.email}")  # デバッグ用
-    if db.query(User).filter(User.email == user.email).first():
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(User).where(User.email == user.email))
+    if result.scalars().first():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    hashed_password = get_password_hash(user.password)
+    # bcryptはプロセスプールで計算し、イベントループを止めない
+    hashed_password = await password_hasher.hash(user.password)
     db_user = User(email=user.email, hashed_password=hashed_password)
     
     try:
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
-        print(f"User created with ID: {db_user.id}")  # デバッグ用
-    except Exception as e:
-        print(f"Error creating user: {str(e)}")  # デバッグ用
-        db.rollback()
+        await db.commit()
+        await db.refresh(db_user)
+        logger.info("User registered", extra={"user_id": db_user.id})
+    except Exception:
+        logger.exception("Error creating user")
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create user"
         )
 
+    cache_principal(db_user)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email},
+        data={"sub": db_user.email, "uid": db_user.id},
         expires_delta=access_token_expires
     )
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/login", response_model=Token)
-async def login(user: UserCreate, db: Session = Depends(get_db)):
-    print(f"Login attempt for: {user.email}")  # デバッグ用
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+async def login(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(User).where(User.email == user.email))
+    db_user = result.scalars().first()
+    verified, new_hash = (False, None)
+    if db_user:
+        verified, new_hash = await password_hasher.verify(user.password, db_user.hashed_password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    # ハッシュのパラメータが変わっていれば新しいハッシュに置き換える
+    if new_hash:
+        try:
+            db_user.hashed_password = new_hash
+            await db.commit()
+        except Exception:
+            logger.exception("Error rehashing password")
+            await db.rollback()
     
+    cache_principal(db_user)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email},
+        data={"sub": db_user.email, "uid": db_user.id},
         expires_delta=access_token_expires
     )
-    print(f"Login successful for: {user.email}")  # デバッグ用
+    logger.debug("Login succeeded", extra={"user_id": db_user.id})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: Principal = Depends(get_current_principal)):
     return current_user
\ No newline at end of file
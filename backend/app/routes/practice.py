@@ -0,0 +1,193 @@
+# app/routes/practice.py
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from pydantic import ValidationError
+from typing import Optional
+from ..database import SessionLocal
+from ..models.models import Question
+from ..utils.answer_writer import answer_writer
+from ..utils.auth import Principal, resolve_principal
+from ..utils.grader import local_grader, grading_details
+from ..utils.llm import stream_chat_completion
+from ..utils.mistake_words import mistake_word_pipeline
+from ..utils.prompts import grading_messages
+from ..config import settings
+from .question import AnswerRequest, next_question
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+# 送信キューに入れるとソケットを閉じる合図
+_CLOSE = None
+
+class PracticeSession:
+    """1本のWebSocket上で出題と添削を繰り返す練習セッション
+
+    受信・処理・送信をそれぞれ別タスクにし、間を上限付きのキューでつなぐ。
+    処理が追いつかなければ受信を、クライアントの読み取りが遅ければ添削のストリームを待たせる。
+    """
+
+    def __init__(self, websocket: WebSocket, principal: Principal):
+        self.websocket = websocket
+        self.principal = principal
+        self.inbox: asyncio.Queue = asyncio.Queue(maxsize=settings.PRACTICE_RECEIVE_QUEUE_SIZE)
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=settings.PRACTICE_SEND_QUEUE_SIZE)
+        # 回答を入力している間に用意しておく次の問題
+        self.prefetch: Optional[asyncio.Task] = None
+
+    async def run(self) -> None:
+        receiver = asyncio.create_task(self._receive_loop())
+        sender = asyncio.create_task(self._send_loop())
+        handler = asyncio.create_task(self._handle_loop())
+        try:
+            # 切断（受信側）かソケットを閉じた（送信側）時点でセッションを終える
+            await asyncio.wait({receiver, sender}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # 添削中のLLMストリームや先読みも含めて取り消す
+            tasks = [task for task in (receiver, sender, handler, self.prefetch) if task is not None]
+            for task in tasks:
+                task.cancel()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception) and not isinstance(result, (WebSocketDisconnect, HTTPException)):
+                    logger.error("Practice session task failed: %r", result, extra={"user_id": self.principal.id})
+
+    async def send(self, message: Optional[dict]) -> None:
+        await self.outbox.put(message)
+
+    async def _receive_loop(self) -> None:
+        while True:
+            text = await self.websocket.receive_text()
+            try:
+                message = json.loads(text)
+            except ValueError:
+                message = None
+            if not isinstance(message, dict):
+                await self.send({"type": "error", "status": 400, "detail": "Messages must be JSON objects"})
+                continue
+            await self.inbox.put(message)
+
+    async def _send_loop(self) -> None:
+        while True:
+            message = await self.outbox.get()
+            if message is _CLOSE:
+                await self.websocket.close()
+                return
+            await self.websocket.send_json(message)
+
+    async def _handle_loop(self) -> None:
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(self.inbox.get(), settings.PRACTICE_IDLE_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    await self.send({"type": "error", "status": 408, "detail": "Practice session timed out"})
+                    break
+                await self._handle(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Error in practice session")
+        await self.send(_CLOSE)
+
+    async def _handle(self, message: dict) -> None:
+        kind = message.get("type")
+        try:
+            if kind == "next":
+                await self._serve_question()
+            elif kind == "answer":
+                await self._grade(message)
+            else:
+                raise HTTPException(status_code=400, detail=f"Unknown message type: {kind}")
+        except HTTPException as e:
+            await self.send({"type": "error", "status": e.status_code, "detail": e.detail})
+        except ValidationError as e:
+            await self.send({"type": "error", "status": 422, "detail": e.errors(include_url=False)})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Error handling practice message %s", kind)
+            await self.send({"type": "error", "status": 500, "detail": str(e)})
+
+    async def _generate(self) -> Question:
+        async with SessionLocal() as db:
+            return await next_question(db, self.principal.id)
+
+    def _start_prefetch(self) -> None:
+        if settings.PRACTICE_PREFETCH_ENABLED and self.prefetch is None:
+            self.prefetch = asyncio.create_task(self._generate())
+
+    async def _serve_question(self) -> None:
+        question = None
+        task, self.prefetch = self.prefetch, None
+        if task is not None:
+            try:
+                question = await task
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 先読みに失敗した場合はその場で生成し直す
+                logger.warning("Prefetching the next question failed: %r", e, extra={"user_id": self.principal.id})
+        prefetched = question is not None
+        if question is None:
+            question = await self._generate()
+
+        # 先読みした問題が使われずに切断されても、問題は保存済みなので他の出題で再利用される
+        await self.send({
+            "type": "question",
+            "id": question.id,
+            "japanese_text": question.japanese_text,
+            "prefetched": prefetched
+        })
+        # 回答を入力している間に次の問題を用意しておく
+        self._start_prefetch()
+
+    async def _grade(self, message: dict) -> None:
+        request = AnswerRequest(**{key: message.get(key) for key in ("question_id", "answer_text")})
+        async with SessionLocal() as db:
+            question = await db.get(Question, request.question_id)
+        if not question:
+            raise HTTPException(status_code=404, detail="Question not found")
+
+        chunks = []
+        local = local_grader.grade(question.english_text, request.answer_text)
+        if local and local.fast_path:
+            chunks.append(local.feedback)
+            await self.send({"type": "delta", "question_id": request.question_id, "delta": local.feedback})
+        else:
+            messages = grading_messages(question.japanese_text, request.answer_text)
+            async for delta in stream_chat_completion(messages=messages, user_id=self.principal.id):
+                chunks.append(delta)
+                await self.send({"type": "delta", "question_id": request.question_id, "delta": delta})
+
+        feedback = "".join(chunks)
+        await answer_writer.submit(self.principal.id, request.question_id, request.answer_text, feedback)
+
+        mistake_word_pipeline.submit(self.principal.id, request.answer_text, feedback)
+        await self.send({
+            "type": "feedback",
+            "question_id": request.question_id,
+            "feedback": feedback,
+            **grading_details(local)
+        })
+
+@router.websocket("/ws")
+async def practice_socket(websocket: WebSocket):
+    await websocket.accept()
+    # 最初のメッセージで1回だけ認証する（URLにトークンを載せないため）
+    try:
+        message = await asyncio.wait_for(websocket.receive_json(), settings.PRACTICE_AUTH_TIMEOUT_SECONDS)
+        if not isinstance(message, dict) or message.get("type") != "auth" or not message.get("token"):
+            raise HTTPException(status_code=401, detail="Authentication required")
+        async with SessionLocal() as db:
+            principal = await resolve_principal(str(message["token"]), db)
+    except WebSocketDisconnect:
+        return
+    except (asyncio.TimeoutError, HTTPException, ValueError):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.send_json({"type": "ready"})
+    await PracticeSession(websocket, principal).run()
@@ -1,39 +1,68 @@
 # app/routes/question.py
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import and_, delete, exists, func, literal, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel  # 正しいインポート
 from datetime import datetime
-from ..database import get_db
-from ..models.models import Question, UserAnswer, MistakeWord, FavoriteQuestion, User
-from ..routes.auth import get_current_user  # authからインポート
-import os
-from openai import OpenAI
+from ..database import get_db, engine, upsert_insert
+from ..models.models import (
+    Question, UserAnswer, MistakeWord, FavoriteQuestion, QUESTION_SOURCE_GENERATED, QUESTION_SOURCE_USER
+)
+from ..utils.answer_writer import answer_writer
+from ..utils.auth import Principal, get_current_principal  # authからインポート
+from ..utils.grader import local_grader, grading_details
+from ..jobs import FILL_REFERENCE_ANSWER
+from ..utils.job_queue import enqueue
+from ..utils.llm import chat_completion, stream_chat_completion
+from ..utils.mistake_words import mistake_word_pipeline
+from ..utils.prompts import grading_messages, question_messages, batch_grading_messages
+from ..utils.question_index import question_index
+from ..utils.question_pool import question_pool, SOURCE_MISTAKE, SOURCE_RANDOM
+from ..config import settings
+from ..utils.sse import sse_event, sse_response
+from ..utils.style_variations import generate_style_variations, normalize_variation_types
+import asyncio
+import base64
+import hashlib
+import json
+import logging
 import random
 from dotenv import load_dotenv
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 # リクエストモデルの定義をルートハンドラーの前に配置
 class AnswerRequest(BaseModel):
     question_id: int
     answer_text: str
 
+class BatchAnswerRequest(BaseModel):
+    items: List[AnswerRequest]
+
 class SaveFavoriteRequest(BaseModel):
     question_id: int | None = None  # オプショナルなのでデフォルト値をNoneに設定
     japanese_text: str
     english_answer: str
 
 class FavoriteQuestionResponse(BaseModel):
-    id: int
-    japanese_text: str
-    english_answer: str
-    created_at: datetime
+    # fieldsで射影した場合は指定された項目だけを返す
+    id: Optional[int] = None
+    japanese_text: Optional[str] = None
+    english_answer: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+FAVORITE_FIELDS = {
+    "id": FavoriteQuestion.id,
+    "japanese_text": FavoriteQuestion.japanese_text,
+    "english_answer": FavoriteQuestion.english_answer,
+    "created_at": FavoriteQuestion.created_at,
+}
 
 # リクエストモデルを追加
 class StyleVariationRequest(BaseModel):
@@ -41,132 +70,342 @@ class StyleVariationRequest(BaseModel):
     user_answer: str
     variation_type: str
 
+# 生成する問題の難易度
+DEFAULT_DIFFICULTY_LEVEL = 1
+
+async def next_question(db: AsyncSession, user_id: int) -> Question:
+    """次の問題を返す（練習用WebSocketの先読みからも使う）
+
+    未回答の既存の問題に合うものがあれば再利用し、なければ新しく生成して保存する。
+    """
+    # 間違えた単語があるか確認
+    result = await db.execute(
+        select(MistakeWord).where(
+            MistakeWord.user_id == user_id
+        ).order_by(MistakeWord.count.desc()).limit(5)
+    )
+    mistake_words = result.scalars().all()
+
+    words = [mistake.word for mistake in mistake_words]
+    source = SOURCE_MISTAKE if words else SOURCE_RANDOM
+
+    if settings.EMBEDDING_INDEX_ENABLED:
+        # 回答済みの判定に保存待ちの回答も含める
+        await answer_writer.flush_user(user_id)
+        question_id = await question_index.suggest(db, user_id, words, DEFAULT_DIFFICULTY_LEVEL)
+        question = await db.get(Question, question_id) if question_id else None
+        if question:
+            question_index.mark_served(user_id, question.id)
+            return question
+
+    # 事前生成済みのプールから取り出し、空の場合のみその場で生成する
+    japanese_text = None
+    if settings.QUESTION_POOL_ENABLED:
+        japanese_text = question_pool.pop(user_id, source, words)
+    if japanese_text is None:
+        # 間違えた単語があればそれを含む問題、なければランダムな問題を生成
+        word = random.choice(words) if words else None
+        japanese_text = await chat_completion(
+            messages=question_messages(word), coalesce=False, user_id=user_id
+        )
+
+    # 問題をデータベースに保存
+    question = Question(
+        japanese_text=japanese_text,
+        english_text="",
+        difficulty_level=DEFAULT_DIFFICULTY_LEVEL,
+        source=QUESTION_SOURCE_GENERATED
+    )
+    db.add(question)
+    if settings.JOB_REFERENCE_ANSWERS_ENABLED:
+        # 模範解答はワーカーで生成し、以降の添削を手元で済ませられるようにする（問題と同じコミットで登録）
+        await db.flush()
+        enqueue(db, FILL_REFERENCE_ANSWER, {"question_id": question.id}, priority=-1)
+    await db.commit()
+    await db.refresh(question)
+    if settings.EMBEDDING_INDEX_ENABLED:
+        question_index.add(question)
+        question_index.mark_served(user_id, question.id)
+    return question
+
 # AIによる問題生成部分の修正
 @router.post("/generate")
 async def generate_question(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     try:
-        # 間違えた単語があるか確認
-        mistake_words = db.query(MistakeWord).filter(
-            MistakeWord.user_id == current_user.id
-        ).order_by(MistakeWord.count.desc()).limit(5).all()
-        
-        if mistake_words:
-            # 間違えた単語を含む問題を生成
-            word = random.choice(mistake_words).word
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "日本語の自然な文章を一文で生成してください。指定された英単語を使う日本語の文を作成します。"},
-                    {"role": "user", "content": f"英単語「{word}」を使う自然な日本語の文章を作成してください。"}
-                ]
-            )
-            japanese_text = response.choices[0].message.content
-        else:
-            # ランダムな問題を生成
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "英語学習のための日本語の自然な文章を一文で生成してください。ビジネスシーンや日常生活で使える表現を含める文章にしてください。"},
-                    {"role": "user", "content": "英語翻訳練習用の自然な日本語の文章を作成してください。"}
-                ]
-            )
-            japanese_text = response.choices[0].message.content
-        
-        # 問題をデータベースに保存
-        question = Question(
-            japanese_text=japanese_text,
-            english_text="",
-            difficulty_level=1
-        )
-        db.add(question)
-        db.commit()
-        db.refresh(question)
+        question = await next_question(db, current_user.id)
         
         return {
             "id": question.id,
-            "japanese_text": japanese_text
+            "japanese_text": question.japanese_text
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in generate_question: {str(e)}")
-        db.rollback()
+        logger.exception("Error in generate_question")
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 # AIによる添削部分の修正
 @router.post("/check")
 async def check_answer(
     request: AnswerRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     try:
-        question = db.query(Question).filter(Question.id == request.question_id).first()
+        question = await db.get(Question, request.question_id)
         if not question:
             raise HTTPException(status_code=404, detail="Question not found")
 
-        # AIによる添削（日本語フィードバック）
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": """
-                あなたは英語教師です。学習者の英訳を添削し、日本語でフィードバックを提供してください。
-                フィードバックには以下を箇条書き形式で含めてください：
-                - 改善点
-                - 正確な答え(全文を出す)
-                - 文法や語彙の解説
-                """},
-                {"role": "user", "content": f"以下の英訳を添削してください。\n\n元の日本語: {question.japanese_text}\n学習者の英訳: {request.answer_text}"}
-            ]
-        )
+        # 模範解答と一致・ほぼ一致ならLLMを呼ばずに添削する
+        local = local_grader.grade(question.english_text, request.answer_text)
+        if local and local.fast_path:
+            feedback = local.feedback
+        else:
+            # AIによる添削（日本語フィードバック）
+            feedback = await chat_completion(
+                messages=grading_messages(question.japanese_text, request.answer_text),
+                user_id=current_user.id
+            )
         
-        feedback = response.choices[0].message.content
+        # 回答は他のリクエストの回答とまとめて保存する
+        await answer_writer.submit(current_user.id, request.question_id, request.answer_text, feedback)
+
+        # 間違えた単語の抽出はバックグラウンドで行う
+        mistake_word_pipeline.submit(current_user.id, request.answer_text, feedback)
         
-        # 回答を保存
-        user_answer = UserAnswer(
-            user_id=current_user.id,
-            question_id=request.question_id,
-            user_answer=request.answer_text,
-            feedback=feedback
+        return {"feedback": feedback, **grading_details(local)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error in check_answer")
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _grade_chunk(items: List[Tuple[int, str, str]], user_id: int) -> Dict[int, str]:
+    """複数の回答を1回の補完で添削し、リクエスト内の位置ごとのフィードバックを返す"""
+    content = await chat_completion(
+        messages=batch_grading_messages([(japanese, answer) for _, japanese, answer in items]),
+        user_id=user_id,
+        response_format={"type": "json_object"}
+    )
+    results = json.loads(content).get("results", [])
+    feedbacks = {}
+    for result in results:
+        try:
+            number = int(result["index"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 1 <= number <= len(items) and result.get("feedback"):
+            feedbacks[items[number - 1][0]] = str(result["feedback"])
+    return feedbacks
+
+# 複数の回答をまとめて添削（ワークシート用）
+@router.post("/check/batch")
+async def check_answers_batch(
+    request: BatchAnswerRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    if not request.items:
+        raise HTTPException(status_code=400, detail="No answers submitted")
+    if len(request.items) > settings.BATCH_GRADING_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many answers (max {settings.BATCH_GRADING_MAX_ITEMS})"
         )
-        db.add(user_answer)
-        db.commit()
-        
-        return {"feedback": feedback}
+
+    try:
+        question_ids = {item.question_id for item in request.items}
+        result = await db.execute(
+            select(Question.id, Question.japanese_text).where(Question.id.in_(question_ids))
+        )
+        questions = {row.id: row.japanese_text for row in result}
+
+        feedbacks: Dict[int, str] = {}
+        errors: Dict[int, str] = {}
+        pending = []
+        for index, item in enumerate(request.items):
+            if item.question_id not in questions:
+                errors[index] = "Question not found"
+            else:
+                pending.append((index, questions[item.question_id], item.answer_text))
+
+        # チャンクごとに1回の補完で添削し、チャンク同士は上限付きで並列実行する
+        size = settings.BATCH_GRADING_CHUNK_SIZE
+        chunks = [pending[i:i + size] for i in range(0, len(pending), size)]
+        semaphore = asyncio.Semaphore(settings.BATCH_GRADING_PARALLEL_CHUNKS)
+
+        async def grade(chunk):
+            async with semaphore:
+                try:
+                    feedbacks.update(await _grade_chunk(chunk, current_user.id))
+                except HTTPException as e:
+                    for index, _, _ in chunk:
+                        errors[index] = e.detail
+                except Exception as e:
+                    logger.exception("Error grading batch chunk")
+                    for index, _, _ in chunk:
+                        errors[index] = str(e)
+
+        await asyncio.gather(*(grade(chunk) for chunk in chunks))
+
+        for index, _, _ in pending:
+            if index not in feedbacks and index not in errors:
+                errors[index] = "No feedback returned for this answer"
+
+        # 添削できた回答は他のリクエストの回答とまとめて保存する
+        for index, feedback in sorted(feedbacks.items()):
+            await answer_writer.submit(
+                current_user.id,
+                request.items[index].question_id,
+                request.items[index].answer_text,
+                feedback
+            )
+        for index, feedback in feedbacks.items():
+            mistake_word_pipeline.submit(current_user.id, request.items[index].answer_text, feedback)
+
+        return {
+            "results": [
+                {
+                    "index": index,
+                    "question_id": item.question_id,
+                    "feedback": feedbacks.get(index),
+                    "error": errors.get(index)
+                }
+                for index, item in enumerate(request.items)
+            ],
+            "succeeded": len(feedbacks),
+            "failed": len(errors)
+        }
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in check_answer: {str(e)}")
-        db.rollback()
+        logger.exception("Error in check_answers_batch")
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
+# 添削結果をSSEで逐次返すストリーミング版
+@router.post("/check/stream")
+async def check_answer_stream(
+    request: AnswerRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    question = await db.get(Question, request.question_id)
+    if not question:
+        raise HTTPException(status_code=404, detail="Question not found")
+
+    messages = grading_messages(question.japanese_text, request.answer_text)
+    user_id = current_user.id
+    local = local_grader.grade(question.english_text, request.answer_text)
+
+    async def events():
+        chunks = []
+        try:
+            if local and local.fast_path:
+                # 手元で添削できた場合はLLMを呼ばずに1回で返す
+                chunks.append(local.feedback)
+                yield sse_event({"delta": local.feedback})
+            else:
+                async for delta in stream_chat_completion(messages=messages, user_id=user_id):
+                    chunks.append(delta)
+                    yield sse_event({"delta": delta})
+        except HTTPException as e:
+            yield sse_event({"status": e.status_code, "detail": e.detail}, event="error")
+            return
+        except Exception as e:
+            logger.exception("Error in check_answer_stream")
+            yield sse_event({"status": 500, "detail": str(e)}, event="error")
+            return
+
+        feedback = "".join(chunks)
+        # ストリーム完了後に回答を保存待ちに積む
+        try:
+            await answer_writer.submit(user_id, request.question_id, request.answer_text, feedback)
+        except Exception:
+            logger.exception("Error saving streamed answer")
+
+        mistake_word_pipeline.submit(user_id, request.answer_text, feedback)
+        yield sse_event({"feedback": feedback, **grading_details(local)}, event="done")
+
+    return sse_response(events())
+
+def _toggle_favorite_statement(user_id: int, question_id: int):
+    """削除できればお気に入り解除、なければ追加する1文（PostgreSQLのデータ変更CTE）
+
+    戻り値は操作後にお気に入りかどうか。同時に追加された場合も一意制約で1行に保たれる。
+    """
+    now = datetime.utcnow()
+    owned = and_(FavoriteQuestion.user_id == user_id, FavoriteQuestion.question_id == question_id)
+    # 解除するお気に入りを参照している回答は、ORMのdeleteと同様に参照を外す
+    detached = (
+        update(UserAnswer)
+        .where(UserAnswer.favorite_question_id.in_(select(FavoriteQuestion.id).where(owned)))
+        .values(favorite_question_id=None)
+        .returning(UserAnswer.id)
+        .cte("detached")
+    )
+    deleted = delete(FavoriteQuestion).where(owned).returning(FavoriteQuestion.id).cte("deleted")
+    inserted = (
+        upsert_insert(FavoriteQuestion)
+        .from_select(
+            ["user_id", "question_id", "created_at", "updated_at", "due_at"],
+            select(literal(user_id), literal(question_id), literal(now), literal(now), literal(now))
+            .where(~exists(select(deleted.c.id)))
+        )
+        .on_conflict_do_nothing(index_elements=["user_id", "question_id"])
+        .returning(FavoriteQuestion.id)
+        .cte("inserted")
+    )
+    return select(~exists(select(deleted.c.id))).add_cte(detached, inserted)
+
 @router.post("/{question_id}/favorite")
 async def toggle_favorite(
     question_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     try:
-        existing = db.query(FavoriteQuestion).filter(
-            FavoriteQuestion.user_id == current_user.id,
-            FavoriteQuestion.question_id == question_id
-        ).first()
-        
-        if existing:
-            db.delete(existing)
-            is_favorite = False
+        # 保存待ちの回答も解除したお気に入りへの参照を外せるよう、先に書き込んでおく
+        await answer_writer.flush_user(current_user.id)
+        if engine.dialect.name == "postgresql":
+            result = await db.execute(_toggle_favorite_statement(current_user.id, question_id))
+            is_favorite = result.scalar()
         else:
-            favorite = FavoriteQuestion(
-                user_id=current_user.id,
-                question_id=question_id
+            # SQLiteはデータ変更CTEに対応していないため、同じ処理を1トランザクション内で順に行う
+            owned = and_(
+                FavoriteQuestion.user_id == current_user.id,
+                FavoriteQuestion.question_id == question_id
             )
-            db.add(favorite)
-            is_favorite = True
-        
-        db.commit()
+            await db.execute(
+                update(UserAnswer)
+                .where(UserAnswer.favorite_question_id.in_(select(FavoriteQuestion.id).where(owned)))
+                .values(favorite_question_id=None)
+            )
+            deleted = (await db.execute(
+                delete(FavoriteQuestion).where(owned).returning(FavoriteQuestion.id)
+            )).first()
+            if not deleted:
+                now = datetime.utcnow()
+                await db.execute(
+                    upsert_insert(FavoriteQuestion)
+                    .values(
+                        user_id=current_user.id, question_id=question_id,
+                        created_at=now, updated_at=now, due_at=now
+                    )
+                    .on_conflict_do_nothing(index_elements=["user_id", "question_id"])
+                )
+            is_favorite = not deleted
+
+        await db.commit()
         return {"is_favorite": is_favorite}
     except Exception as e:
-        print(f"Error in toggle_favorite: {str(e)}")  # エラーログを追加
-        db.rollback()
+        logger.exception("Error in toggle_favorite")
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -174,44 +413,49 @@ async def toggle_favorite(
 @router.post("/save-favorite")
 async def save_favorite_question(
     request: SaveFavoriteRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     try:
-        # 新しい問題を作成または既存の問題を更新
-        if request.question_id:
-            question = db.query(Question).filter(Question.id == request.question_id).first()
-            if question:
-                question.japanese_text = request.japanese_text
-                question.english_text = request.english_answer
-            else:
-                question = Question(
-                    japanese_text=request.japanese_text,
-                    english_text=request.english_answer,
-                    difficulty_level=1
-                )
-                db.add(question)
-        else:
+        # 問題は他のユーザーにも出題されるため書き換えず、ユーザーが編集した本文はお気に入り側にだけ保存する
+        question = await db.get(Question, request.question_id) if request.question_id else None
+        if question is None:
+            # ユーザーが入力した文は本人のお気に入りにだけ使い、索引から他のユーザーに出題しない。
+            # 利用者の訳も模範解答として共有しない（模範解答はワーカーで生成する）
             question = Question(
                 japanese_text=request.japanese_text,
-                english_text=request.english_answer,
-                difficulty_level=1
+                english_text="",
+                difficulty_level=DEFAULT_DIFFICULTY_LEVEL,
+                source=QUESTION_SOURCE_USER
             )
             db.add(question)
-        
-        db.commit()
-        db.refresh(question)
+            # コミットせずにフラッシュだけして問題IDを確定させる
+            await db.flush()
+            if settings.JOB_REFERENCE_ANSWERS_ENABLED:
+                enqueue(db, FILL_REFERENCE_ANSWER, {"question_id": question.id}, priority=-1)
 
-        # お気に入りとして保存
-        favorite = FavoriteQuestion(
+        # お気に入りとして保存（既に登録済みなら本文を更新する）
+        now = datetime.utcnow()
+        statement = upsert_insert(FavoriteQuestion).values(
             user_id=current_user.id,
             question_id=question.id,
             japanese_text=request.japanese_text,
             english_answer=request.english_answer,
-            created_at=datetime.utcnow()  # 明示的に設定
+            created_at=now,
+            updated_at=now,
+            due_at=now
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=["user_id", "question_id"],
+            set_={
+                "japanese_text": statement.excluded.japanese_text,
+                "english_answer": statement.excluded.english_answer,
+                "updated_at": statement.excluded.updated_at,
+            }
         )
-        db.add(favorite)
-        db.commit()
+        await db.execute(statement)
+        # 問題とお気に入りを1回のコミットで保存する
+        await db.commit()
 
         return {
             "success": True,
@@ -219,68 +463,111 @@ async def save_favorite_question(
             "message": "Question saved successfully"
         }
     except Exception as e:
-        print(f"Error in save_favorite_question: {str(e)}")
-        db.rollback()
+        logger.exception("Error in save_favorite_question")
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/favorites", response_model=List[FavoriteQuestionResponse])
+def _encode_cursor(created_at: datetime, favorite_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{favorite_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    created_at, favorite_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+    return datetime.fromisoformat(created_at), int(favorite_id)
+
+@router.get(
+    "/favorites",
+    response_model=List[FavoriteQuestionResponse],
+    response_model_exclude_unset=True
+)
 async def get_favorite_questions(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=settings.FAVORITES_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
+    # limit も cursor も指定しない従来のクライアント（復習画面など）には全件を返す
+    paginated = limit is not None or cursor is not None
+    if paginated and limit is None:
+        limit = settings.FAVORITES_DEFAULT_LIMIT
+    # 返す項目の射影（未指定なら全項目）
+    if fields:
+        selected = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in selected if name not in FAVORITE_FIELDS]
+        if unknown or not selected:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    else:
+        selected = list(FAVORITE_FIELDS)
+
+    after = None
+    if cursor:
+        try:
+            after = _decode_cursor(cursor)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
     try:
-        favorites = db.query(FavoriteQuestion).filter(
-            FavoriteQuestion.user_id == current_user.id
-        ).order_by(FavoriteQuestion.created_at.desc()).all()
-        
-        return [{
-            "id": fav.id,
-            "japanese_text": fav.japanese_text,
-            "english_answer": fav.english_answer,
-            "created_at": fav.created_at
-        } for fav in favorites]
+        # 件数・最大ID・最終更新日時は複合インデックスだけで集計でき、行本体を読まない
+        summary = (await db.execute(
+            select(
+                func.count(FavoriteQuestion.id),
+                func.max(FavoriteQuestion.id),
+                func.max(FavoriteQuestion.updated_at)
+            ).where(FavoriteQuestion.user_id == current_user.id)
+        )).one()
+        version = f"{current_user.id}:{summary[0]}:{summary[1]}:{summary[2]}:{cursor}:{limit}:{','.join(selected)}"
+        etag = '"' + hashlib.sha1(version.encode()).hexdigest() + '"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+
+        # (created_at, id) の降順でキーセットページネーション
+        columns = {name: FAVORITE_FIELDS[name] for name in selected}
+        columns.setdefault("id", FavoriteQuestion.id)
+        columns.setdefault("created_at", FavoriteQuestion.created_at)
+        statement = select(*columns.values()).where(FavoriteQuestion.user_id == current_user.id)
+        if after:
+            statement = statement.where(
+                tuple_(FavoriteQuestion.created_at, FavoriteQuestion.id) < tuple_(*after)
+            )
+        statement = statement.order_by(
+            FavoriteQuestion.created_at.desc(), FavoriteQuestion.id.desc()
+        )
+        if paginated:
+            statement = statement.limit(limit + 1)
+        rows = (await db.execute(statement)).all()
+
+        response.headers["ETag"] = etag
+        if paginated and len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            response.headers["X-Next-Cursor"] = _encode_cursor(last.created_at, last.id)
+
+        return [{name: row._mapping[name] for name in selected} for row in rows]
     except Exception as e:
-        print(f"Error fetching favorite questions: {str(e)}")
+        logger.exception("Error fetching favorite questions")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/style-variation")
+@router.post("/style-variation", deprecated=True)
 async def get_style_variation(
     request: StyleVariationRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
+    """旧形式の言い換え（1種類）。/translation/style-variations と同じ構造化出力で生成し、英訳と解説をまとめた文章で返す"""
+    variation_types = normalize_variation_types([request.variation_type])
     try:
-        variation_type = request.variation_type
-        context = ""
-        
-        if variation_type.startswith("context:"):
-            context = variation_type[8:]
-            system_prompt = f"""
-            あなたは英語教師です。以下の日本語を、指定されたシチュエーション（{context}）に適した英語に翻訳し、
-            その表現が適切な理由と、シチュエーションにおける言い回しのポイントを日本語で解説してください。
-            回答は以下の箇条書きでお願いします。
-            - 翻訳
-            - 解説
-            """
-        else:
-            style = "フォーマル" if variation_type == "formal" else "カジュアル"
-            system_prompt = f"""
-            あなたは英語教師です。以下の日本語を{style}な英語表現に翻訳し、
-            なぜその表現が{style}な場面に適しているのか、言い回しのポイントを日本語で解説してください。
-            """
-
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"日本語: {request.japanese_text}\n学習者の訳文: {request.user_answer}"}
-            ]
+        variations = await generate_style_variations(
+            request.japanese_text, request.user_answer, variation_types, current_user.id
         )
-        
-        feedback = response.choices[0].message.content
-        return {"feedback": feedback}
-        
+        variation = variations[0]
+        return {"feedback": f"英訳：{variation['translation']}\n\n解説：{variation['explanation']}"}
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in get_style_variation: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        logger.exception("Error in get_style_variation")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,66 +1,179 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from datetime import datetime
-from ..database import get_db
-from ..models.models import Question, UserAnswer, FavoriteQuestion, User
-from ..routes.auth import get_current_user
-import os
-from openai import OpenAI
+from typing import List, Optional
+from ..config import settings
+from ..database import get_db, SessionLocal
+from ..models.models import FavoriteQuestion
+from ..utils.answer_writer import answer_writer
+from ..utils.auth import Principal, get_current_principal
+from ..utils.grader import local_grader, grading_details
+from ..utils.llm import chat_completion, stream_chat_completion
+from ..utils.mistake_words import mistake_word_pipeline
+from ..utils.prompts import grading_messages
+from ..utils.srs import apply_review, review_quality, schedule_details
+from ..utils.sse import sse_event, sse_response
+import logging
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
 
 class ReviewAnswerRequest(BaseModel):
     favorite_question_id: int
     answer_text: str
 
+class DueReviewResponse(BaseModel):
+    id: int
+    question_id: Optional[int] = None
+    japanese_text: Optional[str] = None
+    english_answer: Optional[str] = None
+    due_at: Optional[datetime] = None
+    interval_days: float
+    repetitions: int
+
+@router.get("/due", response_model=List[DueReviewResponse])
+async def get_due_reviews(
+    limit: int = Query(settings.REVIEW_DUE_DEFAULT_LIMIT, ge=1, le=settings.REVIEW_DUE_MAX_LIMIT),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    try:
+        # (user_id, due_at) のインデックスを範囲検索するだけで、お気に入りの総数によらない
+        result = await db.execute(
+            select(FavoriteQuestion).where(
+                FavoriteQuestion.user_id == current_user.id,
+                FavoriteQuestion.due_at <= datetime.utcnow()
+            ).order_by(FavoriteQuestion.due_at).limit(limit)
+        )
+        return result.scalars().all()
+    except Exception as e:
+        logger.exception("Error fetching due reviews")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/check")
 async def check_review_answer(
     request: ReviewAnswerRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     try:
         # お気に入りの問題を取得
-        favorite_question = db.query(FavoriteQuestion).filter(
-            FavoriteQuestion.id == request.favorite_question_id,
-            FavoriteQuestion.user_id == current_user.id  # ユーザーの問題であることを確認
-        ).first()
+        result = await db.execute(
+            select(FavoriteQuestion).where(
+                FavoriteQuestion.id == request.favorite_question_id,
+                FavoriteQuestion.user_id == current_user.id  # ユーザーの問題であることを確認
+            )
+        )
+        favorite_question = result.scalars().first()
         
         if not favorite_question:
             raise HTTPException(status_code=404, detail="Favorite question not found")
 
-        # AIによる添削（日本語フィードバック）
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": """
-                あなたは英語教師です。学習者の英訳を添削し、日本語でフィードバックを提供してください。
-                フィードバックには以下を箇条書き形式で含めてください：
-                - 改善点
-                - 正確な答え(全文を出す)
-                - 文法や語彙の解説
-                """},
-                {"role": "user", "content": f"以下の英訳を添削してください。\n\n元の日本語: {favorite_question.japanese_text}\n学習者の英訳: {request.answer_text}"}
-            ]
-        )
+        # 保存済みの英訳と一致・ほぼ一致ならLLMを呼ばずに添削する
+        local = local_grader.grade(favorite_question.english_answer, request.answer_text)
+        if local and local.fast_path:
+            feedback = local.feedback
+        else:
+            # AIによる添削（日本語フィードバック）
+            feedback = await chat_completion(
+                messages=grading_messages(favorite_question.japanese_text, request.answer_text),
+                user_id=current_user.id
+            )
         
-        feedback = response.choices[0].message.content
-        
-        # 回答を保存
-        user_answer = UserAnswer(
-            user_id=current_user.id,
-            question_id=favorite_question.question_id,  # 元の問題IDを保存
-            favorite_question_id=favorite_question.id,  # お気に入り問題IDも保存
-            user_answer=request.answer_text,
-            feedback=feedback
+        # 添削結果から次の復習日を決める
+        apply_review(favorite_question, review_quality(local, request.answer_text, feedback))
+        await db.commit()
+
+        # 回答は他のリクエストの回答とまとめて保存する（元の問題IDとお気に入り問題IDの両方を残す）
+        await answer_writer.submit(
+            current_user.id,
+            favorite_question.question_id,
+            request.answer_text,
+            feedback,
+            favorite_question_id=favorite_question.id
         )
-        db.add(user_answer)
-        db.commit()
+
+        # 間違えた単語の抽出はバックグラウンドで行う
+        mistake_word_pipeline.submit(current_user.id, request.answer_text, feedback)
         
-        return {"feedback": feedback}
+        return {
+            "feedback": feedback,
+            **grading_details(local),
+            "schedule": schedule_details(favorite_question)
+        }
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in check_review_answer: {str(e)}")
-        db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        logger.exception("Error in check_review_answer")
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+# 添削結果をSSEで逐次返すストリーミング版
+@router.post("/check/stream")
+async def check_review_answer_stream(
+    request: ReviewAnswerRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    result = await db.execute(
+        select(FavoriteQuestion).where(
+            FavoriteQuestion.id == request.favorite_question_id,
+            FavoriteQuestion.user_id == current_user.id
+        )
+    )
+    favorite_question = result.scalars().first()
+    if not favorite_question:
+        raise HTTPException(status_code=404, detail="Favorite question not found")
+
+    messages = grading_messages(favorite_question.japanese_text, request.answer_text)
+    user_id = current_user.id
+    question_id = favorite_question.question_id
+    favorite_question_id = favorite_question.id
+    local = local_grader.grade(favorite_question.english_answer, request.answer_text)
+
+    async def events():
+        chunks = []
+        try:
+            if local and local.fast_path:
+                # 手元で添削できた場合はLLMを呼ばずに1回で返す
+                chunks.append(local.feedback)
+                yield sse_event({"delta": local.feedback})
+            else:
+                async for delta in stream_chat_completion(messages=messages, user_id=user_id):
+                    chunks.append(delta)
+                    yield sse_event({"delta": delta})
+        except HTTPException as e:
+            yield sse_event({"status": e.status_code, "detail": e.detail}, event="error")
+            return
+        except Exception as e:
+            logger.exception("Error in check_review_answer_stream")
+            yield sse_event({"status": 500, "detail": str(e)}, event="error")
+            return
+
+        feedback = "".join(chunks)
+        schedule = None
+        # ストリーム完了後に復習予定と回答を保存（依存関係のセッションは既に閉じているため新しく開く）
+        try:
+            await answer_writer.submit(
+                user_id, question_id, request.answer_text, feedback,
+                favorite_question_id=favorite_question_id
+            )
+            async with SessionLocal() as session:
+                favorite = await session.get(FavoriteQuestion, favorite_question_id)
+                if favorite:
+                    apply_review(favorite, review_quality(local, request.answer_text, feedback))
+                await session.commit()
+                if favorite:
+                    schedule = schedule_details(favorite)
+        except Exception:
+            logger.exception("Error saving streamed review answer")
+
+        mistake_word_pipeline.submit(user_id, request.answer_text, feedback)
+        yield sse_event(
+            {"feedback": feedback, **grading_details(local), "schedule": schedule},
+            event="done"
+        )
+
+    return sse_response(events())
@@ -1,19 +1,26 @@
 # app/routes/translation.py
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
+from typing import List, Optional
 from ..database import get_db
-from ..models.models import User
-from ..routes.auth import get_current_user
-import os
-from openai import OpenAI
+from ..utils.auth import Principal, get_current_principal
+from ..utils.llm import chat_completion
+from ..utils.llm_gateway import llm_gateway
+from ..utils.prompts import translation_messages
+from ..utils.response_cache import response_cache, make_key
+from ..utils.sse import sse_event, sse_response
+from ..utils.style_variations import generate_style_variations, normalize_variation_types
+from ..config import settings
 from dotenv import load_dotenv
+import asyncio
 import re
+import logging
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 class TranslationRequest(BaseModel):
     japanese_text: str
@@ -22,95 +29,192 @@ class TranslationResponse(BaseModel):
     translation: str
     explanation: str
 
+def parse_translation(full_response: str) -> dict:
+    """「英訳：」「解説：」形式の応答を英訳と解説に分離する"""
+    translation_match = re.search(r'英訳[：:](.*?)(?=\n\n解説[：:]|\Z)', full_response, re.DOTALL)
+    explanation_match = re.search(r'解説[：:](.*)', full_response, re.DOTALL)
+
+    return {
+        "translation": translation_match.group(1).strip() if translation_match else "",
+        "explanation": explanation_match.group(1).strip() if explanation_match else ""
+    }
+
+# 長文モードで文を区切る文末記号と、その中では区切らない括弧
+_SENTENCE_ENDINGS = "。！？"
+_OPENING_BRACKETS = "「『（"
+_CLOSING_BRACKETS = "」』）"
+
+def split_sentences(text: str) -> List[str]:
+    """日本語の文章を文末（。！？）と改行で文ごとに分ける（括弧の中の文末では分けない）"""
+    sentences = []
+    current = []
+    depth = 0
+    for index, char in enumerate(text):
+        current.append(char)
+        if char in _OPENING_BRACKETS:
+            depth += 1
+        elif char in _CLOSING_BRACKETS:
+            depth = max(depth - 1, 0)
+        following = text[index + 1] if index + 1 < len(text) else ""
+        # 「！？」のように続く文末記号は同じ文に含める
+        if (char in _SENTENCE_ENDINGS and depth == 0 and following not in _SENTENCE_ENDINGS) or char == "\n":
+            sentences.append("".join(current))
+            current = []
+    sentences.append("".join(current))
+    return [sentence.strip() for sentence in sentences if sentence.strip()]
+
 class StyleVariationRequest(BaseModel):
     japanese_text: str
     current_translation: str
     variation_type: str
 
+class StyleVariationsRequest(BaseModel):
+    japanese_text: str
+    current_translation: str = ""
+    variation_types: List[str]
+
+async def translate_text(japanese_text: str, user_id: Optional[int]) -> dict:
+    """日本語を英訳と解説にする（解析済みの結果をキャッシュし、長文モードの各文でも共有する）
+
+    user_id を渡すとその呼び出しを利用上限に数える。呼び出し元で上限を確認済みの場合は None を渡す。
+    """
+    cache_key = make_key("translation", settings.OPENAI_MODEL, japanese_text)
+    if settings.RESPONSE_CACHE_ENABLED:
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            return {**cached, "cached": True}
+
+    full_response = await chat_completion(messages=translation_messages(japanese_text), user_id=user_id)
+
+    # 英訳と解説を分離し、解析済みの結果をキャッシュする（解析に失敗した応答はキャッシュしない）
+    result = parse_translation(full_response)
+    if settings.RESPONSE_CACHE_ENABLED and result["translation"]:
+        await response_cache.set(cache_key, "translation", result)
+    return {**result, "cached": False}
+
 @router.post("/generate")
 async def generate_translation(
     request: TranslationRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": """
-                あなたは英語教師です。以下の形式で回答してください：
-
-                英訳：[英訳を記載]
-
-                解説：
-                - 使用している文法のポイント
-                - 重要な語彙や表現の説明
-                - 翻訳の際の注意点
-                """},
-                {"role": "user", "content": f"以下の日本語を英語に翻訳してください：\n\n{request.japanese_text}"}
-            ]
-        )
-        
-        full_response = response.choices[0].message.content
-        
-        # 英訳と解説を分離
-        translation_match = re.search(r'英訳[：:](.*?)(?=\n\n解説[：:]|\Z)', full_response, re.DOTALL)
-        explanation_match = re.search(r'解説[：:](.*)', full_response, re.DOTALL)
-        
-        translation = translation_match.group(1).strip() if translation_match else ""
-        explanation = explanation_match.group(1).strip() if explanation_match else ""
-        
-        return {
-            "translation": translation,
-            "explanation": explanation
-        }
-        
+        result = await translate_text(request.japanese_text, current_user.id)
+        return {"translation": result["translation"], "explanation": result["explanation"]}
+
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in generate_translation: {str(e)}")
+        logger.exception("Error in generate_translation")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/style-variation")
+def merge_explanations(sentences: List[str], results: List[dict]) -> str:
+    """文ごとの解説を原文の見出し付きで1つにまとめる"""
+    sections = []
+    for index, (sentence, result) in enumerate(zip(sentences, results), start=1):
+        if result["explanation"]:
+            sections.append(f"【{index}】{sentence}\n{result['explanation']}")
+    return "\n\n".join(sections)
+
+# 長文を文ごとに並列で翻訳し、翻訳できた文から順にSSEで返す
+@router.post("/generate/stream")
+async def generate_translation_stream(
+    request: TranslationRequest,
+    current_user: Principal = Depends(get_current_principal)
+):
+    sentences = split_sentences(request.japanese_text)
+    if not sentences:
+        raise HTTPException(status_code=400, detail="No text to translate")
+    if len(sentences) > settings.TRANSLATION_MAX_SENTENCES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many sentences (max {settings.TRANSLATION_MAX_SENTENCES})"
+        )
+    # 利用上限は文の数ではなく翻訳リクエスト1回として数える（長文の途中で上限に達して途切れないように）
+    llm_gateway.check_quota(current_user.id)
+
+    async def events():
+        semaphore = asyncio.Semaphore(settings.TRANSLATION_PARALLEL_SENTENCES)
+
+        async def translate(sentence: str) -> dict:
+            async with semaphore:
+                return await translate_text(sentence, None)
+
+        # 全文を同時に開始し（同時実行数はセマフォで制限）、原文の順に結果を待って返す
+        tasks = [asyncio.create_task(translate(sentence)) for sentence in sentences]
+        results = []
+        try:
+            for index, (sentence, task) in enumerate(zip(sentences, tasks)):
+                result = await task
+                results.append(result)
+                yield sse_event({"index": index, "japanese_text": sentence, **result}, event="sentence")
+        except HTTPException as e:
+            yield sse_event({"index": len(results), "status": e.status_code, "detail": e.detail}, event="error")
+            return
+        except Exception as e:
+            logger.exception("Error in generate_translation_stream")
+            yield sse_event({"index": len(results), "status": 500, "detail": str(e)}, event="error")
+            return
+        finally:
+            # 失敗やクライアントの切断で中断した場合は残りの翻訳を止める
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        yield sse_event(
+            {
+                "translation": " ".join(result["translation"] for result in results if result["translation"]),
+                "explanation": merge_explanations(sentences, results),
+                "sentences": len(sentences),
+                "cached": sum(1 for result in results if result["cached"]),
+            },
+            event="done"
+        )
+
+    return sse_response(events())
+
+@router.post("/style-variation", deprecated=True)
 async def get_style_variation(
     request: StyleVariationRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """旧形式の言い換え（1種類）。/style-variations と同じ構造化出力で生成し、旧形式の応答で返す"""
+    variation_types = normalize_variation_types([request.variation_type])
+    try:
+        variations = await generate_style_variations(
+            request.japanese_text, request.current_translation, variation_types, current_user.id
+        )
+        return {"translation": variations[0]["translation"], "explanation": variations[0]["explanation"]}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error in get_style_variation")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/style-variations")
+async def get_style_variations(
+    request: StyleVariationsRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
+    """複数の種類の言い換えを1回の構造化出力でまとめて生成する（キャッシュ済みの種類は呼び出しから除く）"""
+    variation_types = normalize_variation_types(request.variation_types)
+    if not variation_types:
+        raise HTTPException(status_code=400, detail="No variation types requested")
+    if len(variation_types) > settings.STYLE_VARIATIONS_MAX_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many variation types (max {settings.STYLE_VARIATIONS_MAX_TYPES})"
+        )
+
     try:
-        variation_type = request.variation_type
-        style = "フォーマル" if variation_type == "formal" else "カジュアル"
-        
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": f"""
-                あなたは英語教師です。以下の日本語を{style}な英語表現に翻訳してください。
-                以下の形式で回答してください：
-
-                英訳：[{style}な英訳を記載]
-
-                解説：
-                - なぜこの表現が{style}な場面に適しているのか
-                - 使用している表現や語彙のポイント
-                - 場面に応じた言い回しの違いについて
-                """},
-                {"role": "user", "content": f"日本語: {request.japanese_text}\n現在の英訳: {request.current_translation}"}
-            ]
+        variations = await generate_style_variations(
+            request.japanese_text, request.current_translation, variation_types, current_user.id
         )
-        
-        full_response = response.choices[0].message.content
-        
-        # 英訳と解説を分離
-        translation_match = re.search(r'英訳[：:](.*?)(?=\n\n解説[：:]|\Z)', full_response, re.DOTALL)
-        explanation_match = re.search(r'解説[：:](.*)', full_response, re.DOTALL)
-        
-        translation = translation_match.group(1).strip() if translation_match else ""
-        explanation = explanation_match.group(1).strip() if explanation_match else ""
-        
-        return {
-            "translation": translation,
-            "explanation": explanation
-        }
-        
+        return {"variations": variations}
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in get_style_variation: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        logger.exception("Error in get_style_variations")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,190 @@
+# app/utils/answer_writer.py
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import insert
+from ..config import settings
+from ..database import SessionLocal
+from ..models.models import UserAnswer
+
+logger = logging.getLogger(__name__)
+
+class AnswerWriter:
+    """添削済みの回答をメモリに溜め、件数か経過時間のどちらかでまとめてINSERTする（write-behind）
+
+    回答ごとのコミットをなくし、複数ユーザーの回答を1トランザクションで保存する。
+    キューが一杯のときは submit を待たせ、停止時は残った回答を全て保存してから終了する。
+    """
+
+    def __init__(self, batch_size: int, flush_seconds: float, queue_size: int):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # ユーザーごとの未保存の回答数（flush_user で待つ必要があるかの判定に使う）
+        self._pending: Dict[int, int] = defaultdict(int)
+        self.written = 0
+        self.batches = 0
+        self.row_retries = 0
+        self.failures = 0
+        self.user_flushes = 0
+        self.last_lag_seconds = 0.0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(
+        self,
+        user_id: int,
+        question_id: Optional[int],
+        answer_text: str,
+        feedback: str,
+        favorite_question_id: Optional[int] = None
+    ) -> None:
+        """回答を保存待ちに積む。キューが一杯なら空くまで待つ"""
+        now = datetime.utcnow()
+        row = {
+            "user_id": user_id,
+            "question_id": question_id,
+            "favorite_question_id": favorite_question_id,
+            "user_answer": answer_text,
+            "feedback": feedback,
+            "created_at": now,
+            "updated_at": now,
+        }
+        if self._queue is None:
+            # 未起動（無効化時・スクリプトから）の場合はその場で保存する
+            await self._insert([row])
+            self.written += 1
+            return
+        self._pending[user_id] += 1
+        try:
+            await self._queue.put((time.monotonic(), row))
+        except BaseException:
+            self._release(user_id)
+            raise
+
+    async def flush_user(self, user_id: int) -> None:
+        """そのユーザーの保存待ちの回答を書き込み終えるまで待つ（自分の書き込みを読むため）"""
+        if self._queue is None or not self._pending.get(user_id):
+            return
+        self.user_flushes += 1
+        # キューは先入れ先出しなので、目印より前に積んだ回答は全て保存済みになる
+        done = asyncio.get_running_loop().create_future()
+        await self._queue.put(done)
+        await done
+
+    async def _run(self) -> None:
+        # Noneは停止の合図、Futureは即時に書き込む合図
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch: List[Tuple[float, dict]] = []
+            waiters: List[asyncio.Future] = []
+            self._collect(item, batch, waiters)
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size and not waiters:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                self._collect(item, batch, waiters)
+            await self._flush(batch)
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    @staticmethod
+    def _collect(item, batch: List[Tuple[float, dict]], waiters: List[asyncio.Future]) -> None:
+        if isinstance(item, asyncio.Future):
+            waiters.append(item)
+        else:
+            batch.append(item)
+
+    async def _flush(self, batch: List[Tuple[float, dict]]) -> None:
+        if not batch:
+            return
+        rows = [row for _, row in batch]
+        try:
+            await self._insert(rows)
+            self.written += len(rows)
+        except Exception as e:
+            # 1件の不正な行でバッチ全体を失わないよう、1件ずつ保存し直す
+            logger.warning("Bulk insert of %d answers failed, retrying row by row: %s", len(rows), e)
+            for row in rows:
+                self.row_retries += 1
+                try:
+                    await self._insert([row])
+                    self.written += 1
+                except Exception:
+                    self.failures += 1
+                    logger.exception("Dropping answer that could not be saved", extra={"user_id": row["user_id"]})
+        finally:
+            self.batches += 1
+            self.last_lag_seconds = time.monotonic() - batch[0][0]
+            for row in rows:
+                self._release(row["user_id"])
+
+    async def _insert(self, rows: List[dict]) -> None:
+        # executemany（asyncpgでは複数行のINSERT）で1回のコミットにまとめる
+        async with SessionLocal() as db:
+            await db.execute(insert(UserAnswer), rows)
+            await db.commit()
+
+    def _release(self, user_id: int) -> None:
+        self._pending[user_id] -= 1
+        if self._pending[user_id] <= 0:
+            del self._pending[user_id]
+
+    async def stop(self) -> None:
+        """停止時はキューに残った回答を保存してから終了する"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        # 停止の合図より後に積まれた回答も取りこぼさない
+        batch: List[Tuple[float, dict]] = []
+        waiters: List[asyncio.Future] = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                self._collect(item, batch, waiters)
+        await self._flush(batch)
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._task = None
+        self._queue = None
+
+    def stats(self) -> dict:
+        return {
+            "written": self.written,
+            "batches": self.batches,
+            "average_batch_size": self.written / self.batches if self.batches else 0.0,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "pending_users": len(self._pending),
+            "lag_seconds": self.last_lag_seconds,
+            "user_flushes": self.user_flushes,
+            "row_retries": self.row_retries,
+            "failures": self.failures,
+        }
+
+answer_writer = AnswerWriter(
+    batch_size=settings.ANSWER_WRITER_BATCH_SIZE,
+    flush_seconds=settings.ANSWER_WRITER_FLUSH_SECONDS,
+    queue_size=settings.ANSWER_WRITER_QUEUE_SIZE,
+)
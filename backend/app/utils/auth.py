@@ -1,39 +1,32 @@
 # app/utils/auth.py
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..database import get_db
 from ..models.models import User
 from ..config import settings
+from .ttl_cache import TTLCache
+import logging
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # 環境変数から設定を読み込む
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # tokenUrlを修正
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/login")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    try:
-        return pwd_context.verify(plain_password, hashed_password)
-    except Exception as e:
-        print(f"Password verification error: {str(e)}")  # デバッグ用
-        return False
-
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     try:
         to_encode = data.copy()
@@ -44,41 +37,86 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         to_encode.update({"exp": expire})
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
-    except Exception as e:
-        print(f"Token creation error: {str(e)}")  # デバッグ用
+    except Exception:
+        logger.exception("Token creation error")
         raise
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
+@dataclass(frozen=True)
+class Principal:
+    """認証済みユーザーの軽量な表現（ORMのUserを読み込まずに済ませる）"""
+    id: int
+    email: str
+
+# 解決済みのPrincipalをユーザーIDごとに短時間キャッシュする
+_principal_cache = TTLCache(
+    settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+    settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
+
+def cache_principal(user: User) -> Principal:
+    """ログイン・登録直後のユーザーをキャッシュに載せ、最初のリクエストのDBアクセスを省く"""
+    principal = Principal(id=user.id, email=user.email)
+    _principal_cache.set(principal.id, principal)
+    return principal
+
+def invalidate_principal(user_id: int) -> None:
+    """アカウント情報が変わったときにキャッシュ済みのPrincipalを破棄する
+
+    メールアドレスの変更やユーザーの削除を行う処理は、コミット後に必ず呼び出すこと。
+    呼び出さなかった場合、古いPrincipalは PRINCIPAL_CACHE_TTL_SECONDS の間だけ有効なまま残る。
+    （ログイン時のパスワードの再ハッシュはPrincipalの内容を変えず、cache_principal で載せ直している）
+    """
+    _principal_cache.pop(user_id)
+
+async def resolve_principal(token: str, db: AsyncSession) -> Principal:
+    """トークンを検証してPrincipalを返す（無効なら401のHTTPException）"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid authentication credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        print(f"Validating token: {token[:10]}...")  # デバッグ用
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
+        user_id: Optional[int] = payload.get("uid")
         if email is None:
-            print("No email in token payload")  # デバッグ用
+            logger.debug("Token payload has no subject")
             raise credentials_exception
-        print(f"Token email: {email}")  # デバッグ用
     except JWTError as e:
-        print(f"JWT decode error: {str(e)}")  # デバッグ用
+        # トークンそのものはログに残さない
+        logger.debug("JWT decode error: %s", e)
         raise credentials_exception
-    except Exception as e:
-        print(f"Unexpected error: {str(e)}")  # デバッグ用
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Unexpected error while decoding token")
         raise credentials_exception
-    
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
-        print(f"User not found for email: {email}")  # デバッグ用
+
+    # トークンにユーザーIDが含まれていればキャッシュからDBアクセスなしで解決する
+    if user_id is not None:
+        principal = _principal_cache.get(user_id)
+        if principal is not None and principal.email == email:
+            return principal
+        statement = select(User.id, User.email).where(User.id == user_id)
+    else:
+        # ユーザーIDを含まない旧形式のトークン
+        statement = select(User.id, User.email).where(User.email == email)
+
+    result = await db.execute(statement)
+    row = result.first()
+    if row is None or row.email != email:
+        logger.debug("User not found for token", extra={"user_id": user_id})
         raise credentials_exception
-    
-    print(f"Found user: {user.id}")  # デバッグ用
-    return user
+
+    principal = Principal(id=row.id, email=row.email)
+    _principal_cache.set(principal.id, principal)
+    return principal
+
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> Principal:
+    return await resolve_principal(token, db)
 
 def create_refresh_token(data: dict) -> str:
     """リフレッシュトークンの生成（オプション）"""
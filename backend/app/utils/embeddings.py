@@ -0,0 +1,84 @@
+# app/utils/embeddings.py
+import hashlib
+import re
+import unicodedata
+from typing import List
+import numpy as np
+from ..config import settings
+from .llm import create_embeddings
+
+_WORD = re.compile(r"[a-z0-9]+")
+_SPACES = re.compile(r"\s+")
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """行ごとにL2正規化する（内積がそのままコサイン類似度になる）"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+class Embedder:
+    """テキストを正規化済みの固定長ベクトルにする（埋め込みの提供元ごとに実装する）"""
+
+    name = "base"
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+class HashingEmbedder(Embedder):
+    """文字n-gramと英単語を特徴量ハッシングでベクトル化する
+
+    外部APIを使わず決定的に同じ結果を返すため、テストやAPIキーのない環境でも使える。
+    語の意味は扱えないが、言い回しがほぼ同じ問題文の検出には十分な精度がある。
+    """
+
+    name = "hashing"
+
+    def __init__(self, dimension: int, ngram_sizes=(2, 3)):
+        super().__init__(dimension)
+        self.ngram_sizes = tuple(ngram_sizes)
+
+    def _features(self, text: str) -> List[str]:
+        text = unicodedata.normalize("NFKC", text or "").lower()
+        compact = _SPACES.sub("", text)
+        features = [f"w:{word}" for word in _WORD.findall(text)]
+        for size in self.ngram_sizes:
+            features.extend(f"c{size}:{compact[i:i + size]}" for i in range(len(compact) - size + 1))
+        return features
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature in self._features(text):
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            # 衝突の偏りを打ち消すため、ハッシュの最上位ビットで符号を決める
+            vector[digest % self.dimension] += 1.0 if digest >> 63 else -1.0
+        return vector
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return normalize_rows(np.stack([self._vector(text) for text in texts]))
+
+class OpenAIEmbedder(Embedder):
+    """OpenAIの埋め込みAPI（呼び出しはLLMゲートウェイの制限・再試行を通る）"""
+
+    def __init__(self, model: str, dimension: int):
+        super().__init__(dimension)
+        self.model = model
+        self.name = f"openai:{model}"
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        vectors = await create_embeddings(texts, self.model, self.dimension)
+        return normalize_rows(np.asarray(vectors, dtype=np.float32))
+
+def create_embedder() -> Embedder:
+    """EMBEDDING_PROVIDER（hashing / openai）に応じた埋め込みの提供元を作る"""
+    if settings.EMBEDDING_PROVIDER == "openai":
+        return OpenAIEmbedder(settings.EMBEDDING_MODEL, settings.EMBEDDING_DIMENSION)
+    if settings.EMBEDDING_PROVIDER != "hashing":
+        raise ValueError(f"Unknown EMBEDDING_PROVIDER: {settings.EMBEDDING_PROVIDER}")
+    return HashingEmbedder(settings.EMBEDDING_DIMENSION)
@@ -0,0 +1,130 @@
+# app/utils/grader.py
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from typing import List, Optional
+from ..config import settings
+
+# 短縮形は展開してから比べる（"'s" は is / has / 所有格の区別がつかないため代表的なものだけ）
+CONTRACTIONS = {
+    "won't": "will not", "can't": "can not", "cannot": "can not", "shan't": "shall not",
+    "ain't": "is not", "let's": "let us", "it's": "it is", "that's": "that is",
+    "there's": "there is", "here's": "here is", "what's": "what is", "who's": "who is",
+    "he's": "he is", "she's": "she is", "where's": "where is", "how's": "how is",
+    "i'm": "i am", "gonna": "going to", "wanna": "want to",
+}
+_SUFFIXES = (
+    ("n't", " not"), ("'re", " are"), ("'ve", " have"), ("'ll", " will"), ("'d", " would"),
+)
+_QUOTES = str.maketrans({"’": "'", "‘": "'", "`": "'", "´": "'"})
+_TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+def normalize_tokens(text: str) -> List[str]:
+    """大文字小文字・句読点・短縮形・空白の違いを吸収した単語列にする"""
+    text = unicodedata.normalize("NFKC", text or "").lower().translate(_QUOTES)
+    tokens = []
+    for token in _TOKEN.findall(text):
+        if token in CONTRACTIONS:
+            tokens.extend(CONTRACTIONS[token].split())
+            continue
+        for suffix, expansion in _SUFFIXES:
+            if token.endswith(suffix):
+                token = token[:-len(suffix)] + expansion
+                break
+        tokens.extend(token.split())
+    return tokens
+
+def word_diff(reference: List[str], answer: List[str]) -> List[dict]:
+    """模範解答と回答の単語単位の差分（equal / replace / delete / insert）"""
+    diff = []
+    for op, i1, i2, j1, j2 in SequenceMatcher(a=reference, b=answer, autojunk=False).get_opcodes():
+        diff.append({
+            "op": op,
+            "expected": " ".join(reference[i1:i2]),
+            "answered": " ".join(answer[j1:j2]),
+        })
+    return diff
+
+@dataclass
+class LocalGrade:
+    similarity: float
+    diff: List[dict] = field(default_factory=list)
+    # 閾値以上でLLMを使わずに済んだ場合のみ設定される
+    feedback: Optional[str] = None
+
+    @property
+    def fast_path(self) -> bool:
+        return self.feedback is not None
+
+def _templated_feedback(reference: str, diff: List[dict]) -> str:
+    changes = [item for item in diff if item["op"] != "equal"]
+    if not changes:
+        improvement = "- 改善点: ありません。模範解答と同じ英訳です。"
+        explanation = "模範解答と一致しているため、文法・語彙ともに問題ありません。"
+    else:
+        lines = []
+        for item in changes:
+            if item["op"] == "replace":
+                lines.append(f"  - 「{item['answered']}」→「{item['expected']}」")
+            elif item["op"] == "delete":
+                lines.append(f"  - 「{item['expected']}」が抜けています")
+            else:
+                lines.append(f"  - 「{item['answered']}」は不要です")
+        improvement = "- 改善点: ほぼ正解です。次の細かい違いを確認しましょう。\n" + "\n".join(lines)
+        explanation = "上記の違い以外は模範解答と一致しています。"
+    return (
+        f"{improvement}\n"
+        f"- 正確な答え: {reference}\n"
+        f"- 文法や語彙の解説: {explanation}"
+    )
+
+class LocalGrader:
+    """模範解答がある問題は、まず手元で比較して一致・ほぼ一致ならLLMを呼ばずに添削する"""
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    def grade(self, reference: Optional[str], answer: str) -> Optional[LocalGrade]:
+        """模範解答がなければNoneを返す（LLMで添削する）"""
+        reference_tokens = normalize_tokens(reference)
+        if not reference_tokens:
+            self.skipped += 1
+            return None
+        answer_tokens = normalize_tokens(answer)
+        similarity = SequenceMatcher(a=reference_tokens, b=answer_tokens, autojunk=False).ratio()
+        result = LocalGrade(similarity=similarity, diff=word_diff(reference_tokens, answer_tokens))
+        if settings.LOCAL_GRADER_ENABLED and similarity >= self.threshold:
+            result.feedback = _templated_feedback(reference.strip(), result.diff)
+            self.hits += 1
+        else:
+            self.misses += 1
+        return result
+
+    def stats(self) -> dict:
+        graded = self.hits + self.misses
+        total = graded + self.skipped
+        return {
+            "fast_path_hits": self.hits,
+            "llm_fallbacks": self.misses,
+            "no_reference": self.skipped,
+            # 模範解答がある添削のうち / 全ての添削のうち LLMを使わずに済んだ割合
+            "hit_rate": self.hits / graded if graded else 0.0,
+            "overall_hit_rate": self.hits / total if total else 0.0,
+            "threshold": self.threshold,
+        }
+
+def grading_details(result: Optional[LocalGrade]) -> dict:
+    """添削レスポンスに付ける、添削方法・類似度・単語単位の差分"""
+    if result is None:
+        return {"graded_by": "llm"}
+    return {
+        "graded_by": "local" if result.fast_path else "llm",
+        "similarity": round(result.similarity, 4),
+        "diff": result.diff,
+    }
+
+local_grader = LocalGrader(threshold=settings.LOCAL_GRADER_THRESHOLD)
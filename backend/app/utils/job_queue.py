@@ -0,0 +1,235 @@
+# app/utils/job_queue.py
+import json
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+from sqlalchemy import and_, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import settings
+from ..database import SessionLocal
+from ..models.models import Job
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+DEAD = "dead"
+
+JobHandler = Callable[[dict], Awaitable[None]]
+
+# ジョブの種類 -> 処理する関数（app/jobs.py で登録する）
+_handlers: Dict[str, JobHandler] = {}
+
+class PermanentJobError(Exception):
+    """再試行しても成功しない失敗（すぐにdeadにする）"""
+
+def job_handler(kind: str):
+    """ジョブの種類に処理する関数を登録するデコレーター"""
+    def register(function: JobHandler) -> JobHandler:
+        _handlers[kind] = function
+        return function
+    return register
+
+def get_handler(kind: str) -> Optional[JobHandler]:
+    return _handlers.get(kind)
+
+def registered_kinds() -> List[str]:
+    return sorted(_handlers)
+
+def enqueue(
+    db: AsyncSession,
+    kind: str,
+    payload: Optional[dict] = None,
+    priority: int = 0,
+    delay_seconds: float = 0,
+    max_attempts: Optional[int] = None
+) -> Job:
+    """ジョブをセッションに追加する（呼び出し側のコミットと同じトランザクションで登録される）"""
+    now = datetime.utcnow()
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload or {}, ensure_ascii=False),
+        status=QUEUED,
+        priority=priority,
+        attempts=0,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        available_at=now + timedelta(seconds=delay_seconds),
+        created_at=now,
+    )
+    db.add(job)
+    return job
+
+async def enqueue_job(kind: str, payload: Optional[dict] = None, **options) -> int:
+    """ジョブを登録してコミットし、IDを返す"""
+    async with SessionLocal() as db:
+        job = enqueue(db, kind, payload, **options)
+        await db.commit()
+        return job.id
+
+async def claim(worker_id: str, kinds: Optional[Sequence[str]] = None, limit: int = 1) -> List[Job]:
+    """実行可能なジョブを優先度の高い順に取り出し、処理中にする
+
+    他のワーカーがロックしている行は FOR UPDATE SKIP LOCKED で飛ばすため、複数のワーカーが
+    同時に取り出しても同じジョブを重複して受け取らない。処理中の期限が切れたジョブも取り直す。
+    """
+    now = datetime.utcnow()
+    candidates = select(Job.id).where(
+        Job.status.in_((QUEUED, RUNNING)),
+        Job.available_at <= now,
+        Job.attempts < Job.max_attempts
+    )
+    if kinds:
+        candidates = candidates.where(Job.kind.in_(kinds))
+    candidates = candidates.order_by(
+        Job.priority.desc(), Job.available_at, Job.id
+    ).limit(limit).with_for_update(skip_locked=True).cte("candidates")
+    statement = (
+        update(Job)
+        .where(Job.id.in_(select(candidates.c.id)))
+        .values(
+            status=RUNNING,
+            attempts=Job.attempts + 1,
+            available_at=now + timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT_SECONDS),
+            locked_by=worker_id,
+            started_at=now,
+        )
+        .returning(Job)
+        .execution_options(synchronize_session=False)
+    )
+    async with SessionLocal() as db:
+        jobs = list((await db.execute(statement)).scalars().all())
+        await db.commit()
+    return jobs
+
+def _owned(job: Job, worker_id: str):
+    # 期限切れで他のワーカーが取り直したジョブは更新しない
+    return and_(Job.id == job.id, Job.status == RUNNING, Job.locked_by == worker_id)
+
+async def _update_owned(job: Job, worker_id: str, **values) -> bool:
+    async with SessionLocal() as db:
+        result = await db.execute(
+            update(Job).where(_owned(job, worker_id)).values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    return result.rowcount > 0
+
+async def extend(job: Job, worker_id: str) -> bool:
+    """処理中の期限を延ばす（長いジョブを他のワーカーに取られないように）"""
+    return await _update_owned(
+        job, worker_id,
+        available_at=datetime.utcnow() + timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT_SECONDS)
+    )
+
+async def complete(job: Job, worker_id: str) -> bool:
+    return await _update_owned(job, worker_id, status=SUCCEEDED, finished_at=datetime.utcnow(), last_error=None)
+
+def retry_delay(attempts: int) -> float:
+    """再試行までの待ち時間（指数バックオフにジッターを加える）"""
+    ceiling = min(settings.JOB_RETRY_MAX_SECONDS, settings.JOB_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+    return random.uniform(ceiling / 2, ceiling)
+
+async def fail(job: Job, worker_id: str, error: str, permanent: bool = False) -> str:
+    """失敗を記録する。再試行回数が残っていれば待ち時間を置いて queued に戻し、なければ dead にする"""
+    now = datetime.utcnow()
+    if permanent or job.attempts >= job.max_attempts:
+        status = DEAD
+        values = {"status": DEAD, "finished_at": now}
+    else:
+        status = QUEUED
+        values = {"status": QUEUED, "available_at": now + timedelta(seconds=retry_delay(job.attempts))}
+    await _update_owned(job, worker_id, locked_by=None, last_error=error[:2000], **values)
+    return status
+
+async def release(job: Job, worker_id: str) -> bool:
+    """停止時に処理を中断したジョブを、試行回数を数えずにすぐ取り出せる状態に戻す"""
+    return await _update_owned(
+        job, worker_id,
+        status=QUEUED, attempts=Job.attempts - 1, available_at=datetime.utcnow(), locked_by=None
+    )
+
+async def reap_expired() -> int:
+    """処理中のまま期限が切れ、再試行回数も使い切ったジョブを dead にする"""
+    now = datetime.utcnow()
+    async with SessionLocal() as db:
+        result = await db.execute(
+            update(Job).where(
+                Job.status == RUNNING,
+                Job.available_at <= now,
+                Job.attempts >= Job.max_attempts
+            ).values(
+                status=DEAD, finished_at=now, locked_by=None,
+                last_error="Visibility timeout expired on the final attempt"
+            ).execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    if result.rowcount:
+        logger.warning("Dead-lettered %d jobs whose visibility timeout expired", result.rowcount)
+    return result.rowcount
+
+async def requeue_dead(job_id: Optional[int] = None, kind: Optional[str] = None) -> int:
+    """dead のジョブを試行回数を戻して再登録する"""
+    statement = update(Job).where(Job.status == DEAD)
+    if job_id is not None:
+        statement = statement.where(Job.id == job_id)
+    if kind is not None:
+        statement = statement.where(Job.kind == kind)
+    async with SessionLocal() as db:
+        result = await db.execute(
+            statement.values(
+                status=QUEUED, attempts=0, available_at=datetime.utcnow(), finished_at=None
+            ).execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    return result.rowcount
+
+async def stats(db: AsyncSession, window_minutes: int = 60) -> dict:
+    """種類・状態ごとの件数、待ちの長さ、直近に終わったジョブの待ち時間・処理時間"""
+    now = datetime.utcnow()
+    counts: Dict[str, Dict[str, int]] = {}
+    for kind, status, count in (await db.execute(
+        select(Job.kind, Job.status, func.count()).group_by(Job.kind, Job.status)
+    )).all():
+        counts.setdefault(kind, {})[status] = count
+
+    oldest = (await db.execute(
+        select(func.min(Job.available_at)).where(Job.status == QUEUED, Job.available_at <= now)
+    )).scalar()
+
+    # パーセンタイルはDBごとに関数が異なるため、直近に終わったジョブを読み出して求める
+    finished = (await db.execute(
+        select(Job.created_at, Job.started_at, Job.finished_at).where(
+            Job.status == SUCCEEDED,
+            Job.finished_at >= now - timedelta(minutes=window_minutes)
+        ).order_by(Job.finished_at.desc()).limit(1000)
+    )).all()
+    waits = sorted((row.started_at - row.created_at).total_seconds() for row in finished if row.started_at and row.created_at)
+    runs = sorted((row.finished_at - row.started_at).total_seconds() for row in finished if row.started_at)
+
+    def percentile(values: List[float], q: float) -> Optional[float]:
+        return values[min(len(values) - 1, int(len(values) * q))] if values else None
+
+    return {
+        "counts": counts,
+        "queued": sum(statuses.get(QUEUED, 0) for statuses in counts.values()),
+        "running": sum(statuses.get(RUNNING, 0) for statuses in counts.values()),
+        "dead": sum(statuses.get(DEAD, 0) for statuses in counts.values()),
+        # 実行可能なのに取り出されていない最も古いジョブの待ち時間（ワーカーの遅れ）
+        "lag_seconds": (now - oldest).total_seconds() if oldest else 0.0,
+        "finished_last_window": len(finished),
+        "wait_seconds_p50": percentile(waits, 0.5),
+        "wait_seconds_p95": percentile(waits, 0.95),
+        "run_seconds_p50": percentile(runs, 0.5),
+        "run_seconds_p95": percentile(runs, 0.95),
+        "window_minutes": window_minutes,
+        "registered_kinds": registered_kinds(),
+    }
+
+async def queue_depth(db: AsyncSession, kind: Optional[str] = None) -> int:
+    """実行待ちのジョブ数（Web側で重い処理をキューに回すか判断するのに使う）"""
+    statement = select(func.count()).select_from(Job).where(Job.status == QUEUED)
+    if kind is not None:
+        statement = statement.where(Job.kind == kind)
+    return (await db.execute(statement)).scalar() or 0
@@ -0,0 +1,178 @@
+# app/utils/llm.py
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import hashlib
+import json
+import time
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from ..config import settings
+from .llm_gateway import estimate_tokens, llm_gateway
+from .metrics import record_llm_call
+
+# 全ルートで共有する非同期クライアント（初回利用時に生成）
+_client: Optional[AsyncOpenAI] = None
+
+def get_client() -> AsyncOpenAI:
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            timeout=settings.OPENAI_TIMEOUT,
+            # 再試行はゲートウェイ側でバックオフ付きで行う
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                )
+            ),
+        )
+    return _client
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+class CoalescingStats:
+    """同一プロンプトの合流状況（実際に発行した呼び出し数と、相乗りした呼び出し数）"""
+
+    def __init__(self):
+        self.issued = 0
+        self.coalesced = 0
+
+    def as_dict(self) -> dict:
+        total = self.issued + self.coalesced
+        return {
+            "issued": self.issued,
+            "coalesced": self.coalesced,
+            "in_flight": len(_in_flight),
+            "coalesce_rate": self.coalesced / total if total else 0.0,
+        }
+
+coalescing_stats = CoalescingStats()
+
+# 実行中の上流呼び出し（リクエスト内容のハッシュ -> タスク）
+_in_flight: Dict[str, "asyncio.Task[str]"] = {}
+
+def _request_key(model: str, messages: List[dict], params: dict) -> str:
+    material = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        ensure_ascii=False, sort_keys=True, default=str
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+async def _create(model: str, messages: List[dict], **kwargs) -> str:
+    async def call():
+        return await get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            **kwargs
+        )
+    tokens = estimate_tokens(messages, kwargs.get("max_tokens"))
+    started = time.perf_counter()
+    try:
+        response = await llm_gateway.execute(model, tokens, call)
+    except Exception:
+        record_llm_call(model, time.perf_counter() - started, outcome="error")
+        raise
+    record_llm_call(model, time.perf_counter() - started, response.usage)
+    return response.choices[0].message.content
+
+def _forget(key: str, task: "asyncio.Task[str]") -> None:
+    if _in_flight.get(key) is task:
+        del _in_flight[key]
+    # 待っている呼び出し元がいなくなっても例外が未回収にならないようにする
+    if not task.cancelled():
+        task.exception()
+
+async def chat_completion(
+    messages: List[dict],
+    model: Optional[str] = None,
+    coalesce: bool = True,
+    user_id: Optional[int] = None,
+    **kwargs
+) -> str:
+    """チャット補完を実行し、生成されたテキストを返す
+
+    同じモデル・メッセージ・パラメータの呼び出しが実行中であれば、上流へは
+    1回だけ発行して結果を共有する。毎回異なる結果が欲しい生成（問題文など）は
+    coalesce=False を指定する。user_id を渡すとユーザーごとの利用上限を確認する。
+    """
+    llm_gateway.check_quota(user_id)
+    model = model or settings.OPENAI_MODEL
+    if not coalesce or not settings.LLM_COALESCE_ENABLED:
+        coalescing_stats.issued += 1
+        return await _create(model, messages, **kwargs)
+
+    key = _request_key(model, messages, kwargs)
+    task = _in_flight.get(key)
+    if task is None:
+        coalescing_stats.issued += 1
+        # 呼び出し元がキャンセルされても相乗りしている他の呼び出しに影響しないよう別タスクで実行する
+        task = asyncio.create_task(_create(model, messages, **kwargs))
+        _in_flight[key] = task
+        task.add_done_callback(lambda done: _forget(key, done))
+    else:
+        coalescing_stats.coalesced += 1
+    return await asyncio.shield(task)
+
+async def stream_chat_completion(
+    messages: List[dict],
+    model: Optional[str] = None,
+    user_id: Optional[int] = None,
+    **kwargs
+) -> AsyncIterator[str]:
+    """チャット補完をストリーミングで実行し、届いたテキスト断片を順に返す"""
+    llm_gateway.check_quota(user_id)
+    model = model or settings.OPENAI_MODEL
+
+    async def open_stream():
+        return await get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            # 最後のチャンクでトークン数を受け取る
+            stream_options={"include_usage": True},
+            **kwargs
+        )
+
+    tokens = estimate_tokens(messages, kwargs.get("max_tokens"))
+    started = time.perf_counter()
+    usage = None
+    outcome = "error"
+    try:
+        async for chunk in llm_gateway.stream(model, tokens, open_stream):
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+        outcome = "ok"
+    except (asyncio.CancelledError, GeneratorExit):
+        # クライアントの切断による中断は失敗と区別する
+        outcome = "cancelled"
+        raise
+    finally:
+        record_llm_call(model, time.perf_counter() - started, usage, outcome)
+
+async def create_embeddings(texts: List[str], model: str, dimensions: Optional[int] = None) -> List[List[float]]:
+    """テキストごとの埋め込みベクトルを入力と同じ順で返す"""
+    async def call():
+        params = {"dimensions": dimensions} if dimensions else {}
+        return await get_client().embeddings.create(model=model, input=texts, **params)
+
+    tokens = sum(len(text) for text in texts) // 2
+    started = time.perf_counter()
+    try:
+        response = await llm_gateway.execute(model, tokens, call)
+    except Exception:
+        record_llm_call(model, time.perf_counter() - started, outcome="error")
+        raise
+    record_llm_call(model, time.perf_counter() - started, response.usage)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
@@ -0,0 +1,359 @@
+# app/utils/llm_gateway.py
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+import openai
+from fastapi import HTTPException, status
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class LLMUnavailableError(HTTPException):
+    """上流のLLMが利用できない（再試行の上限・サーキットオープン・待ち時間超過）"""
+
+    def __init__(self, detail: str = "The language model service is temporarily unavailable", retry_after: Optional[float] = None):
+        headers = {"Retry-After": str(max(1, int(retry_after)))} if retry_after else None
+        super().__init__(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=detail, headers=headers)
+
+class LLMRejectedError(HTTPException):
+    """上流のLLMがリクエストを受け付けなかった（再試行しても成功しない4xx）"""
+
+    def __init__(self, detail: str = "The language model rejected the request"):
+        super().__init__(status_code=status.HTTP_502_BAD_GATEWAY, detail=detail)
+
+class QuotaExceededError(HTTPException):
+    """ユーザーごとのLLM利用回数の上限に達した"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="LLM request quota exceeded, please retry later",
+            headers={"Retry-After": str(max(1, int(retry_after)))},
+        )
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def estimate_tokens(messages: List[dict], max_tokens: Optional[int] = None) -> int:
+    """TPM制限用のおおまかなトークン数（日本語を含むため文字数/2で見積もる）"""
+    characters = sum(len(str(message.get("content", ""))) for message in messages)
+    return characters // 2 + (max_tokens or settings.LLM_ESTIMATED_COMPLETION_TOKENS)
+
+class TokenBucket:
+    """1分あたりの上限を連続的に補充するトークンバケット（rate=0で無制限）"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, amount: float, max_wait: float) -> None:
+        if self.rate <= 0:
+            return
+        # 1回の要求が容量を超える場合は容量分だけ確保する
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            wait = (amount - self.tokens) / self.rate if self.tokens < amount else 0.0
+            if wait > max_wait:
+                raise LLMUnavailableError("The language model is rate limited, please retry shortly", retry_after=wait)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                self._refill()
+            self.tokens -= amount
+
+class CircuitBreaker:
+    """連続した失敗で回路を開き、クールダウン後に1件だけ試行させる"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, cooldown_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+
+    def before_call(self) -> None:
+        if self.state == self.OPEN:
+            remaining = self.opened_at + self.cooldown_seconds - time.monotonic()
+            if remaining > 0:
+                raise LLMUnavailableError(retry_after=remaining)
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                raise LLMUnavailableError(retry_after=1)
+            self._probing = True
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """成功・失敗のどちらにも数えない終わり方（4xxなど）で試行枠を返す"""
+        self._probing = False
+
+class UserQuota:
+    """ユーザーごとの1分・1日あたりのLLM呼び出し回数を固定ウィンドウで数える"""
+
+    def __init__(self, per_minute: int, per_day: int):
+        self.per_minute = per_minute
+        self.per_day = per_day
+        self._minute: Dict[int, Tuple[int, int]] = {}
+        self._day: Dict[int, Tuple[int, int]] = {}
+        self.rejected = 0
+
+    @staticmethod
+    def _count(counters: Dict[int, Tuple[int, int]], user_id: int, window: int, limit: int, now: float) -> Optional[float]:
+        current = int(now // window)
+        start, count = counters.get(user_id, (current, 0))
+        if start != current:
+            start, count = current, 0
+        if count >= limit:
+            return (current + 1) * window - now
+        counters[user_id] = (start, count + 1)
+        return None
+
+    def check(self, user_id: Optional[int]) -> None:
+        if user_id is None:
+            return
+        now = time.time()
+        for counters, window, limit in ((self._minute, 60, self.per_minute), (self._day, 86400, self.per_day)):
+            if limit <= 0:
+                continue
+            retry_after = self._count(counters, user_id, window, limit, now)
+            if retry_after is not None:
+                self.rejected += 1
+                raise QuotaExceededError(retry_after)
+        # 古いウィンドウのユーザーを時々掃除してメモリを抑える
+        if len(self._minute) > 10000:
+            current = int(now // 60)
+            self._minute = {k: v for k, v in self._minute.items() if v[0] == current}
+        if len(self._day) > 100000:
+            current = int(now // 86400)
+            self._day = {k: v for k, v in self._day.items() if v[0] == current}
+
+def _parse_model_limits(value: str) -> Dict[str, int]:
+    """"gpt-3.5-turbo=50,gpt-4o-mini=20" 形式のモデル別上限を読む"""
+    limits = {}
+    for item in (value or "").split(","):
+        if "=" in item:
+            model, limit = item.split("=", 1)
+            limits[model.strip()] = int(limit)
+    return limits
+
+class LLMGateway:
+    """全てのLLM呼び出しが通る関所（同時実行数・レート制限・再試行・サーキットブレーカー・利用上限）"""
+
+    def __init__(self):
+        self.max_retries = settings.LLM_MAX_RETRIES
+        self.backoff_base = settings.LLM_BACKOFF_BASE_SECONDS
+        self.backoff_max = settings.LLM_BACKOFF_MAX_SECONDS
+        self.max_wait = settings.LLM_THROTTLE_MAX_WAIT_SECONDS
+        self.deadline_seconds = settings.LLM_REQUEST_DEADLINE_SECONDS
+        self.breaker = CircuitBreaker(
+            settings.LLM_BREAKER_FAILURE_THRESHOLD,
+            settings.LLM_BREAKER_COOLDOWN_SECONDS
+        )
+        self.quota = UserQuota(
+            settings.LLM_USER_REQUESTS_PER_MINUTE,
+            settings.LLM_USER_REQUESTS_PER_DAY
+        )
+        self._model_limits = _parse_model_limits(settings.LLM_MODEL_CONCURRENCY)
+        self._global_semaphore: Optional[asyncio.Semaphore] = None
+        self._model_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._request_buckets: Dict[str, TokenBucket] = {}
+        self._token_buckets: Dict[str, TokenBucket] = {}
+        self.in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.deadline_exceeded = 0
+
+    def _semaphores(self, model: str) -> List[asyncio.Semaphore]:
+        if self._global_semaphore is None:
+            self._global_semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        semaphores = [self._global_semaphore]
+        if model in self._model_limits:
+            if model not in self._model_semaphores:
+                self._model_semaphores[model] = asyncio.Semaphore(self._model_limits[model])
+            semaphores.append(self._model_semaphores[model])
+        return semaphores
+
+    async def _throttle(self, model: str, tokens: int) -> None:
+        if model not in self._request_buckets:
+            self._request_buckets[model] = TokenBucket(settings.LLM_REQUESTS_PER_MINUTE)
+            self._token_buckets[model] = TokenBucket(settings.LLM_TOKENS_PER_MINUTE)
+        await self._request_buckets[model].acquire(1, self.max_wait)
+        await self._token_buckets[model].acquire(tokens, self.max_wait)
+
+    @asynccontextmanager
+    async def _slot(self, model: str):
+        semaphores = self._semaphores(model)
+        for semaphore in semaphores:
+            await semaphore.acquire()
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            for semaphore in reversed(semaphores):
+                semaphore.release()
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        # Retry-Afterがあればそれに従い、なければフルジッター付きの指数バックオフ
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def check_quota(self, user_id: Optional[int]) -> None:
+        self.quota.check(user_id)
+
+    def _remaining(self, deadline: float) -> float:
+        """呼び出し全体の期限までの残り時間。過ぎていれば LLMUnavailableError を送出する"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self._on_deadline()
+        return remaining
+
+    def _on_deadline(self) -> None:
+        # 期限切れはこちらの待ち時間の都合でもあるため、サーキットブレーカーの失敗には数えない
+        self.failures += 1
+        self.deadline_exceeded += 1
+        self.breaker.release_probe()
+        logger.warning("LLM request gave up after its %.0fs deadline", self.deadline_seconds)
+        raise LLMUnavailableError("The language model did not respond in time, please retry shortly")
+
+    def _on_error(self, error: Exception, attempt: int, deadline: float) -> float:
+        """再試行までの待ち時間を返す。再試行しない場合はHTTPExceptionに変換して送出する"""
+        if isinstance(error, asyncio.TimeoutError):
+            self._on_deadline()
+        if isinstance(error, HTTPException):
+            self.breaker.release_probe()
+            raise error
+        if not _is_retryable(error):
+            self.breaker.release_probe()
+            logger.warning("LLM request rejected by upstream: %s", error)
+            raise LLMRejectedError() from error
+        backoff = self._backoff(attempt, error)
+        # 再試行の上限に達したか、待っている間に期限を過ぎるなら再試行しない
+        if attempt >= self.max_retries or time.monotonic() + backoff >= deadline:
+            self.failures += 1
+            self.breaker.record_failure()
+            logger.warning("LLM request failed after %d attempts: %s", attempt + 1, error)
+            raise LLMUnavailableError(retry_after=_retry_after(error)) from error
+        self.retries += 1
+        return backoff
+
+    async def _attempt(self, model: str, tokens: int, call: Callable[[], Awaitable[T]]) -> T:
+        await self._throttle(model, tokens)
+        async with self._slot(model):
+            return await call()
+
+    async def execute(self, model: str, tokens: int, call: Callable[[], Awaitable[T]]) -> T:
+        """上流呼び出しを制限・再試行付きで実行する
+
+        待ち・再試行を含めた全体に LLM_REQUEST_DEADLINE_SECONDS の期限を設け、
+        上流が遅い場合でもリクエストを長く抱え込まないようにする。
+        """
+        self.breaker.before_call()
+        self.calls += 1
+        deadline = time.monotonic() + self.deadline_seconds
+        attempt = 0
+        try:
+            while True:
+                try:
+                    result = await asyncio.wait_for(
+                        self._attempt(model, tokens, call), self._remaining(deadline)
+                    )
+                    break
+                except Exception as e:
+                    await asyncio.sleep(self._on_error(e, attempt, deadline))
+                    attempt += 1
+        except asyncio.CancelledError:
+            self.breaker.release_probe()
+            raise
+        self.breaker.record_success()
+        return result
+
+    async def stream(self, model: str, tokens: int, open_stream: Callable[[], Awaitable[AsyncIterator[T]]]) -> AsyncIterator[T]:
+        """ストリーミング呼び出し。接続確立までは期限内で再試行し、受信中は同時実行枠を保持する"""
+        self.breaker.before_call()
+        self.calls += 1
+        deadline = time.monotonic() + self.deadline_seconds
+        try:
+            async with self._slot(model):
+                attempt = 0
+                while True:
+                    try:
+                        await self._throttle(model, tokens)
+                        stream = await asyncio.wait_for(open_stream(), self._remaining(deadline))
+                        break
+                    except Exception as e:
+                        await asyncio.sleep(self._on_error(e, attempt, deadline))
+                        attempt += 1
+                try:
+                    async for item in stream:
+                        yield item
+                except Exception as e:
+                    # 受信途中の失敗は再試行できない（既に一部を返しているため）
+                    self.failures += 1
+                    self.breaker.record_failure()
+                    logger.warning("LLM stream interrupted: %s", e)
+                    raise LLMUnavailableError() from e
+        except (asyncio.CancelledError, GeneratorExit):
+            self.breaker.release_probe()
+            raise
+        self.breaker.record_success()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "deadline_exceeded": self.deadline_exceeded,
+            "in_flight": self.in_flight,
+            "circuit_state": self.breaker.state,
+            "circuit_trips": self.breaker.trips,
+            "quota_rejected": self.quota.rejected,
+        }
+
+llm_gateway = LLMGateway()
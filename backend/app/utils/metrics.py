@@ -0,0 +1,265 @@
+# app/utils/metrics.py
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# リクエスト外（バックグラウンド処理・起動時など）の計測に付けるルート名
+BACKGROUND_ROUTE = "background"
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Counter:
+    """ラベル付きの単調増加カウンター"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Sequence[str] = (), amount: float = 1.0) -> None:
+        key = tuple(str(label) for label in labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}")
+        return lines
+
+class Histogram:
+    """ラベル付きの累積バケットヒストグラム"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # ラベルごとに [各バケットの件数..., 合計, 件数]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: Sequence[str] = ()) -> None:
+        key = tuple(str(label) for label in labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_number(bound)))
+                lines.append(f"{self.name}_bucket{labels} {_format_number(cumulative)}")
+            labels = _format_labels(self.labelnames, key, ("le", "+Inf"))
+            lines.append(f"{self.name}_bucket{labels} {_format_number(state[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_number(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_number(state[-1])}")
+        return lines
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+DB_QUERIES = Counter("db_queries_total", "Database queries executed", ("route",))
+DB_QUERY_LATENCY = Histogram("db_query_duration_seconds", "Database query latency", ("route",), QUERY_BUCKETS)
+DB_QUERIES_PER_REQUEST = Histogram("db_queries_per_request", "Database queries per HTTP request", ("route",), COUNT_BUCKETS)
+LLM_REQUESTS = Counter("llm_requests_total", "LLM calls by outcome", ("model", "route", "outcome"))
+LLM_LATENCY = Histogram("llm_request_duration_seconds", "LLM call latency", ("model", "route"))
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens reported by the API", ("model", "route", "type"))
+LLM_COST = Counter("llm_cost_usd_total", "Estimated LLM cost in USD", ("model", "route"))
+
+REGISTRY = [
+    HTTP_REQUESTS, HTTP_LATENCY,
+    DB_QUERIES, DB_QUERY_LATENCY, DB_QUERIES_PER_REQUEST,
+    LLM_REQUESTS, LLM_LATENCY, LLM_TOKENS, LLM_COST,
+]
+
+def render_metrics() -> str:
+    """Prometheusのテキスト形式で全メトリクスを出力する"""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+class RequestStats:
+    """1リクエスト内のDB・LLMの内訳（遅いリクエストのログに使う）"""
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.method = scope["method"]
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.slowest_queries: List[Tuple[float, str]] = []
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        # ルーティング後はパステンプレート（/api/v1/questions/{question_id}/favorite など）を使う
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or "unmatched"
+
+    def add_query(self, seconds: float, statement: str) -> None:
+        self.db_queries += 1
+        self.db_seconds += seconds
+        self.slowest_queries.append((seconds, statement))
+        if len(self.slowest_queries) > 5:
+            self.slowest_queries.sort(key=lambda item: item[0], reverse=True)
+            self.slowest_queries.pop()
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def current_route() -> str:
+    stats = _current.get()
+    return stats.route if stats else BACKGROUND_ROUTE
+
+def _parse_prices(value: str) -> Dict[str, Tuple[float, float]]:
+    """"gpt-3.5-turbo=0.0005:0.0015" 形式（1Kトークンあたりの入力:出力のUSD）を読む"""
+    prices = {}
+    for item in (value or "").split(","):
+        if "=" in item and ":" in item:
+            model, price = item.split("=", 1)
+            prompt, completion = price.split(":", 1)
+            prices[model.strip()] = (float(prompt), float(completion))
+    return prices
+
+_prices = _parse_prices(settings.LLM_PRICES)
+
+def _price(model: str) -> Optional[Tuple[float, float]]:
+    # "gpt-4o-mini-2024-07-18" のような日付付きのモデル名も前方一致で引く
+    if model in _prices:
+        return _prices[model]
+    for name in sorted(_prices, key=len, reverse=True):
+        if model.startswith(name):
+            return _prices[name]
+    return None
+
+def record_llm_call(model: str, seconds: float, usage=None, outcome: str = "ok") -> None:
+    """LLM呼び出しの所要時間・トークン数・推定コストを呼び出し元のルートに計上する"""
+    route = current_route()
+    LLM_REQUESTS.inc((model, route, outcome))
+    LLM_LATENCY.observe(seconds, (model, route))
+    stats = _current.get()
+    if stats:
+        stats.llm_calls += 1
+        stats.llm_seconds += seconds
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    LLM_TOKENS.inc((model, route, "prompt"), prompt_tokens)
+    LLM_TOKENS.inc((model, route, "completion"), completion_tokens)
+    price = _price(model)
+    if price:
+        LLM_COST.inc((model, route), (prompt_tokens * price[0] + completion_tokens * price[1]) / 1000)
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """エンジンのイベントでクエリごとの件数と所要時間を記録する"""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started_at"].pop()
+        seconds = time.perf_counter() - started
+        stats = _current.get()
+        route = stats.route if stats else BACKGROUND_ROUTE
+        DB_QUERIES.inc((route,))
+        DB_QUERY_LATENCY.observe(seconds, (route,))
+        if stats:
+            stats.add_query(seconds, statement)
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def _error(context):
+        # 失敗したクエリの開始時刻を捨てて、以降の対応関係がずれないようにする
+        connection = context.connection
+        if connection is not None and connection.info.get("query_started_at"):
+            connection.info["query_started_at"].pop()
+
+class MetricsMiddleware:
+    """ルートごとの所要時間・ステータスを記録し、遅いリクエストは内訳をログに出す
+
+    ストリーミング応答も本文を送り終えるまでを計測するため、ASGIミドルウェアとして実装する。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            route = stats.route
+            HTTP_REQUESTS.inc((stats.method, route, status_code))
+            HTTP_LATENCY.observe(elapsed, (stats.method, route))
+            DB_QUERIES_PER_REQUEST.observe(stats.db_queries, (route,))
+            if settings.SLOW_REQUEST_SECONDS and elapsed >= settings.SLOW_REQUEST_SECONDS:
+                self._log_slow(stats, status_code, elapsed)
+
+    @staticmethod
+    def _log_slow(stats: RequestStats, status_code: int, elapsed: float) -> None:
+        queries = "; ".join(
+            f"{seconds * 1000:.1f}ms {' '.join(statement.split())[:200]}"
+            for seconds, statement in sorted(stats.slowest_queries, key=lambda item: item[0], reverse=True)
+        )
+        logger.warning(
+            "Slow request %s %s -> %s in %.3fs (db: %d queries %.3fs, llm: %d calls %.3fs) slowest queries: %s",
+            stats.method, stats.route, status_code, elapsed,
+            stats.db_queries, stats.db_seconds, stats.llm_calls, stats.llm_seconds, queries or "-"
+        )
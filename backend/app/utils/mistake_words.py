@@ -0,0 +1,181 @@
+# app/utils/mistake_words.py
+import asyncio
+import logging
+import re
+import time
+from collections import Counter
+from typing import List, Optional, Tuple
+from ..config import settings
+from ..database import SessionLocal, upsert_insert
+from ..models.models import MistakeWord
+
+logger = logging.getLogger(__name__)
+
+# 間違えた単語として数えない機能語
+STOPWORDS = {
+    "the", "and", "for", "are", "but", "not", "you", "your", "yours", "our", "ours",
+    "they", "them", "their", "his", "her", "its", "was", "were", "been", "being",
+    "have", "has", "had", "does", "did", "doing", "will", "would", "shall", "should",
+    "can", "could", "may", "might", "must", "this", "that", "these", "those", "with",
+    "from", "into", "onto", "about", "than", "then", "there", "here", "what", "which",
+    "who", "whom", "when", "where", "why", "how", "all", "any", "some", "very", "just",
+    "also", "too", "out", "off", "over", "under", "again", "more", "most", "such",
+    "only", "own", "same", "so", "each", "both", "few", "other", "him", "she", "let",
+}
+
+_REFERENCE_PATTERN = re.compile(r"正確な答え[^\n]*")
+_ENGLISH_SENTENCE = re.compile(r"[A-Za-z][A-Za-z0-9'’,\-\s]*[A-Za-z0-9.!?]")
+_WORD = re.compile(r"[a-z]+(?:'[a-z]+)?")
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower().replace("’", "'"))
+
+def extract_reference_answer(feedback: str) -> Optional[str]:
+    """フィードバックの「正確な答え」の項目から模範解答の英文を取り出す"""
+    match = _REFERENCE_PATTERN.search(feedback or "")
+    if not match:
+        return None
+    # 同じ行か次の数行に英文が書かれている
+    window = feedback[match.start():match.start() + 400]
+    for candidate in _ENGLISH_SENTENCE.findall(window):
+        if len(_words(candidate)) >= 3:
+            return candidate.strip()
+    return None
+
+def extract_mistake_words(answer_text: str, feedback: str, limit: int = 5) -> List[str]:
+    """模範解答にあって学習者の回答にない内容語を「間違えた単語」とみなす"""
+    reference = extract_reference_answer(feedback)
+    if not reference:
+        return []
+    answered = set(_words(answer_text))
+    mistakes = []
+    for word in _words(reference):
+        if len(word) < 3 or word in STOPWORDS or word in answered or word in mistakes:
+            continue
+        mistakes.append(word)
+        if len(mistakes) >= limit:
+            break
+    return mistakes
+
+class MistakeWordPipeline:
+    """添削済みの回答から間違えた単語を抽出し、まとめてMistakeWordへupsertする"""
+
+    def __init__(self, batch_size: int, flush_seconds: float, queue_size: int):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.started_at: Optional[float] = None
+        self.processed = 0
+        self.words_applied = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failures = 0
+        self.last_lag_seconds = 0.0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self.started_at = time.monotonic()
+            self._task = asyncio.create_task(self._run())
+
+    def submit(self, user_id: int, answer_text: str, feedback: str) -> None:
+        """添削のレスポンスを待たせないよう、キューに積むだけで即座に戻る"""
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait((time.monotonic(), user_id, answer_text, feedback))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _run(self) -> None:
+        # 件数か経過時間のどちらかが閾値に達したらまとめて反映する（Noneは停止の合図）
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._apply(batch)
+
+    async def _apply(self, batch: List[Tuple[float, int, str, str]]) -> None:
+        counts: Counter = Counter()
+        for _, user_id, answer_text, feedback in batch:
+            for word in extract_mistake_words(answer_text, feedback):
+                counts[(user_id, word)] += 1
+
+        try:
+            if counts:
+                await self._upsert(counts)
+            self.batches += 1
+            self.processed += len(batch)
+            self.words_applied += len(counts)
+            self.last_lag_seconds = time.monotonic() - batch[0][0]
+        except Exception as e:
+            self.failures += 1
+            logger.warning("Mistake word batch failed (%d answers): %s", len(batch), e)
+
+    async def _upsert(self, counts: Counter) -> None:
+        # バッチ全体を1つの INSERT ... ON CONFLICT (user_id, word) DO UPDATE で反映する
+        rows = [
+            {"user_id": user_id, "word": word, "count": count}
+            for (user_id, word), count in sorted(counts.items())
+        ]
+        statement = upsert_insert(MistakeWord).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[MistakeWord.user_id, MistakeWord.word],
+            set_={"count": MistakeWord.count + statement.excluded.count}
+        )
+        async with SessionLocal() as db:
+            await db.execute(statement)
+            await db.commit()
+
+    async def stop(self) -> None:
+        """停止時はキューに残った回答を反映してから終了する"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        # 停止の合図より後に積まれた回答も取りこぼさない
+        leftovers = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                leftovers.append(item)
+        for start in range(0, len(leftovers), self.batch_size):
+            await self._apply(leftovers[start:start + self.batch_size])
+        self._task = None
+        self._queue = None
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            "processed_answers": self.processed,
+            "answers_per_second": self.processed / elapsed if elapsed else 0.0,
+            "words_applied": self.words_applied,
+            "batches": self.batches,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "lag_seconds": self.last_lag_seconds,
+            "dropped": self.dropped,
+            "failures": self.failures,
+        }
+
+mistake_word_pipeline = MistakeWordPipeline(
+    batch_size=settings.MISTAKE_PIPELINE_BATCH_SIZE,
+    flush_seconds=settings.MISTAKE_PIPELINE_FLUSH_SECONDS,
+    queue_size=settings.MISTAKE_PIPELINE_QUEUE_SIZE,
+)
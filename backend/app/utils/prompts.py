@@ -0,0 +1,114 @@
+# app/utils/prompts.py
+from typing import List, Optional, Tuple
+
+# 添削用のシステムプロンプト（問題・復習の両方で共有）
+GRADING_SYSTEM_PROMPT = """
+                あなたは英語教師です。学習者の英訳を添削し、日本語でフィードバックを提供してください。
+                フィードバックには以下を箇条書き形式で含めてください：
+                - 改善点
+                - 正確な答え(全文を出す)
+                - 文法や語彙の解説
+                """
+
+def grading_messages(japanese_text: str, answer_text: str) -> List[dict]:
+    """添削リクエスト用のメッセージを組み立てる"""
+    return [
+        {"role": "system", "content": GRADING_SYSTEM_PROMPT},
+        {"role": "user", "content": f"以下の英訳を添削してください。\n\n元の日本語: {japanese_text}\n学習者の英訳: {answer_text}"}
+    ]
+
+def question_messages(word: Optional[str] = None) -> List[dict]:
+    """問題生成用のメッセージを組み立てる（単語指定があれば間違えた単語を使う）"""
+    if word:
+        return [
+            {"role": "system", "content": "日本語の自然な文章を一文で生成してください。指定された英単語を使う日本語の文を作成します。"},
+            {"role": "user", "content": f"英単語「{word}」を使う自然な日本語の文章を作成してください。"}
+        ]
+    return [
+        {"role": "system", "content": "英語学習のための日本語の自然な文章を一文で生成してください。ビジネスシーンや日常生活で使える表現を含める文章にしてください。"},
+        {"role": "user", "content": "英語翻訳練習用の自然な日本語の文章を作成してください。"}
+    ]
+
+def batch_grading_messages(items: List[Tuple[str, str]]) -> List[dict]:
+    """複数の回答を1回の補完でまとめて添削するためのメッセージを組み立てる"""
+    lines = []
+    for index, (japanese_text, answer_text) in enumerate(items, start=1):
+        lines.append(f"[{index}]\n元の日本語: {japanese_text}\n学習者の英訳: {answer_text}")
+    return [
+        {"role": "system", "content": GRADING_SYSTEM_PROMPT + """
+                複数の回答が番号付きで与えられます。それぞれを個別に添削し、
+                次のJSON形式のみで回答してください：
+                {"results": [{"index": 番号, "feedback": "その回答へのフィードバック"}]}
+                """},
+        {"role": "user", "content": "以下の英訳をそれぞれ添削してください。\n\n" + "\n\n".join(lines)}
+    ]
+
+def translation_messages(japanese_text: str) -> List[dict]:
+    """翻訳支援（英訳と解説）用のメッセージを組み立てる"""
+    return [
+        {"role": "system", "content": """
+                あなたは英語教師です。以下の形式で回答してください：
+
+                英訳：[英訳を記載]
+
+                解説：
+                - 使用している文法のポイント
+                - 重要な語彙や表現の説明
+                - 翻訳の際の注意点
+                """},
+        {"role": "user", "content": f"以下の日本語を英語に翻訳してください：\n\n{japanese_text}"}
+    ]
+
+def reference_answer_messages(japanese_text: str) -> List[dict]:
+    """問題文の模範解答（英訳）を生成するためのメッセージを組み立てる"""
+    return [
+        {"role": "system", "content": "あなたは英語教師です。与えられた日本語を自然な英語に一文で翻訳し、英訳のみを出力してください。"},
+        {"role": "user", "content": japanese_text}
+    ]
+
+def variation_label(variation_type: str) -> str:
+    """言い換えの種類（formal / casual / context:場面）をプロンプト用の説明にする"""
+    if variation_type.startswith("context:"):
+        return f"シチュエーション「{variation_type[8:]}」に適した表現"
+    return "フォーマルな表現" if variation_type == "formal" else "カジュアルな表現"
+
+def style_variations_messages(japanese_text: str, current_translation: str, variation_types: List[str]) -> List[dict]:
+    """複数の言い換えを1回の補完でまとめて生成するためのメッセージを組み立てる"""
+    lines = [f"- {variation_type}: {variation_label(variation_type)}" for variation_type in variation_types]
+    return [
+        {"role": "system", "content": """
+                あなたは英語教師です。日本語を指定された種類ごとに英語へ翻訳し、
+                種類ごとに、その表現が場面に適している理由と言い回しのポイントを日本語で解説してください。
+                variation_type には指定された種類の文字列をそのまま入れ、すべての種類を1件ずつ返してください。
+                """},
+        {"role": "user", "content": (
+            f"日本語: {japanese_text}\n現在の英訳: {current_translation or '（なし）'}\n\n種類:\n" + "\n".join(lines)
+        )}
+    ]
+
+def style_variations_schema(variation_types: List[str]) -> dict:
+    """言い換えの構造化出力に使うJSONスキーマ（response_format の json_schema に渡す）"""
+    return {
+        "name": "style_variations",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "variations": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "variation_type": {"type": "string", "enum": list(variation_types)},
+                            "translation": {"type": "string"},
+                            "explanation": {"type": "string"},
+                        },
+                        "required": ["variation_type", "translation", "explanation"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["variations"],
+            "additionalProperties": False,
+        },
+    }
@@ -0,0 +1,371 @@
+# app/utils/question_index.py
+import asyncio
+import bisect
+import fcntl
+import json
+import logging
+import os
+import random
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Sequence, Set
+import numpy as np
+from sqlalchemy import select
+from ..config import settings
+from ..database import SessionLocal
+from ..models.models import QUESTION_SOURCE_GENERATED, Question, UserAnswer
+from .embeddings import Embedder, create_embedder, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+_MIN_CAPACITY = 1024
+
+# 索引ファイルの形式（索引に含める問題の条件を変えたときに上げ、保存済みの索引を作り直す）
+INDEX_FORMAT = 2
+
+def _document(japanese_text: Optional[str], english_text: Optional[str]) -> str:
+    # 英訳が保存されている問題は英訳も含めて埋め込み、英単語での検索に掛かりやすくする
+    return (japanese_text or "") + ("\n" + english_text if english_text else "")
+
+class QuestionIndex:
+    """Question の問題文のベクトル索引。既存の問題をコサイン類似度で探して再利用する
+
+    索引に含めるのはLLMで生成した問題だけで、ユーザーが入力した文（お気に入り保存時に作成）は
+    他のユーザーに出題しないよう含めない。
+    ベクトルはメモリマップしたファイルに追記し、再起動時はまだ索引にない問題だけを埋め込む。
+    英訳（模範解答）がまだない問題は問題文だけで埋め込み、後から英訳が補完されたら埋め込み直す。
+    ファイルに書き込むのはロックを取れた1プロセスだけで、他のワーカーは読み込んだ内容を
+    メモリ上で更新する。いずれもDBと定期的に突き合わせ、他のワーカーが追加した問題も取り込む。
+    """
+
+    def __init__(self, embedder: Embedder, path: str, sync_seconds: float, batch_size: int, max_users: int):
+        self.embedder = embedder
+        self.path = path
+        self.sync_seconds = sync_seconds
+        self.batch_size = batch_size
+        self.max_users = max_users
+        # ユーザーごとの直近に出題した問題（未回答のまま次へ進んだ問題を繰り返さないため）
+        self._served: "OrderedDict[int, Deque[int]]" = OrderedDict()
+        dimension = embedder.dimension
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._levels = np.zeros(0, dtype=np.int16)
+        self._vectors = np.zeros((0, dimension), dtype=np.float32)
+        self._count = 0
+        # 問題ID -> 索引内の行番号
+        self._positions: Dict[int, int] = {}
+        # DBから取り込み済みの最大の問題ID
+        self._synced_id = 0
+        # 英訳なしで埋め込んだ問題ID（英訳が補完されたら埋め込み直す）と、次に確認する位置
+        self._pending: Set[int] = set()
+        self._pending_cursor = 0
+        self._owner = False
+        self._lock_file = None
+        self._lock = asyncio.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+        self._last_sync = 0.0
+        self.ready = False
+        self.reused = 0
+        self.misses = 0
+        self.embedded = 0
+        self.reembedded = 0
+        self.failures = 0
+
+    # ---- ファイル ----
+
+    def _file(self, name: str) -> str:
+        return f"{self.path}.{name}"
+
+    def _open(self) -> None:
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock_file = open(self._file("lock"), "a+")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self._owner = True
+        except OSError:
+            self._owner = False
+
+        meta = None
+        try:
+            with open(self._file("meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if (
+            not meta or meta.get("format") != INDEX_FORMAT
+            or meta.get("embedder") != self.embedder.name or meta.get("dimension") != self.embedder.dimension
+        ):
+            # 形式や埋め込み方法が変わった場合は作り直す
+            if meta:
+                logger.info("Rebuilding question index for embedder %s", self.embedder.name)
+            return
+
+        mode = "r+" if self._owner else "r"
+        try:
+            ids = np.load(self._file("ids.npy"), mmap_mode=mode)
+            levels = np.load(self._file("levels.npy"), mmap_mode=mode)
+            vectors = np.load(self._file("vectors.npy"), mmap_mode=mode)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not open question index files, rebuilding: %s", e)
+            return
+        count = min(int(meta["count"]), len(ids), len(levels), len(vectors))
+        if self._owner:
+            self._ids, self._levels, self._vectors = ids, levels, vectors
+        else:
+            # 書き込み担当のプロセスがファイルを差し替えても影響しないようメモリに写す
+            self._ids, self._levels, self._vectors = np.array(ids), np.array(levels), np.array(vectors)
+        self._count = count
+        self._synced_id = int(meta.get("synced_id", 0))
+        self._pending = {int(question_id) for question_id in meta.get("pending", [])}
+        self._positions = {int(question_id): row for row, question_id in enumerate(self._ids[:count])}
+
+    def _write_meta(self) -> None:
+        if not self._owner:
+            return
+        meta = {
+            "format": INDEX_FORMAT,
+            "embedder": self.embedder.name,
+            "dimension": self.embedder.dimension,
+            "count": self._count,
+            "synced_id": self._synced_id,
+            "pending": sorted(self._pending),
+        }
+        temporary = self._file("meta.json.tmp")
+        with open(temporary, "w") as f:
+            json.dump(meta, f)
+        os.replace(temporary, self._file("meta.json"))
+
+    def _grow(self, needed: int) -> None:
+        capacity = max(needed, len(self._ids) * 2, _MIN_CAPACITY)
+        arrays = {
+            "ids": (self._ids, np.int64, (capacity,)),
+            "levels": (self._levels, np.int16, (capacity,)),
+            "vectors": (self._vectors, np.float32, (capacity, self.embedder.dimension)),
+        }
+        grown = {}
+        for name, (current, dtype, shape) in arrays.items():
+            if self._owner:
+                # 新しい容量のファイルに書き写してから差し替える
+                temporary = self._file(f"{name}.tmp.npy")
+                array = np.lib.format.open_memmap(temporary, mode="w+", dtype=dtype, shape=shape)
+                array[:self._count] = current[:self._count]
+                array.flush()
+                del array
+                os.replace(temporary, self._file(f"{name}.npy"))
+                grown[name] = np.load(self._file(f"{name}.npy"), mmap_mode="r+")
+            else:
+                array = np.zeros(shape, dtype=dtype)
+                array[:self._count] = current[:self._count]
+                grown[name] = array
+        self._ids, self._levels, self._vectors = grown["ids"], grown["levels"], grown["vectors"]
+
+    def _append(self, ids: Sequence[int], levels: Sequence[int], vectors: np.ndarray) -> None:
+        start, end = self._count, self._count + len(ids)
+        if end > len(self._ids):
+            self._grow(end)
+        self._ids[start:end] = ids
+        self._levels[start:end] = levels
+        self._vectors[start:end] = vectors
+        if self._owner:
+            for array in (self._ids, self._levels, self._vectors):
+                array.flush()
+        for row, question_id in enumerate(ids, start=start):
+            self._positions[int(question_id)] = row
+        self._count = end
+        self.embedded += len(ids)
+
+    # ---- 更新 ----
+
+    async def start(self) -> None:
+        """保存済みの索引を読み込み、DBとの差分の取り込みをバックグラウンドで始める"""
+        self._open()
+        self._schedule(self.sync())
+
+    def _schedule(self, coroutine) -> None:
+        task = asyncio.create_task(self._guarded(coroutine))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _guarded(self, coroutine) -> None:
+        try:
+            await coroutine
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failures += 1
+            logger.warning("Question index update failed: %s", e)
+
+    async def sync(self) -> None:
+        """索引にない問題をID順に取り込む（他のワーカーが追加した問題も含む）"""
+        async with self._lock:
+            self._last_sync = time.monotonic()
+            while True:
+                async with SessionLocal() as db:
+                    rows = (await db.execute(
+                        select(
+                            Question.id, Question.japanese_text,
+                            Question.english_text, Question.difficulty_level
+                        ).where(
+                            Question.id > self._synced_id, Question.source == QUESTION_SOURCE_GENERATED
+                        ).order_by(Question.id).limit(self.batch_size)
+                    )).all()
+                if not rows:
+                    break
+                new = [row for row in rows if row.id not in self._positions and row.japanese_text]
+                if new:
+                    vectors = await self.embedder.embed([_document(row.japanese_text, row.english_text) for row in new])
+                    self._append([row.id for row in new], [row.difficulty_level or 0 for row in new], vectors)
+                    self._pending.update(row.id for row in new if not row.english_text)
+                self._synced_id = rows[-1].id
+                self._write_meta()
+            await self._reembed_pending()
+            self.ready = True
+
+    async def _reembed_pending(self) -> None:
+        """英訳なしで埋め込んだ問題のうち、英訳が補完された問題を英訳込みで埋め込み直す
+
+        1回の同期で確認するのは batch_size 件までで、続きは次の同期で確認する。
+        """
+        if not self._pending:
+            return
+        pending = sorted(self._pending)
+        start = bisect.bisect_right(pending, self._pending_cursor)
+        batch = pending[start:start + self.batch_size] or pending[:self.batch_size]
+        self._pending_cursor = batch[-1]
+        async with SessionLocal() as db:
+            rows = (await db.execute(
+                select(Question.id, Question.japanese_text, Question.english_text).where(
+                    Question.id.in_(batch), Question.english_text.isnot(None), Question.english_text != ""
+                )
+            )).all()
+        if not rows:
+            return
+        vectors = await self.embedder.embed([_document(row.japanese_text, row.english_text) for row in rows])
+        for row, vector in zip(rows, vectors):
+            self._vectors[self._positions[row.id]] = vector
+            self._pending.discard(row.id)
+        if self._owner:
+            self._vectors.flush()
+        self.reembedded += len(rows)
+        self._write_meta()
+
+    def add(self, question: Question) -> None:
+        """新しく作った問題をバックグラウンドで索引に加える（LLMで生成した問題のみ）"""
+        if question.source != QUESTION_SOURCE_GENERATED:
+            return
+        self._schedule(self._add(question.id, question.japanese_text, question.english_text, question.difficulty_level))
+
+    async def _add(self, question_id: int, japanese_text: str, english_text: Optional[str], level: Optional[int]) -> None:
+        async with self._lock:
+            if question_id in self._positions or not japanese_text:
+                return
+            vectors = await self.embedder.embed([_document(japanese_text, english_text)])
+            self._append([question_id], [level or 0], vectors)
+            if not english_text:
+                self._pending.add(question_id)
+            self._write_meta()
+
+    # ---- 検索 ----
+
+    def mark_served(self, user_id: int, question_id: int) -> None:
+        served = self._served.pop(user_id, None) or deque(maxlen=settings.EMBEDDING_RECENT_WINDOW)
+        served.append(question_id)
+        self._served[user_id] = served
+        # 最近使われていないユーザーから破棄する
+        while len(self._served) > self.max_users:
+            self._served.popitem(last=False)
+
+    async def suggest(self, db, user_id: int, words: List[str], difficulty_level: int) -> Optional[int]:
+        """ユーザーが未回答・未出題で、難易度が合い、直近の問題と似すぎていない既存の問題IDを返す
+
+        間違えた単語があれば単語との類似度が閾値以上の中から最も近い問題を、
+        なければ条件に合う問題から無作為に選ぶ。見つからなければNone（LLMで生成する）。
+        回答済みとして除くのは直近 EMBEDDING_ANSWERED_WINDOW 件の回答の問題まで（それより前の問題は再び出ることがある）。
+        """
+        if not self.ready or self._count == 0:
+            self.misses += 1
+            return None
+        if time.monotonic() - self._last_sync > self.sync_seconds and not self._lock.locked():
+            self._schedule(self.sync())
+
+        query = None
+        if words:
+            query = normalize_rows((await self.embedder.embed(words)).mean(axis=0, keepdims=True))[0]
+
+        # 回答履歴の全件は読まず、直近の回答だけを1回のクエリで取る
+        latest = list(await db.scalars(
+            select(UserAnswer.question_id).where(
+                UserAnswer.user_id == user_id, UserAnswer.question_id.isnot(None)
+            ).order_by(UserAnswer.id.desc()).limit(settings.EMBEDDING_ANSWERED_WINDOW)
+        ))
+        answered = set(latest)
+        recent = latest[:settings.EMBEDDING_RECENT_WINDOW]
+        served = list(self._served.get(user_id, ()))
+        excluded = answered.union(served)
+        recent.extend(served)
+
+        count = self._count
+        ids, vectors = self._ids[:count], self._vectors[:count]
+        mask = self._levels[:count] == difficulty_level
+        if excluded:
+            mask &= ~np.isin(ids, np.fromiter(excluded, dtype=np.int64))
+        candidates = np.flatnonzero(mask)
+        if len(candidates):
+            candidate_vectors = vectors[candidates]
+            # 直近に解いた問題とほぼ同じ文の問題は出さない
+            recent_rows = [self._positions[question_id] for question_id in recent if question_id in self._positions]
+            if recent_rows:
+                nearest = (candidate_vectors @ vectors[recent_rows].T).max(axis=1)
+                keep = nearest < settings.EMBEDDING_DUPLICATE_THRESHOLD
+            else:
+                keep = np.ones(len(candidates), dtype=bool)
+            if query is not None:
+                scores = candidate_vectors @ query
+                keep &= scores >= settings.EMBEDDING_MATCH_THRESHOLD
+                if keep.any():
+                    choice = int(np.flatnonzero(keep)[np.argmax(scores[keep])])
+                    self.reused += 1
+                    return int(ids[candidates[choice]])
+            elif keep.any():
+                choice = random.choice(np.flatnonzero(keep).tolist())
+                self.reused += 1
+                return int(ids[candidates[choice]])
+        self.misses += 1
+        return None
+
+    def stats(self) -> dict:
+        total = self.reused + self.misses
+        return {
+            "embedder": self.embedder.name,
+            "dimension": self.embedder.dimension,
+            "indexed": self._count,
+            "ready": self.ready,
+            "file_owner": self._owner,
+            "synced_question_id": self._synced_id,
+            "reused": self.reused,
+            "misses": self.misses,
+            "reuse_rate": self.reused / total if total else 0.0,
+            "embedded": self.embedded,
+            "reembedded": self.reembedded,
+            "pending_reembed": len(self._pending),
+            "failures": self.failures,
+        }
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+            self._owner = False
+
+question_index = QuestionIndex(
+    embedder=create_embedder(),
+    path=settings.EMBEDDING_INDEX_PATH,
+    sync_seconds=settings.EMBEDDING_SYNC_SECONDS,
+    batch_size=settings.EMBEDDING_BATCH_SIZE,
+    # 出題履歴は問題プールと同じ人数まで保持する
+    max_users=settings.QUESTION_POOL_MAX_USERS,
+)
@@ -0,0 +1,119 @@
+# app/utils/question_pool.py
+import asyncio
+import logging
+import random
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+from ..config import settings
+from .llm import chat_completion
+from .llm_gateway import QuotaExceededError
+from .prompts import question_messages
+
+logger = logging.getLogger(__name__)
+
+# プールの種類（ランダム問題 / 間違えた単語を使う問題）
+SOURCE_RANDOM = "random"
+SOURCE_MISTAKE = "mistake"
+
+PoolKey = Tuple[int, str]
+
+class QuestionPool:
+    """ユーザー・種類ごとに事前生成した問題文を保持し、バックグラウンドで補充する"""
+
+    def __init__(self, depth: int, refill_concurrency: int, max_users: int):
+        self.depth = depth
+        self.max_users = max_users
+        self._pools: "OrderedDict[PoolKey, Deque[str]]" = OrderedDict()
+        self._words: Dict[PoolKey, List[str]] = {}
+        self._refilling: Set[PoolKey] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._semaphore = asyncio.Semaphore(refill_concurrency)
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.failures = 0
+        self.quota_skipped = 0
+
+    def pop(self, user_id: int, source: str, words: Optional[List[str]] = None) -> Optional[str]:
+        """プールから問題文を1件取り出す。空の場合はNoneを返し、いずれの場合も補充を予約する"""
+        key = (user_id, source)
+        pool = self._pools.get(key)
+        text = pool.popleft() if pool else None
+        if text is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._pools.move_to_end(key)
+        self.schedule_refill(user_id, source, words)
+        return text
+
+    def schedule_refill(self, user_id: int, source: str, words: Optional[List[str]] = None) -> None:
+        key = (user_id, source)
+        if words:
+            self._words[key] = list(words)
+        if key in self._refilling:
+            return
+        if key not in self._pools:
+            self._pools[key] = deque()
+            self._evict()
+        self._refilling.add(key)
+        task = asyncio.create_task(self._refill(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _evict(self) -> None:
+        # 最近使われていないユーザーのプールから破棄する
+        while len(self._pools) > self.max_users:
+            key, _ = self._pools.popitem(last=False)
+            self._words.pop(key, None)
+
+    async def _refill(self, key: PoolKey) -> None:
+        try:
+            while key in self._pools and len(self._pools[key]) < self.depth:
+                words = self._words.get(key)
+                word = random.choice(words) if key[1] == SOURCE_MISTAKE and words else None
+                async with self._semaphore:
+                    # 補充もそのユーザーの利用上限に数える
+                    text = await chat_completion(
+                        messages=question_messages(word), coalesce=False, user_id=key[0]
+                    )
+                self.generated += 1
+                pool = self._pools.get(key)
+                if pool is None:
+                    break
+                pool.append(text)
+        except asyncio.CancelledError:
+            raise
+        except QuotaExceededError:
+            # 上限に達したユーザーの補充はやめ、次に取り出されたときに改めて補充する
+            self.quota_skipped += 1
+        except Exception as e:
+            self.failures += 1
+            logger.warning("Question pool refill failed for %s: %s", key, e)
+        finally:
+            self._refilling.discard(key)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "generated": self.generated,
+            "failures": self.failures,
+            "quota_skipped": self.quota_skipped,
+            "pools": len(self._pools),
+            "pooled_questions": sum(len(p) for p in self._pools.values()),
+            "refilling": len(self._refilling),
+        }
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+question_pool = QuestionPool(
+    depth=settings.QUESTION_POOL_DEPTH,
+    refill_concurrency=settings.QUESTION_POOL_REFILL_CONCURRENCY,
+    max_users=settings.QUESTION_POOL_MAX_USERS,
+)
@@ -0,0 +1,227 @@
+# app/utils/response_cache.py
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Optional, Set
+from sqlalchemy import delete, or_, select
+from sqlalchemy.exc import IntegrityError
+from ..config import settings
+from ..database import SessionLocal
+from ..models.models import LlmCacheEntry
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# 削除のたびに更新する世代のエントリ（内容アドレス型のキーとは衝突しない）
+GENERATION_KEY = "__generation__"
+GENERATION_KIND = "__meta__"
+
+def normalize_text(text: str) -> str:
+    """全角・半角や空白の揺れを吸収してキャッシュキーを安定させる"""
+    text = unicodedata.normalize("NFKC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+def make_key(kind: str, model: str, *parts: str) -> str:
+    """入力内容・種類・モデルから内容アドレス型のキーを作る"""
+    material = json.dumps(
+        [kind, model] + [normalize_text(part) for part in parts],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """プロセス内LRU（TTL付き）とDBの2層で解析済みのLLM応答を保持する
+
+    期限切れのDBのエントリは、保存のついでに purge_seconds ごとにバックグラウンドで削除する。
+    """
+
+    def __init__(
+        self, max_entries: int, ttl_seconds: int, db_ttl_seconds: int,
+        generation_check_seconds: float, purge_seconds: float
+    ):
+        self.db_ttl_seconds = db_ttl_seconds
+        self.generation_check_seconds = generation_check_seconds
+        self.purge_seconds = purge_seconds
+        self._memory = TTLCache(max_entries, ttl_seconds)
+        # 最後に確認した世代と確認した時刻
+        self._generation: Optional[str] = None
+        self._generation_checked = 0.0
+        self._last_purge = time.monotonic()
+        self._tasks: Set[asyncio.Task] = set()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.purged = 0
+
+    async def _check_generation(self) -> None:
+        """他のワーカーで削除が行われていれば、プロセス内の層を破棄する
+
+        プロセス内の層はワーカーごとに持つため、削除したワーカー以外では世代の変化を
+        確認するまで古いエントリが残る（最大で generation_check_seconds 秒）。
+        """
+        if time.monotonic() - self._generation_checked < self.generation_check_seconds:
+            return
+        self._generation_checked = time.monotonic()
+        try:
+            async with SessionLocal() as db:
+                generation = (await db.execute(
+                    select(LlmCacheEntry.payload).where(LlmCacheEntry.key == GENERATION_KEY)
+                )).scalar()
+        except Exception as e:
+            logger.warning("Response cache generation check failed: %s", e)
+            return
+        if generation != self._generation:
+            if self._generation is not None or generation is not None:
+                self._memory.clear()
+            self._generation = generation
+
+    async def get(self, key: str) -> Optional[dict]:
+        await self._check_generation()
+        value = self._memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+
+        try:
+            value = await self._db_get(key)
+        except Exception as e:
+            logger.warning("Response cache lookup failed: %s", e)
+            value = None
+        if value is None:
+            self.misses += 1
+            return None
+        self.db_hits += 1
+        self._memory.set(key, value)
+        return value
+
+    async def set(self, key: str, kind: str, value: dict) -> None:
+        self.sets += 1
+        self._memory.set(key, value)
+        try:
+            await self._db_set(key, kind, value)
+        except Exception as e:
+            logger.warning("Response cache store failed: %s", e)
+        self._schedule_purge()
+
+    def _schedule_purge(self) -> None:
+        if self.purge_seconds <= 0 or time.monotonic() - self._last_purge < self.purge_seconds:
+            return
+        self._last_purge = time.monotonic()
+        task = asyncio.create_task(self._purge())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _purge(self) -> None:
+        try:
+            self.purged += await self.purge_expired()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Response cache purge failed: %s", e)
+
+    async def purge_expired(self) -> int:
+        """期限切れのDBのエントリを削除し、削除した件数を返す（世代のエントリは残す）"""
+        async with SessionLocal() as db:
+            result = await db.execute(
+                delete(LlmCacheEntry).where(
+                    LlmCacheEntry.expires_at <= datetime.utcnow(),
+                    or_(LlmCacheEntry.kind.is_(None), LlmCacheEntry.kind != GENERATION_KIND)
+                )
+            )
+            await db.commit()
+        if result.rowcount:
+            logger.info("Purged %d expired response cache entries", result.rowcount)
+        return result.rowcount
+
+    async def _db_get(self, key: str) -> Optional[dict]:
+        async with SessionLocal() as db:
+            result = await db.execute(
+                select(LlmCacheEntry.payload).where(
+                    LlmCacheEntry.key == key,
+                    LlmCacheEntry.expires_at > datetime.utcnow()
+                )
+            )
+            payload = result.scalar()
+            return json.loads(payload) if payload else None
+
+    async def _db_set(self, key: str, kind: str, value: dict) -> None:
+        async with SessionLocal() as db:
+            try:
+                now = datetime.utcnow()
+                await db.merge(LlmCacheEntry(
+                    key=key,
+                    kind=kind,
+                    payload=json.dumps(value, ensure_ascii=False),
+                    created_at=now,
+                    expires_at=now + timedelta(seconds=self.db_ttl_seconds)
+                ))
+                await db.commit()
+            except IntegrityError:
+                # 他のワーカーが同じキーを同時に保存した場合は無視する
+                await db.rollback()
+
+    async def invalidate(self, key: Optional[str] = None, kind: Optional[str] = None) -> int:
+        """キーまたは種類を指定してエントリを削除する（どちらも未指定なら全削除）"""
+        if key:
+            self._memory.pop(key)
+        else:
+            # プロセス内の層は種類を保持していないため、種類指定の場合もまとめて破棄する
+            self._memory.clear()
+        return await self._db_invalidate(key, kind)
+
+    async def _db_invalidate(self, key: Optional[str], kind: Optional[str]) -> int:
+        async with SessionLocal() as db:
+            statement = delete(LlmCacheEntry).where(
+                or_(LlmCacheEntry.kind.is_(None), LlmCacheEntry.kind != GENERATION_KIND)
+            )
+            if key:
+                statement = statement.where(LlmCacheEntry.key == key)
+            if kind:
+                statement = statement.where(LlmCacheEntry.kind == kind)
+            result = await db.execute(statement)
+            # 世代を更新し、他のワーカーにもプロセス内の層を破棄させる
+            now = datetime.utcnow()
+            generation = f"{now.isoformat()}-{random.getrandbits(32):08x}"
+            await db.merge(LlmCacheEntry(
+                key=GENERATION_KEY,
+                kind=GENERATION_KIND,
+                payload=generation,
+                created_at=now,
+                # 世代は _db_get から読まれないよう期限切れにしておく
+                expires_at=now
+            ))
+            await db.commit()
+        self._generation = generation
+        return result.rowcount
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+            "sets": self.sets,
+            "purged": self.purged,
+            "memory_entries": len(self._memory),
+        }
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+    db_ttl_seconds=settings.RESPONSE_CACHE_DB_TTL_SECONDS,
+    generation_check_seconds=settings.RESPONSE_CACHE_GENERATION_CHECK_SECONDS,
+    purge_seconds=settings.RESPONSE_CACHE_PURGE_SECONDS,
+)
@@ -0,0 +1,82 @@
+# app/utils/srs.py
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from difflib import SequenceMatcher
+from typing import Optional
+from .grader import LocalGrade, normalize_tokens
+from .mistake_words import extract_reference_answer
+
+MIN_EASE_FACTOR = 1.3
+UNKNOWN_QUALITY = 3
+
+@dataclass(frozen=True)
+class ReviewSchedule:
+    repetitions: int
+    interval_days: float
+    ease_factor: float
+    due_at: datetime
+
+def schedule_review(repetitions: int, interval_days: float, ease_factor: float, quality: int, now: datetime) -> ReviewSchedule:
+    """SM-2法で次の復習間隔を決める（quality は 0〜5、3未満は覚え直し）"""
+    quality = max(0, min(5, quality))
+    if quality < 3:
+        repetitions = 0
+        interval_days = 1.0
+    else:
+        if repetitions == 0:
+            interval_days = 1.0
+        elif repetitions == 1:
+            interval_days = 6.0
+        else:
+            interval_days = round(interval_days * ease_factor, 1)
+        repetitions += 1
+    ease_factor = max(MIN_EASE_FACTOR, ease_factor + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return ReviewSchedule(
+        repetitions=repetitions,
+        interval_days=interval_days,
+        ease_factor=round(ease_factor, 4),
+        due_at=now + timedelta(days=interval_days),
+    )
+
+def quality_from_similarity(similarity: float) -> int:
+    """模範解答との類似度をSM-2の評価（0〜5）に換算する"""
+    for threshold, quality in ((0.95, 5), (0.85, 4), (0.7, 3), (0.5, 2), (0.3, 1)):
+        if similarity >= threshold:
+            return quality
+    return 0
+
+def review_quality(local: Optional[LocalGrade], answer_text: str, feedback: str) -> int:
+    """添削結果から評価を求める。保存済みの英訳がなければフィードバック中の模範解答と比べる"""
+    if local is not None:
+        return quality_from_similarity(local.similarity)
+    reference = normalize_tokens(extract_reference_answer(feedback))
+    if not reference:
+        # 比べる英文がなければ「正解だが苦労した」扱いにして、同じ問題が出続けないようにする
+        return UNKNOWN_QUALITY
+    answer = normalize_tokens(answer_text)
+    return quality_from_similarity(SequenceMatcher(a=reference, b=answer, autojunk=False).ratio())
+
+def apply_review(favorite, quality: int, now: Optional[datetime] = None) -> None:
+    """FavoriteQuestionのスケジュール列を更新する（コミットは呼び出し側で行う）"""
+    now = now or datetime.utcnow()
+    schedule = schedule_review(
+        favorite.repetitions or 0,
+        favorite.interval_days or 0.0,
+        favorite.ease_factor or 2.5,
+        quality,
+        now
+    )
+    favorite.repetitions = schedule.repetitions
+    favorite.interval_days = schedule.interval_days
+    favorite.ease_factor = schedule.ease_factor
+    favorite.due_at = schedule.due_at
+    favorite.last_reviewed_at = now
+
+def schedule_details(favorite) -> dict:
+    """添削レスポンスに付ける次回の復習予定"""
+    return {
+        "due_at": favorite.due_at.isoformat() if favorite.due_at else None,
+        "interval_days": favorite.interval_days,
+        "repetitions": favorite.repetitions,
+        "ease_factor": favorite.ease_factor,
+    }
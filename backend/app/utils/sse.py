@@ -0,0 +1,22 @@
+# app/utils/sse.py
+import json
+from typing import AsyncIterator, Optional
+from fastapi.responses import StreamingResponse
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Server-Sent Events 形式の1イベントを組み立てる"""
+    payload = json.dumps(data, ensure_ascii=False)
+    if event:
+        return f"event: {event}\ndata: {payload}\n\n"
+    return f"data: {payload}\n\n"
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    # プロキシ側でバッファリングされないようにヘッダーを付与
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
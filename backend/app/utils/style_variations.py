@@ -0,0 +1,92 @@
+# app/utils/style_variations.py
+import logging
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from ..config import settings
+from .llm import chat_completion
+from .prompts import style_variations_messages, style_variations_schema
+from .response_cache import response_cache, make_key
+
+logger = logging.getLogger(__name__)
+
+class StyleVariation(BaseModel):
+    variation_type: str
+    translation: str
+    explanation: str
+
+class StyleVariationsOutput(BaseModel):
+    """構造化出力の検証用（JSONスキーマと同じ形）"""
+    variations: List[StyleVariation]
+
+def normalize_variation_types(variation_types: List[str]) -> List[str]:
+    """言い換えの種類を検証し、重複を除いて指定順に並べる"""
+    normalized = []
+    for variation_type in variation_types:
+        variation_type = variation_type.strip()
+        if variation_type.startswith("context:"):
+            valid = bool(variation_type[8:].strip())
+        else:
+            valid = variation_type in ("formal", "casual")
+        if not valid:
+            raise HTTPException(status_code=400, detail=f"Unknown variation type: {variation_type}")
+        if variation_type not in normalized:
+            normalized.append(variation_type)
+    return normalized
+
+def variation_cache_key(variation_type: str, japanese_text: str, current_translation: str) -> str:
+    return make_key(
+        "translation_variation", settings.STRUCTURED_MODEL,
+        variation_type, japanese_text, current_translation
+    )
+
+async def generate_style_variations(
+    japanese_text: str, current_translation: str, variation_types: List[str], user_id: Optional[int]
+) -> List[dict]:
+    """複数の種類の言い換えを1回の構造化出力でまとめて生成し、指定順に返す
+
+    キャッシュ済みの種類は呼び出しから除く。種類は normalize_variation_types で検証済みであること。
+    """
+    results: Dict[str, dict] = {}
+    if settings.RESPONSE_CACHE_ENABLED:
+        for variation_type in variation_types:
+            cached = await response_cache.get(variation_cache_key(variation_type, japanese_text, current_translation))
+            if cached is not None:
+                results[variation_type] = cached
+
+    missing = [variation_type for variation_type in variation_types if variation_type not in results]
+    if missing:
+        content = await chat_completion(
+            messages=style_variations_messages(japanese_text, current_translation, missing),
+            model=settings.STRUCTURED_MODEL,
+            user_id=user_id,
+            response_format={"type": "json_schema", "json_schema": style_variations_schema(missing)}
+        )
+        try:
+            output = StyleVariationsOutput.model_validate_json(content)
+        except ValidationError as e:
+            logger.warning("Invalid structured style variations: %s", e)
+            raise HTTPException(status_code=502, detail="Invalid response from the language model")
+
+        for variation in output.variations:
+            if variation.variation_type not in missing or variation.variation_type in results:
+                continue
+            if not variation.translation.strip():
+                continue
+            result = variation.model_dump()
+            results[variation.variation_type] = result
+            if settings.RESPONSE_CACHE_ENABLED:
+                await response_cache.set(
+                    variation_cache_key(variation.variation_type, japanese_text, current_translation),
+                    "translation_variation", result
+                )
+
+        # 返ってこなかった種類があれば失敗にする（得られた種類はキャッシュ済みなので再試行で補える）
+        lacking = [variation_type for variation_type in missing if variation_type not in results]
+        if lacking:
+            raise HTTPException(
+                status_code=502,
+                detail=f"Missing variations in the language model response: {', '.join(lacking)}"
+            )
+
+    return [results[variation_type] for variation_type in variation_types]
@@ -0,0 +1,160 @@
+# app/worker.py
+"""ジョブキューのワーカー
+
+    python -m app.worker --concurrency 4 --kinds generate_questions,fill_reference_answer
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import time
+from typing import List, Optional
+from .config import settings
+from .database import engine
+from .models.models import Job
+from .utils import job_queue
+from .utils.job_queue import PermanentJobError
+from .utils.llm import close_client
+from .utils.log import setup_logging, shutdown_logging
+from . import jobs  # noqa: F401  ハンドラーを登録する
+
+logger = logging.getLogger(__name__)
+
+# 期限切れのジョブを dead にする間隔
+REAP_INTERVAL_SECONDS = 60
+
+class Worker:
+    """jobs テーブルからジョブを取り出して実行するワーカー（同時実行数だけ取り出しループを回す）"""
+
+    def __init__(self, concurrency: int, kinds: Optional[List[str]] = None):
+        self.concurrency = concurrency
+        self.kinds = kinds or None
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = asyncio.Event()
+        self.succeeded = 0
+        self.retried = 0
+        self.dead = 0
+        self.errors = 0
+
+    def stop(self) -> None:
+        if not self.stopping.is_set():
+            logger.info("Stopping worker %s, waiting for running jobs", self.worker_id)
+            self.stopping.set()
+
+    async def run(self) -> None:
+        logger.info(
+            "Worker %s started (concurrency=%d, kinds=%s)",
+            self.worker_id, self.concurrency, ",".join(self.kinds or job_queue.registered_kinds())
+        )
+        loops = [asyncio.create_task(self._loop(index)) for index in range(self.concurrency)]
+        reaper = asyncio.create_task(self._reap())
+        await self.stopping.wait()
+
+        # 取り出し済みのジョブは猶予時間まで待ち、終わらなければ中断してキューに戻す
+        _, pending = await asyncio.wait(loops, timeout=settings.JOB_SHUTDOWN_GRACE_SECONDS)
+        for task in [*pending, reaper]:
+            task.cancel()
+        await asyncio.gather(*pending, reaper, return_exceptions=True)
+        logger.info(
+            "Worker %s stopped (succeeded=%d, retried=%d, dead=%d, errors=%d)",
+            self.worker_id, self.succeeded, self.retried, self.dead, self.errors
+        )
+
+    async def _loop(self, index: int) -> None:
+        while not self.stopping.is_set():
+            try:
+                claimed = await job_queue.claim(self.worker_id, self.kinds)
+            except Exception as e:
+                logger.warning("Claiming a job failed: %s", e)
+                claimed = []
+            if not claimed:
+                # 空なら少し待つ（停止の合図があればすぐ抜ける）
+                try:
+                    await asyncio.wait_for(self.stopping.wait(), settings.JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._execute(claimed[0])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # 結果の記録に失敗してもループは止めない（ジョブは期限切れ後に取り直される）
+                self.errors += 1
+                logger.exception("Recording the result of job %s failed", claimed[0].id)
+
+    async def _execute(self, job: Job) -> None:
+        handler = job_queue.get_handler(job.kind)
+        started = time.perf_counter()
+        log_extra = {"job_id": job.id, "kind": job.kind, "attempt": job.attempts}
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            if handler is None:
+                raise PermanentJobError(f"No handler registered for job kind '{job.kind}'")
+            await handler(json.loads(job.payload or "{}"))
+        except asyncio.CancelledError:
+            # 停止時の中断は失敗に数えず、すぐに他のワーカーが取り出せるようにする
+            await asyncio.shield(job_queue.release(job, self.worker_id))
+            raise
+        except Exception as e:
+            permanent = isinstance(e, (PermanentJobError, json.JSONDecodeError))
+            status = await job_queue.fail(job, self.worker_id, f"{type(e).__name__}: {e}", permanent=permanent)
+            if status == job_queue.DEAD:
+                self.dead += 1
+                logger.error("Job dead-lettered: %s", e, extra=log_extra)
+            else:
+                self.retried += 1
+                logger.warning("Job failed, will retry: %s", e, extra=log_extra)
+        else:
+            if await job_queue.complete(job, self.worker_id):
+                self.succeeded += 1
+            else:
+                logger.warning("Job finished after its visibility timeout expired", extra=log_extra)
+            wait_seconds = (job.started_at - job.created_at).total_seconds() if job.created_at else None
+            logger.info(
+                "Job succeeded", extra={**log_extra, "run_seconds": round(time.perf_counter() - started, 3), "wait_seconds": wait_seconds}
+            )
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job: Job) -> None:
+        # 期限の1/3ごとに延長し、長いジョブが他のワーカーに取り直されないようにする
+        while True:
+            await asyncio.sleep(settings.JOB_VISIBILITY_TIMEOUT_SECONDS / 3)
+            try:
+                if not await job_queue.extend(job, self.worker_id):
+                    return
+            except Exception as e:
+                logger.warning("Extending job %s failed: %s", job.id, e)
+
+    async def _reap(self) -> None:
+        while True:
+            try:
+                await job_queue.reap_expired()
+            except Exception as e:
+                logger.warning("Reaping expired jobs failed: %s", e)
+            await asyncio.sleep(REAP_INTERVAL_SECONDS)
+
+async def main(concurrency: int, kinds: Optional[List[str]]) -> None:
+    setup_logging()
+    worker = Worker(concurrency, kinds)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        await close_client()
+        await engine.dispose()
+        shutdown_logging()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run background job workers")
+    parser.add_argument("--concurrency", type=int, default=settings.JOB_WORKER_CONCURRENCY)
+    parser.add_argument("--kinds", default="", help="comma separated job kinds to process (default: all)")
+    args = parser.parse_args()
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    asyncio.run(main(args.concurrency, kinds))
@@ -0,0 +1,215 @@
+# bench/fake_openai.py
+"""Chat Completions API のローカル代替サーバー（負荷試験用）
+
+    python -m bench.fake_openai --port 8001 --latency-ms 800 --jitter-ms 300 --error-rate 0.01
+
+アプリ側は OPENAI_BASE_URL=http://127.0.0.1:8001/v1 を指定して起動する。
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import List
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+class FakeConfig:
+    """応答までの待ち時間の分布とエラー率"""
+
+    def __init__(self, latency_ms: float = 500, jitter_ms: float = 200, distribution: str = "normal",
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, chunk_delay_ms: float = 20):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.chunk_delay_ms = chunk_delay_ms
+
+    def latency(self) -> float:
+        if self.distribution == "fixed":
+            value = self.latency_ms
+        elif self.distribution == "uniform":
+            value = random.uniform(self.latency_ms - self.jitter_ms, self.latency_ms + self.jitter_ms)
+        elif self.distribution == "lognormal":
+            # 平均がlatency_ms付近になる裾の長い分布（LLMの応答時間に近い）
+            value = random.lognormvariate(0, 0.5) * self.latency_ms / 1.13
+        else:
+            value = random.gauss(self.latency_ms, self.jitter_ms)
+        return max(0.0, value) / 1000
+
+SAMPLE_SENTENCES = [
+    ("私は毎朝コーヒーを飲みます。", "I drink coffee every morning."),
+    ("昨日は雨が降っていたので家にいました。", "I stayed home yesterday because it was raining."),
+    ("この本はとても面白いと友達が言っていました。", "My friend said this book was very interesting."),
+    ("駅までの道を教えていただけますか。", "Could you tell me the way to the station?"),
+    ("週末に家族と山に登る予定です。", "I am planning to climb a mountain with my family this weekend."),
+]
+
+def _prompt_text(messages: List[dict]) -> str:
+    return "\n".join(str(message.get("content", "")) for message in messages)
+
+def fake_from_schema(schema: dict, english: str, name: str = ""):
+    """JSONスキーマに沿った値を作る（構造化出力の応答用）
+
+    要素にenumの項目を持つ配列は、enumの値ごとに1件ずつ作る（指定した種類を全て返す応答になる）。
+    """
+    kind = schema.get("type")
+    if "enum" in schema:
+        return schema["enum"][0]
+    if kind == "object":
+        return {key: fake_from_schema(child, english, key) for key, child in schema.get("properties", {}).items()}
+    if kind == "array":
+        items = schema.get("items", {})
+        enums = [
+            (name, child["enum"]) for name, child in items.get("properties", {}).items() if "enum" in child
+        ]
+        if enums:
+            key, values = enums[0]
+            return [{**fake_from_schema(items, english), key: value} for value in values]
+        return [fake_from_schema(items, english)]
+    if kind == "integer":
+        return 1
+    if kind == "number":
+        return 1.0
+    if kind == "boolean":
+        return True
+    if name in ("explanation", "feedback"):
+        return "- 基本的な語順に沿った訳です。\n- 時制に注意してください。"
+    return english
+
+def fake_content(body: dict) -> str:
+    """プロンプトの種類に応じて、アプリ側の解析が通る形の応答を返す"""
+    messages = body.get("messages", [])
+    prompt = _prompt_text(messages)
+    japanese, english = random.choice(SAMPLE_SENTENCES)
+    response_format = body.get("response_format") or {}
+
+    if response_format.get("type") == "json_schema":
+        schema = (response_format.get("json_schema") or {}).get("schema", {})
+        return json.dumps(fake_from_schema(schema, english), ensure_ascii=False)
+    if response_format.get("type") == "json_object":
+        count = max(1, prompt.count("学習者の英訳"))
+        return json.dumps({
+            "results": [
+                {"index": i + 1, "feedback": f"正確な答え: {english}\n文法: 問題ありません。"}
+                for i in range(count)
+            ]
+        }, ensure_ascii=False)
+    if "添削" in prompt:
+        return (
+            "- 改善点: 主語と動詞の一致を確認しましょう。\n"
+            f"- 正確な答え: {english}\n"
+            "- 解説: 自然な表現です。"
+        )
+    if "英訳" in prompt:
+        return f"英訳：{english}\n\n解説：\n- 基本的な語順に沿った訳です。\n- 時制に注意してください。"
+    return japanese
+
+def create_app(config: FakeConfig) -> FastAPI:
+    app = FastAPI()
+    app.state.requests = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        await asyncio.sleep(config.latency())
+
+        roll = random.random()
+        if roll < config.rate_limit_rate:
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": "1"},
+                content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+            )
+        if roll < config.rate_limit_rate + config.error_rate:
+            return JSONResponse(
+                status_code=500,
+                content={"error": {"message": "The server had an error", "type": "server_error", "code": None}}
+            )
+
+        content = fake_content(body)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", "gpt-3.5-turbo")
+        prompt_tokens = len(_prompt_text(body.get("messages", []))) // 2
+        completion_tokens = len(content) // 2
+
+        if body.get("stream"):
+            async def events():
+                for i in range(0, len(content), 8):
+                    chunk = {
+                        "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                        "choices": [{"index": 0, "delta": {"content": content[i:i + 8]}, "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                    await asyncio.sleep(config.chunk_delay_ms / 1000)
+                final = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                }
+                yield f"data: {json.dumps(final)}\n\n"
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    usage = {
+                        "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                        "choices": [],
+                        "usage": {
+                            "prompt_tokens": prompt_tokens,
+                            "completion_tokens": completion_tokens,
+                            "total_tokens": prompt_tokens + completion_tokens,
+                        },
+                    }
+                    yield f"data: {json.dumps(usage)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": app.state.requests}
+
+    return app
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI chat completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--jitter-ms", type=float, default=200)
+    parser.add_argument("--distribution", choices=["normal", "uniform", "lognormal", "fixed"], default="normal")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--chunk-delay-ms", type=float, default=20, help="delay between streamed chunks")
+    args = parser.parse_args()
+
+    config = FakeConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        distribution=args.distribution,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        chunk_delay_ms=args.chunk_delay_ms,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
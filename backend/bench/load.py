@@ -0,0 +1,220 @@
+# bench/load.py
+"""主要エンドポイントの負荷試験
+
+    python -m bench.load --base-url http://127.0.0.1:8000 --concurrency 1,10,50 --iterations 5 --output bench-results.json
+    python -m bench.load --compare before.json after.json
+
+仮想ユーザーごとに「登録 → ログイン → 問題生成 → 添削 → お気に入り保存 → お気に入り一覧 →
+翻訳 → 復習添削」を繰り返し、エンドポイントごとの p50/p95/p99・スループット・エラー率を
+JSONに書き出す。LLMは bench.fake_openai を OPENAI_BASE_URL で指定して使う想定。
+"""
+import argparse
+import asyncio
+import json
+import math
+import platform
+import subprocess
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import httpx
+
+API = "/api/v1"
+
+ENDPOINTS = {
+    "register": ("POST", f"{API}/register"),
+    "login": ("POST", f"{API}/login"),
+    "questions_generate": ("POST", f"{API}/questions/generate"),
+    "questions_check": ("POST", f"{API}/questions/check"),
+    "questions_save_favorite": ("POST", f"{API}/questions/save-favorite"),
+    "questions_favorites": ("GET", f"{API}/questions/favorites"),
+    "translation_generate": ("POST", f"{API}/translation/generate"),
+    "review_check": ("POST", f"{API}/review/check"),
+}
+
+ANSWERS = [
+    "I drink coffee every morning.",
+    "I stayed at home yesterday because it rained.",
+    "My friend told me this book is very interesting.",
+]
+
+def percentile(values: List[float], q: float) -> float:
+    """最近傍順位法によるパーセンタイル（values はソート済み）"""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, math.ceil(q / 100 * len(values)) - 1))
+    return values[rank]
+
+class Recorder:
+    """エンドポイントごとの所要時間と失敗を記録する"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.status_codes: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name: str, seconds: float, status_code: Optional[int], ok: bool) -> None:
+        self.latencies[name].append(seconds)
+        self.status_codes[name][status_code or 0] += 1
+        if not ok:
+            self.errors[name] += 1
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = {}
+        for name in ENDPOINTS:
+            values = sorted(self.latencies.get(name, []))
+            if not values:
+                continue
+            errors = self.errors.get(name, 0)
+            endpoints[name] = {
+                "requests": len(values),
+                "errors": errors,
+                "error_rate": errors / len(values),
+                "throughput_rps": len(values) / elapsed if elapsed else 0.0,
+                "mean_ms": sum(values) / len(values) * 1000,
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "max_ms": values[-1] * 1000,
+                "status_codes": {str(code): count for code, count in sorted(self.status_codes[name].items())},
+            }
+        total_requests = sum(e["requests"] for e in endpoints.values())
+        total_errors = sum(e["errors"] for e in endpoints.values())
+        return {
+            "elapsed_seconds": elapsed,
+            "requests": total_requests,
+            "errors": total_errors,
+            "error_rate": total_errors / total_requests if total_requests else 0.0,
+            "throughput_rps": total_requests / elapsed if elapsed else 0.0,
+            "endpoints": endpoints,
+        }
+
+async def call(client: httpx.AsyncClient, recorder: Recorder, name: str, **kwargs) -> Optional[httpx.Response]:
+    method, path = ENDPOINTS[name]
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, path, **kwargs)
+    except httpx.HTTPError:
+        recorder.record(name, time.perf_counter() - started, None, False)
+        return None
+    recorder.record(name, time.perf_counter() - started, response.status_code, response.status_code < 400)
+    return response
+
+async def user_session(client: httpx.AsyncClient, recorder: Recorder, run_id: str, worker: int, iterations: int) -> None:
+    """仮想ユーザー1人分のシナリオ"""
+    credentials = {"email": f"bench-{run_id}-{worker}@example.com", "password": "bench-password"}
+    response = await call(client, recorder, "register", json=credentials)
+    if response is None or response.status_code >= 400:
+        return
+    for iteration in range(iterations):
+        response = await call(client, recorder, "login", json=credentials)
+        if response is None or response.status_code >= 400:
+            return
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        answer = ANSWERS[(worker + iteration) % len(ANSWERS)]
+
+        response = await call(client, recorder, "questions_generate", headers=headers)
+        if response is None or response.status_code >= 400:
+            continue
+        question = response.json()
+
+        await call(client, recorder, "questions_check", headers=headers, json={
+            "question_id": question["id"], "answer_text": answer
+        })
+        await call(client, recorder, "questions_save_favorite", headers=headers, json={
+            "question_id": question["id"], "japanese_text": question["japanese_text"], "english_answer": answer
+        })
+        response = await call(client, recorder, "questions_favorites", headers=headers, params={"limit": 20})
+        favorites = response.json() if response is not None and response.status_code == 200 else []
+
+        # 同じ文の繰り返しは応答キャッシュに当たるため、毎回異なる文を翻訳させる
+        await call(client, recorder, "translation_generate", headers=headers, json={
+            "japanese_text": f"{question['japanese_text']}（{run_id}-{worker}-{iteration}）"
+        })
+        if favorites:
+            await call(client, recorder, "review_check", headers=headers, json={
+                "favorite_question_id": favorites[0]["id"], "answer_text": answer
+            })
+
+async def run_level(base_url: str, concurrency: int, iterations: int, timeout: float) -> dict:
+    recorder = Recorder()
+    run_id = uuid.uuid4().hex[:8]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            user_session(client, recorder, run_id, worker, iterations)
+            for worker in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+    return {"concurrency": concurrency, "iterations": iterations, **recorder.summary(elapsed)}
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+async def run(args: argparse.Namespace) -> dict:
+    levels = []
+    for concurrency in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+        print(f"Running concurrency={concurrency} ...")
+        level = await run_level(args.base_url, concurrency, args.iterations, args.timeout)
+        print(
+            f"  {level['requests']} requests, {level['throughput_rps']:.1f} req/s, "
+            f"error rate {level['error_rate']:.2%}"
+        )
+        levels.append(level)
+    return {
+        "label": args.label,
+        "revision": _git_revision(),
+        "base_url": args.base_url,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "levels": levels,
+    }
+
+def compare(before_path: str, after_path: str) -> None:
+    """2つの結果ファイルのp95とスループットを並べて表示する"""
+    with open(before_path) as f:
+        before = {level["concurrency"]: level for level in json.load(f)["levels"]}
+    with open(after_path) as f:
+        after = {level["concurrency"]: level for level in json.load(f)["levels"]}
+    for concurrency in sorted(set(before) & set(after)):
+        print(f"concurrency={concurrency}")
+        for name in ENDPOINTS:
+            old = before[concurrency]["endpoints"].get(name)
+            new = after[concurrency]["endpoints"].get(name)
+            if not old or not new:
+                continue
+            change = (new["p95_ms"] - old["p95_ms"]) / old["p95_ms"] if old["p95_ms"] else 0.0
+            print(
+                f"  {name:<26} p95 {old['p95_ms']:8.1f} -> {new['p95_ms']:8.1f} ms ({change:+.1%})"
+                f"  rps {old['throughput_rps']:7.1f} -> {new['throughput_rps']:7.1f}"
+                f"  errors {old['error_rate']:.2%} -> {new['error_rate']:.2%}"
+            )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load benchmark for the Trove API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", default="1,10,50", help="comma-separated concurrency levels")
+    parser.add_argument("--iterations", type=int, default=5, help="scenario iterations per virtual user")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--label", default=None, help="free-form build label stored in the report")
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = asyncio.run(run(args))
+    with open(args.output, "w") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:00:00
+
+既存の models.py のテーブルをそのまま作成する。create_all で作成済みの
+データベースでは `alembic stamp 0001` を実行してから upgrade すること。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("email", sa.String(), nullable=True),
+        sa.Column("hashed_password", sa.String(), nullable=True),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "questions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("japanese_text", sa.String(), nullable=True),
+        sa.Column("english_text", sa.String(), nullable=True),
+        sa.Column("difficulty_level", sa.Integer(), nullable=True),
+    )
+    op.create_index("ix_questions_id", "questions", ["id"])
+
+    op.create_table(
+        "mistake_words",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("word", sa.String(), nullable=True),
+        sa.Column("count", sa.Integer(), nullable=True),
+    )
+    op.create_index("ix_mistake_words_id", "mistake_words", ["id"])
+
+    op.create_table(
+        "favorite_questions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("question_id", sa.Integer(), sa.ForeignKey("questions.id"), nullable=True),
+        sa.Column("japanese_text", sa.String(), nullable=True),
+        sa.Column("english_answer", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_favorite_questions_id", "favorite_questions", ["id"])
+
+    op.create_table(
+        "user_answers",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("question_id", sa.Integer(), sa.ForeignKey("questions.id"), nullable=True),
+        sa.Column("favorite_question_id", sa.Integer(), sa.ForeignKey("favorite_questions.id"), nullable=True),
+        sa.Column("user_answer", sa.String(), nullable=True),
+        sa.Column("feedback", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_user_answers_id", "user_answers", ["id"])
+
+    op.create_table(
+        "llm_cache",
+        sa.Column("key", sa.String(), primary_key=True),
+        sa.Column("kind", sa.String(), nullable=True),
+        sa.Column("payload", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("expires_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_llm_cache_kind", "llm_cache", ["kind"])
+    op.create_index("ix_llm_cache_expires_at", "llm_cache", ["expires_at"])
+
+def downgrade() -> None:
+    op.drop_table("llm_cache")
+    op.drop_table("user_answers")
+    op.drop_table("favorite_questions")
+    op.drop_table("mistake_words")
+    op.drop_table("questions")
+    op.drop_table("users")
@@ -0,0 +1,61 @@
+"""add foreign key indexes and unique mistake words
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:10:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_index("ix_user_answers_user_id", "user_answers", ["user_id"], if_not_exists=True)
+    op.create_index("ix_user_answers_question_id", "user_answers", ["question_id"], if_not_exists=True)
+    op.create_index("ix_user_answers_favorite_question_id", "user_answers", ["favorite_question_id"], if_not_exists=True)
+    op.create_index("ix_favorite_questions_question_id", "favorite_questions", ["question_id"], if_not_exists=True)
+    # user_id単体の検索もこの複合インデックスの先頭列で賄う
+    op.create_index(
+        "ix_favorite_questions_user_created_id",
+        "favorite_questions",
+        ["user_id", "created_at", "id"],
+        postgresql_include=["updated_at"],
+        if_not_exists=True,
+    )
+    op.create_index("ix_mistake_words_user_id_count", "mistake_words", ["user_id", "count"], if_not_exists=True)
+
+    # 一意制約の前に重複した (user_id, word) を1行にまとめ、回数を合算する
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("""
+            UPDATE mistake_words AS m
+            SET count = dup.total
+            FROM (
+                SELECT MIN(id) AS id, SUM(COALESCE(count, 1)) AS total
+                FROM mistake_words
+                GROUP BY user_id, word
+                HAVING COUNT(*) > 1
+            ) AS dup
+            WHERE m.id = dup.id
+        """)
+        op.execute("""
+            DELETE FROM mistake_words AS m
+            USING mistake_words AS keep
+            WHERE m.user_id = keep.user_id
+              AND m.word = keep.word
+              AND m.id > keep.id
+        """)
+    with op.batch_alter_table("mistake_words") as batch_op:
+        batch_op.create_unique_constraint("uq_mistake_words_user_id_word", ["user_id", "word"])
+
+def downgrade() -> None:
+    with op.batch_alter_table("mistake_words") as batch_op:
+        batch_op.drop_constraint("uq_mistake_words_user_id_word", type_="unique")
+    op.drop_index("ix_mistake_words_user_id_count", table_name="mistake_words")
+    op.drop_index("ix_favorite_questions_user_created_id", table_name="favorite_questions")
+    op.drop_index("ix_favorite_questions_question_id", table_name="favorite_questions")
+    op.drop_index("ix_user_answers_favorite_question_id", table_name="user_answers")
+    op.drop_index("ix_user_answers_question_id", table_name="user_answers")
+    op.drop_index("ix_user_answers_user_id", table_name="user_answers")
@@ -0,0 +1,64 @@
+"""unique favorite per user and question
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:20:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # 一意制約の前に重複した (user_id, question_id) を最も古い行にまとめる
+    if op.get_bind().dialect.name == "postgresql":
+        # 残す行に本文がなければ、重複行のうち最新の本文を引き継ぐ
+        op.execute("""
+            UPDATE favorite_questions AS keep
+            SET japanese_text = COALESCE(keep.japanese_text, latest.japanese_text),
+                english_answer = COALESCE(keep.english_answer, latest.english_answer)
+            FROM (
+                SELECT DISTINCT ON (user_id, question_id) user_id, question_id, japanese_text, english_answer
+                FROM favorite_questions
+                WHERE japanese_text IS NOT NULL
+                ORDER BY user_id, question_id, updated_at DESC NULLS LAST, id DESC
+            ) AS latest
+            WHERE keep.user_id = latest.user_id
+              AND keep.question_id = latest.question_id
+              AND keep.id = (
+                  SELECT MIN(id) FROM favorite_questions AS f
+                  WHERE f.user_id = keep.user_id AND f.question_id = keep.question_id
+              )
+        """)
+        # 削除する行を参照している回答は残す行に付け替える
+        op.execute("""
+            UPDATE user_answers AS a
+            SET favorite_question_id = keep.id
+            FROM favorite_questions AS dup
+            JOIN (
+                SELECT user_id, question_id, MIN(id) AS id
+                FROM favorite_questions
+                GROUP BY user_id, question_id
+                HAVING COUNT(*) > 1
+            ) AS keep ON dup.user_id = keep.user_id AND dup.question_id = keep.question_id
+            WHERE a.favorite_question_id = dup.id
+              AND dup.id <> keep.id
+        """)
+        op.execute("""
+            DELETE FROM favorite_questions AS f
+            USING favorite_questions AS keep
+            WHERE f.user_id = keep.user_id
+              AND f.question_id = keep.question_id
+              AND f.id > keep.id
+        """)
+    with op.batch_alter_table("favorite_questions") as batch_op:
+        batch_op.create_unique_constraint(
+            "uq_favorite_questions_user_id_question_id", ["user_id", "question_id"]
+        )
+
+def downgrade() -> None:
+    with op.batch_alter_table("favorite_questions") as batch_op:
+        batch_op.drop_constraint("uq_favorite_questions_user_id_question_id", type_="unique")
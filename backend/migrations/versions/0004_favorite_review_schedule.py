@@ -0,0 +1,36 @@
+"""spaced repetition schedule on favorite questions
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:30:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    with op.batch_alter_table("favorite_questions") as batch_op:
+        batch_op.add_column(sa.Column("due_at", sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column("interval_days", sa.Float(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column("ease_factor", sa.Float(), nullable=False, server_default="2.5"))
+        batch_op.add_column(sa.Column("repetitions", sa.Integer(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column("last_reviewed_at", sa.DateTime(), nullable=True))
+
+    # 既存のお気に入りは登録日時の時点で復習対象にする
+    op.execute("UPDATE favorite_questions SET due_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE due_at IS NULL")
+
+    # 「今復習すべき問題」を (user_id, due_at) の範囲検索で取り出す
+    op.create_index("ix_favorite_questions_user_due", "favorite_questions", ["user_id", "due_at"])
+
+def downgrade() -> None:
+    op.drop_index("ix_favorite_questions_user_due", table_name="favorite_questions")
+    with op.batch_alter_table("favorite_questions") as batch_op:
+        batch_op.drop_column("last_reviewed_at")
+        batch_op.drop_column("repetitions")
+        batch_op.drop_column("ease_factor")
+        batch_op.drop_column("interval_days")
+        batch_op.drop_column("due_at")
@@ -0,0 +1,28 @@
+"""question source (generated / user)
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 06:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    with op.batch_alter_table("questions") as batch_op:
+        batch_op.add_column(sa.Column("source", sa.String(), nullable=False, server_default="generated"))
+
+    # 既存の行は出どころが記録されていないため、お気に入りから参照されている問題は
+    # ユーザーが入力した文の可能性があるものとして扱い、他のユーザーには出題しない
+    op.execute(
+        "UPDATE questions SET source = 'user' "
+        "WHERE id IN (SELECT question_id FROM favorite_questions WHERE question_id IS NOT NULL)"
+    )
+
+def downgrade() -> None:
+    with op.batch_alter_table("questions") as batch_op:
+        batch_op.drop_column("source")
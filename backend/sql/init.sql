@@ -1,3 +1,4 @@
+-- 参考用のスキーマ定義（実際のテーブルは backend/migrations の Alembic マイグレーションで作成する）
 -- ユーザーデータベース（他のテーブルから参照されるため最初に作成）
 CREATE TABLE IF NOT EXISTS users (
     id SERIAL PRIMARY KEY,
@@ -12,6 +13,8 @@ CREATE TABLE IF NOT EXISTS questions (
     japanese_text TEXT NOT NULL,
     english_text TEXT NOT NULL,
     difficulty_level INTEGER DEFAULT 1,
+    -- generated: LLMで生成 / user: ユーザーが入力した文（他のユーザーには出題しない）
+    source TEXT NOT NULL DEFAULT 'generated',
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -44,12 +47,47 @@ CREATE TABLE IF NOT EXISTS favorite_questions (
     english_answer TEXT NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    due_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    interval_days DOUBLE PRECISION NOT NULL DEFAULT 0,
+    ease_factor DOUBLE PRECISION NOT NULL DEFAULT 2.5,
+    repetitions INTEGER NOT NULL DEFAULT 0,
+    last_reviewed_at TIMESTAMP WITH TIME ZONE,
     UNIQUE(user_id, question_id)
 );
 
+-- LLM応答キャッシュ（ワーカー間で共有する永続層）
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    kind TEXT,
+    payload TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id SERIAL PRIMARY KEY,
+    kind VARCHAR(64) NOT NULL,
+    payload TEXT NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'queued',
+    priority INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    available_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_by VARCHAR(64),
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
 -- インデックスの作成
 CREATE INDEX IF NOT EXISTS idx_user_answers_user_id ON user_answers(user_id);
 CREATE INDEX IF NOT EXISTS idx_user_answers_question_id ON user_answers(question_id);
 CREATE INDEX IF NOT EXISTS idx_mistake_words_user_id ON mistake_words(user_id);
 CREATE INDEX IF NOT EXISTS idx_favorite_questions_user_id ON favorite_questions(user_id);
-CREATE INDEX IF NOT EXISTS idx_favorite_questions_question_id ON favorite_questions(question_id);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_favorite_questions_question_id ON favorite_questions(question_id);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_kind ON llm_cache(kind);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_expires_at ON llm_cache(expires_at);
+CREATE INDEX IF NOT EXISTS ix_favorite_questions_user_created_id ON favorite_questions(user_id, created_at, id) INCLUDE (updated_at);
+CREATE INDEX IF NOT EXISTS ix_favorite_questions_user_due ON favorite_questions(user_id, due_at);
+CREATE INDEX IF NOT EXISTS ix_jobs_claim ON jobs(status, priority, available_at);
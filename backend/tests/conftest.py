@@ -0,0 +1,66 @@
+# tests/conftest.py
+"""テスト共通の設定
+
+アプリを読み込む前に一時ディレクトリのSQLiteを向くよう環境変数を設定し、
+マイグレーションを適用する。アプリは1つの TestClient で起動し、非同期の処理は
+client.portal.call でアプリと同じイベントループ上で実行する（接続プールを共有するため）。
+"""
+import os
+import sys
+import tempfile
+import uuid
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DATA_DIR = tempfile.mkdtemp(prefix="trove-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{DATA_DIR}/test.db",
+    "SECRET_KEY": "test-secret",
+    "OPENAI_API_KEY": "test",
+    "BCRYPT_ROUNDS": "4",
+    "LOG_LEVEL": "WARNING",
+    "QUESTION_POOL_ENABLED": "false",
+    "EMBEDDING_PROVIDER": "hashing",
+    "EMBEDDING_INDEX_PATH": os.path.join(DATA_DIR, "question_index"),
+    "LLM_USER_REQUESTS_PER_MINUTE": "0",
+    "LLM_USER_REQUESTS_PER_DAY": "0",
+    "RESPONSE_CACHE_ENABLED": "false",
+    "ADMIN_TOKEN": "test-admin",
+})
+
+from alembic import command  # noqa: E402
+from alembic.config import Config  # noqa: E402
+
+_alembic_config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+_alembic_config.set_main_option("script_location", os.path.join(BACKEND_DIR, "migrations"))
+command.upgrade(_alembic_config, "head")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.main import app  # noqa: E402
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def run(client):
+    """非同期関数をアプリのイベントループで実行する"""
+    def call(function, *args):
+        return client.portal.call(function, *args)
+    return call
+
+def register(client) -> dict:
+    """新しいユーザーを登録し、認証ヘッダーを返す"""
+    response = client.post(
+        "/api/v1/register",
+        json={"email": f"{uuid.uuid4().hex}@example.com", "password": "password123"}
+    )
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture
+def user_headers(client):
+    return lambda: register(client)
@@ -0,0 +1,25 @@
+# tests/test_auth.py
+from sqlalchemy import delete, select
+from app.database import SessionLocal
+from app.models.models import User
+from app.utils.auth import invalidate_principal
+
+def test_invalidated_principal_is_resolved_again(client, run, user_headers):
+    headers = user_headers()
+    response = client.get("/api/v1/me", headers=headers)
+    assert response.status_code == 200
+    email = response.json()["email"]
+
+    async def delete_user() -> int:
+        async with SessionLocal() as db:
+            user_id = await db.scalar(select(User.id).where(User.email == email))
+            await db.execute(delete(User).where(User.id == user_id))
+            await db.commit()
+            return user_id
+
+    user_id = run(delete_user)
+    # キャッシュに残っている間は削除前のPrincipalのまま（TTLが古さの上限）
+    assert client.get("/api/v1/me", headers=headers).status_code == 200
+
+    invalidate_principal(user_id)
+    assert client.get("/api/v1/me", headers=headers).status_code == 401
@@ -0,0 +1,49 @@
+# tests/test_concurrency.py
+import asyncio
+import time
+import httpx
+from sqlalchemy import event
+from app.database import engine
+from app.main import app
+
+DB_DELAY_SECONDS = 0.15
+CONCURRENT_REQUESTS = 8
+
+def slow_favorites_queries(dbapi_connection, connection_record):
+    # aiosqlite は接続ごとのスレッドでSQLを実行するため、そこで待つと「DBが遅い」状態を再現できる
+    def trace(statement: str) -> None:
+        if statement.lstrip().upper().startswith("SELECT") and "favorite_questions" in statement:
+            time.sleep(DB_DELAY_SECONDS)
+    dbapi_connection.await_(dbapi_connection.driver_connection.set_trace_callback(trace))
+
+def test_slow_db_calls_do_not_serialize_requests(run, user_headers):
+    headers = user_headers()
+
+    async def scenario():
+        # 既存の接続を捨て、遅延を仕込んだ接続を作り直させる
+        event.listen(engine.sync_engine, "connect", slow_favorites_queries)
+        await engine.dispose()
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                started = time.perf_counter()
+                response = await client.get("/api/v1/questions/favorites", headers=headers)
+                assert response.status_code == 200
+                single = time.perf_counter() - started
+
+                started = time.perf_counter()
+                responses = await asyncio.gather(*(
+                    client.get("/api/v1/questions/favorites", headers=headers)
+                    for _ in range(CONCURRENT_REQUESTS)
+                ))
+                concurrent = time.perf_counter() - started
+            assert all(response.status_code == 200 for response in responses)
+            return single, concurrent
+        finally:
+            event.remove(engine.sync_engine, "connect", slow_favorites_queries)
+            await engine.dispose()
+
+    single, concurrent = run(scenario)
+    # DBを待つ間も他のリクエストが進むため、N件の同時実行でも1件分の数倍に収まる
+    assert single >= DB_DELAY_SECONDS
+    assert concurrent < single * CONCURRENT_REQUESTS / 3, (single, concurrent)
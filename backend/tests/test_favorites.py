@@ -0,0 +1,39 @@
+# tests/test_favorites.py
+from app.config import settings
+
+def save_favorites(client, headers, count):
+    for index in range(count):
+        response = client.post(
+            "/api/v1/questions/save-favorite",
+            json={"japanese_text": f"お気に入りの文{index}です。", "english_answer": f"Favorite {index}."},
+            headers=headers
+        )
+        assert response.status_code == 200, response.text
+
+def test_unpaginated_request_returns_every_favorite(client, user_headers, monkeypatch):
+    monkeypatch.setattr(settings, "FAVORITES_DEFAULT_LIMIT", 2)
+    headers = user_headers()
+    save_favorites(client, headers, 5)
+
+    # 復習画面は limit も cursor も付けずに取得するため、既定の件数で切らない
+    response = client.get("/api/v1/questions/favorites", headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+    assert "X-Next-Cursor" not in response.headers
+
+def test_paginated_requests_follow_the_cursor(client, user_headers, monkeypatch):
+    monkeypatch.setattr(settings, "FAVORITES_DEFAULT_LIMIT", 2)
+    headers = user_headers()
+    save_favorites(client, headers, 5)
+
+    response = client.get("/api/v1/questions/favorites", params={"limit": 3}, headers=headers)
+    seen = [item["id"] for item in response.json()]
+    assert len(seen) == 3
+    while "X-Next-Cursor" in response.headers:
+        # cursor だけを指定した場合は既定の件数ずつ返す
+        response = client.get(
+            "/api/v1/questions/favorites", params={"cursor": response.headers["X-Next-Cursor"]}, headers=headers
+        )
+        assert len(response.json()) <= 2
+        seen.extend(item["id"] for item in response.json())
+    assert len(seen) == len(set(seen)) == 5
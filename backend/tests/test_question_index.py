@@ -0,0 +1,116 @@
+# tests/test_question_index.py
+import itertools
+import uuid
+from sqlalchemy import update
+from app.config import settings
+from app.database import SessionLocal
+from app.models.models import QUESTION_SOURCE_GENERATED, QUESTION_SOURCE_USER, Question, User, UserAnswer
+from app.utils.embeddings import HashingEmbedder
+from app.utils.question_index import QuestionIndex, question_index
+import app.routes.question as question_routes
+
+PRIVATE_TEXT = "私の日記に書いた、誰にも見せたくない秘密の一文です。"
+
+def make_index() -> QuestionIndex:
+    # 決定的な埋め込みで、ファイルに保存しない索引を作る
+    return QuestionIndex(HashingEmbedder(256), path="", sync_seconds=3600, batch_size=100, max_users=100)
+
+async def add_question(japanese_text: str, source: str, english_text: str = "", level: int = 1) -> int:
+    async with SessionLocal() as db:
+        question = Question(japanese_text=japanese_text, english_text=english_text, difficulty_level=level, source=source)
+        db.add(question)
+        await db.commit()
+        return question.id
+
+async def add_user() -> int:
+    async with SessionLocal() as db:
+        user = User(email=f"{uuid.uuid4().hex}@example.com", hashed_password="")
+        db.add(user)
+        await db.commit()
+        return user.id
+
+async def answer(user_id: int, question_ids: list) -> None:
+    async with SessionLocal() as db:
+        db.add_all(UserAnswer(user_id=user_id, question_id=question_id, user_answer="", feedback="") for question_id in question_ids)
+        await db.commit()
+
+async def suggest(index: QuestionIndex, user_id: int, words: list, level: int):
+    async with SessionLocal() as db:
+        return await index.suggest(db, user_id, words, level)
+
+def test_index_skips_user_authored_questions(run):
+    generated_id = run(add_question, "会議は午後三時から始まります。", QUESTION_SOURCE_GENERATED)
+    private_id = run(add_question, PRIVATE_TEXT, QUESTION_SOURCE_USER)
+    index = make_index()
+    run(index.sync)
+
+    assert generated_id in index._positions
+    assert private_id not in index._positions
+
+def test_question_saved_by_one_user_is_never_suggested_to_another(client, run, user_headers, monkeypatch):
+    author, other = user_headers(), user_headers()
+    response = client.post(
+        "/api/v1/questions/save-favorite",
+        json={"japanese_text": PRIVATE_TEXT, "english_answer": "A secret sentence from my diary."},
+        headers=author
+    )
+    assert response.status_code == 200, response.text
+    private_id = response.json()["question_id"]
+
+    # 索引を最新にし、他のユーザーが出題を繰り返しても保存された文が出ないことを確かめる
+    run(question_index.sync)
+    assert private_id not in question_index._positions
+
+    counter = itertools.count()
+
+    async def fake_chat_completion(messages, **kwargs):
+        return f"生成した問題その{next(counter)}です。"
+
+    monkeypatch.setattr(question_routes, "chat_completion", fake_chat_completion)
+    for _ in range(10):
+        response = client.post("/api/v1/questions/generate", headers=other)
+        assert response.status_code == 200, response.text
+        assert response.json()["id"] != private_id
+        assert response.json()["japanese_text"] != PRIVATE_TEXT
+
+def test_suggest_matches_mistake_words_through_the_reference_answer(run, monkeypatch):
+    # 他のテストの問題と混ざらないよう、このテスト専用の難易度を使う
+    level = 7
+    monkeypatch.setattr(settings, "EMBEDDING_MATCH_THRESHOLD", 0.2)
+    question_id = run(add_question, "朝の電車に乗り遅れました。", QUESTION_SOURCE_GENERATED, "", level)
+    run(add_question, "会議は三時に始まります。", QUESTION_SOURCE_GENERATED, "The meeting starts at three.", level)
+    user_id = run(add_user)
+    index = make_index()
+    run(index.sync)
+
+    # 日本語だけの問題文は英単語と一致しない（hashing は語の意味を扱わない）
+    assert run(suggest, index, user_id, ["train"], level) is None
+    assert question_id in index._pending
+
+    # 模範解答が補完されると、次の同期で英訳込みで埋め込み直して見つかるようになる
+    async def fill_reference_answer():
+        async with SessionLocal() as db:
+            await db.execute(update(Question).where(Question.id == question_id).values(english_text="I missed the train."))
+            await db.commit()
+
+    run(fill_reference_answer)
+    run(index.sync)
+    assert question_id not in index._pending
+    assert index.reembedded == 1
+    assert run(suggest, index, user_id, ["train"], level) == question_id
+
+def test_suggest_excludes_only_the_latest_answers(run, monkeypatch):
+    level = 8
+    monkeypatch.setattr(settings, "EMBEDDING_ANSWERED_WINDOW", 2)
+    monkeypatch.setattr(settings, "EMBEDDING_RECENT_WINDOW", 0)
+    first, second, third = (
+        run(add_question, japanese_text, QUESTION_SOURCE_GENERATED, "", level)
+        for japanese_text in ("犬と公園を散歩しました。", "昨日は雨が降っていました。", "新しい靴を買いに行きます。")
+    )
+    user_id = run(add_user)
+    run(answer, user_id, [first, second, third])
+    index = make_index()
+    run(index.sync)
+
+    # 直近2件の回答の問題は除かれ、それより前に回答した問題だけが候補に残る
+    assert {run(suggest, index, user_id, [], level) for _ in range(5)} == {first}
@@ -0,0 +1,56 @@
+# tests/test_response_cache.py
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import select, update
+from app.database import SessionLocal
+from app.models.models import LlmCacheEntry
+from app.utils.response_cache import GENERATION_KEY, ResponseCache, make_key
+
+def make_cache(purge_seconds: float = 3600) -> ResponseCache:
+    return ResponseCache(
+        max_entries=16, ttl_seconds=60, db_ttl_seconds=60,
+        generation_check_seconds=0, purge_seconds=purge_seconds
+    )
+
+async def expire(key: str) -> None:
+    async with SessionLocal() as db:
+        await db.execute(
+            update(LlmCacheEntry).where(LlmCacheEntry.key == key)
+            .values(expires_at=datetime.utcnow() - timedelta(seconds=1))
+        )
+        await db.commit()
+
+async def stored_keys() -> set:
+    async with SessionLocal() as db:
+        return set(await db.scalars(select(LlmCacheEntry.key)))
+
+def test_expired_entries_are_purged(run):
+    cache = make_cache()
+    expired, live = make_key("test", "model", "expired"), make_key("test", "model", "live")
+    run(cache.set, expired, "test", {"value": 1})
+    run(cache.set, live, "test", {"value": 2})
+    # 世代のエントリ（常に期限切れ）を作っておく
+    run(cache.invalidate, make_key("test", "model", "missing"))
+    run(expire, expired)
+
+    assert run(cache.purge_expired) >= 1
+    keys = run(stored_keys)
+    assert expired not in keys
+    assert live in keys
+    assert GENERATION_KEY in keys
+
+def test_purge_runs_in_the_background_after_the_interval(run):
+    cache = make_cache(purge_seconds=0.01)
+    expired = make_key("test", "model", "background")
+    run(cache.set, expired, "test", {"value": 1})
+    run(expire, expired)
+    cache._last_purge = 0.0
+
+    async def store_and_drain():
+        await cache.set(make_key("test", "model", "trigger"), "test", {"value": 2})
+        # 保存のついでに始まったバックグラウンドの削除を待つ
+        await asyncio.gather(*cache._tasks)
+
+    run(store_and_drain)
+    assert expired not in run(stored_keys)
+    assert cache.stats()["purged"] >= 1
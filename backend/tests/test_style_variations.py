@@ -0,0 +1,55 @@
+# tests/test_style_variations.py
+import json
+import uuid
+import app.utils.style_variations as style_variations
+
+def fake_structured(calls: list):
+    async def chat_completion(messages, response_format=None, **kwargs):
+        calls.append(response_format)
+        variation_types = response_format["json_schema"]["schema"]["properties"]["variations"]["items"]["properties"]["variation_type"]["enum"]
+        return json.dumps({"variations": [
+            {"variation_type": variation_type, "translation": f"{variation_type} EN", "explanation": f"{variation_type} の解説"}
+            for variation_type in variation_types
+        ]}, ensure_ascii=False)
+    return chat_completion
+
+def test_legacy_endpoints_delegate_to_structured_variations(client, user_headers, monkeypatch):
+    calls = []
+    monkeypatch.setattr(style_variations, "chat_completion", fake_structured(calls))
+    headers = user_headers()
+    japanese_text = f"明日の会議に参加します。{uuid.uuid4().hex}"
+
+    response = client.post(
+        "/api/v1/translation/style-variation",
+        json={"japanese_text": japanese_text, "current_translation": "I will join.", "variation_type": "formal"},
+        headers=headers
+    )
+    assert response.status_code == 200, response.text
+    assert response.json() == {"translation": "formal EN", "explanation": "formal の解説"}
+
+    # 同じ入力の複数種類の要求では、キャッシュ済みの formal を除いた casual だけを生成する
+    response = client.post(
+        "/api/v1/translation/style-variations",
+        json={"japanese_text": japanese_text, "current_translation": "I will join.", "variation_types": ["formal", "casual"]},
+        headers=headers
+    )
+    assert response.status_code == 200, response.text
+    assert [variation["variation_type"] for variation in response.json()["variations"]] == ["formal", "casual"]
+    assert len(calls) == 2
+    assert all(call["type"] == "json_schema" for call in calls)
+
+    response = client.post(
+        "/api/v1/questions/style-variation",
+        json={"japanese_text": japanese_text, "user_answer": "I join.", "variation_type": "context:取引先へのメール"},
+        headers=headers
+    )
+    assert response.status_code == 200, response.text
+    assert response.json() == {"feedback": "英訳：context:取引先へのメール EN\n\n解説：context:取引先へのメール の解説"}
+
+def test_unknown_variation_type_is_rejected(client, user_headers):
+    response = client.post(
+        "/api/v1/translation/style-variation",
+        json={"japanese_text": "こんにちは。", "current_translation": "", "variation_type": "poetic"},
+        headers=user_headers()
+    )
+    assert response.status_code == 400
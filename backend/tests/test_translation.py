@@ -0,0 +1,40 @@
+# tests/test_translation.py
+import json
+import app.routes.translation as translation_routes
+from app.utils.llm_gateway import llm_gateway
+
+def parse_events(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines.get("event"), json.loads(lines["data"])))
+    return events
+
+def fake_translation(charged: list):
+    async def chat_completion(messages, user_id=None, **kwargs):
+        # 本物と同じく user_id があれば利用上限に数える
+        llm_gateway.check_quota(user_id)
+        charged.append(user_id)
+        sentence = messages[-1]["content"].split("\n\n", 1)[1]
+        return f"英訳：EN {sentence}\n\n解説：{sentence} の解説"
+    return chat_completion
+
+def test_long_translation_charges_the_quota_once(client, user_headers, monkeypatch):
+    charged = []
+    monkeypatch.setattr(translation_routes, "chat_completion", fake_translation(charged))
+    monkeypatch.setattr(llm_gateway.quota, "per_minute", 2)
+    headers = user_headers()
+    text = "".join(f"これは{index}番目の文です。" for index in range(10))
+
+    for _ in range(2):
+        response = client.post("/api/v1/translation/generate/stream", json={"japanese_text": text}, headers=headers)
+        assert response.status_code == 200
+        events = parse_events(response.text)
+        # 上限（1分に2回）より多い10文でも、途中で429にならず全文が順に返る
+        assert [data["index"] for event, data in events if event == "sentence"] == list(range(10))
+        assert events[-1][0] == "done"
+    assert all(user_id is None for user_id in charged)
+
+    # 3回目のリクエストはストリームを始める前に429で断る
+    response = client.post("/api/v1/translation/generate/stream", json={"japanese_text": text}, headers=headers)
+    assert response.status_code == 429
@@ -0,0 +1,43 @@
+# tests/test_worker.py
+import asyncio
+from app.utils import job_queue
+from app.utils.job_queue import job_handler
+from app.worker import Worker
+
+RECORDED = []
+
+@job_handler("test_record")
+async def record(payload: dict) -> None:
+    RECORDED.append(payload["value"])
+
+def test_loop_survives_errors_while_recording_results(run, monkeypatch):
+    failures = {"left": 1}
+    complete = job_queue.complete
+
+    async def flaky_complete(job, worker_id):
+        # 最初の1件だけ結果の記録でDBエラーが起きたことにする
+        if failures["left"]:
+            failures["left"] -= 1
+            raise RuntimeError("database is unavailable")
+        return await complete(job, worker_id)
+
+    monkeypatch.setattr(job_queue, "complete", flaky_complete)
+
+    async def scenario():
+        for value in range(3):
+            await job_queue.enqueue_job("test_record", {"value": value})
+        worker = Worker(concurrency=1, kinds=["test_record"])
+        task = asyncio.create_task(worker.run())
+        for _ in range(100):
+            if len(RECORDED) >= 3:
+                break
+            await asyncio.sleep(0.05)
+        worker.stop()
+        await task
+        return worker
+
+    worker = run(scenario)
+    # 1つしかないループが記録の失敗で止まらず、残りのジョブも処理している
+    assert sorted(RECORDED) == [0, 1, 2]
+    assert worker.errors == 1
+    assert worker.succeeded == 2
@@ -344,12 +344,12 @@ export default function QuestionsPage() {
       setIsGettingVariation(true)
       const requestBody = {
         japanese_text: question.japanese_text,
-        user_answer: answer,
-        variation_type: variationType
+        current_translation: answer,
+        variation_types: [variationType]
       }
       console.log('Request body:', requestBody) // デバッグログ
 
-      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/v1/questions/style-variation`, {
+      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/v1/translation/style-variations`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -368,8 +368,9 @@ export default function QuestionsPage() {
 
       const data = await response.json()
       console.log('Success response:', data) // デバッグログ
+      const [variation] = data.variations
       
-      setFeedback(prev => `${prev}\n\n【${variationType.startsWith('context') ? 'カスタム' : variationType === 'formal' ? 'フォーマル' : 'カジュアル'}な表現】\n${data.feedback}`)
+      setFeedback(prev => `${prev}\n\n【${variationType.startsWith('context') ? 'カスタム' : variationType === 'formal' ? 'フォーマル' : 'カジュアル'}な表現】\n英訳：${variation.translation}\n\n解説：${variation.explanation}`)
     } catch (error) {
       console.error('Error getting style variation:', error)
     } finally {
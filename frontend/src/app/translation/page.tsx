@@ -129,7 +129,7 @@ export default function TranslationPage() {
 
     try {
       setIsGettingVariation(true)
-      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/v1/translation/style-variation`, {
+      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/v1/translation/style-variations`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -138,7 +138,7 @@ export default function TranslationPage() {
         body: JSON.stringify({
           japanese_text: japaneseText,
           current_translation: translation,
-          variation_type: variationType
+          variation_types: [variationType]
         })
       })
 
@@ -147,8 +147,9 @@ export default function TranslationPage() {
       }
 
       const data = await response.json()
-      setTranslation(data.translation)
-      setFeedback(data.explanation)
+      const [variation] = data.variations
+      setTranslation(variation.translation)
+      setFeedback(variation.explanation)
     } catch (error) {
       console.error('Error getting style variation:', error)
     } finally {